@@ -4,6 +4,8 @@ const jwt = require('jsonwebtoken');
 const { Admin, ChatHistory, ChatMessage, FavouriteListing, FoodListing, Guest, Host, ListingAnalytics, RequestAnalytics, Reservation, Review, ReviewLike, SystemAnalytics, UserRecord, Warning, sequelize } = require('./models');
 const Encryption = require('./services/Encryption');
 const Universal = require('./services/Universal');
+const DatabaseReset = require('./services/DatabaseReset');
+const DatasetGenerator = require('./services/DatasetGenerator');
 require('dotenv').config()
 
 async function resetDB() {
@@ -210,7 +212,7 @@ async function signJWT() {
     }
 }
 
-// New tools: softreset, entityreset, rmimagerefs, presentationtransform
+// New tools: softreset, entityreset, rmimagerefs, presentationtransform, generatedataset
 
 async function softReset() {
     console.log("")
@@ -221,28 +223,49 @@ async function softReset() {
 
     console.log("")
     console.log("Soft resetting...")
-    try {
-        await Admin.destroy({ where: {} });
-        await ChatHistory.destroy({ where: {} });
-        await ChatMessage.destroy({ where: {} });
-        await FavouriteListing.destroy({ where: {} });
-        await FoodListing.destroy({ where: {} });
-        await Guest.destroy({ where: {} });
-        await Host.destroy({ where: {} });
-        await ListingAnalytics.destroy({ where: {} });
-        await RequestAnalytics.destroy({ where: {} });
-        await Reservation.destroy({ where: {} });
-        await Review.destroy({ where: {} });
-        await ReviewLike.destroy({ where: {} });
-        await SystemAnalytics.destroy({ where: {} });
-        await UserRecord.destroy({ where: {} });
-        await Warning.destroy({ where: {} });
-
-        await SystemAnalytics.create({ instanceID: Universal.generateUniqueID() })
-
-        console.log("Tables soft resetted successfully!")
-    } catch (err) {
-        console.log(`Failed to soft reset tables; error: ${err}`)
+    const resetResult = await DatabaseReset.reset((event) => {
+        if (event.event == "table") {
+            console.log(`Cleared ${event.table} (${event.rows} rows) in ${event.durationMs}ms`)
+        }
+    })
+    if (typeof resetResult == "string") {
+        console.log(`Failed to soft reset tables; error: ${resetResult}`)
+    } else {
+        console.log(`Tables soft resetted successfully in ${resetResult.durationMs}ms!`)
+    }
+}
+
+async function generateDataset() {
+    console.log("")
+    console.log("Leave blank to use the default shown.")
+    const parameters = {}
+    for (const key of ["seed", "hosts", "guests", "listings", "reservations", "reviews", "likes", "chats", "messages", "skew", "batchSize"]) {
+        const value = prompt(`${key} (${DatasetGenerator.defaults[key]}): `).trim()
+        if (value !== "") {
+            parameters[key] = Number(value)
+        }
+    }
+    parameters.password = prompt(`Password for all accounts (${DatasetGenerator.defaults.password}): `).trim() || undefined
+    parameters.reset = prompt("Soft reset the database first? (y/n): ").toLowerCase() === 'y'
+
+    console.log("")
+    console.log("Generating dataset...")
+    const generateResult = await DatasetGenerator.generate(parameters, (event) => {
+        if (event.event == "table" && event.rowsPerSecond !== undefined) {
+            console.log(`Loaded ${event.table} (${event.rows} rows) in ${event.durationMs}ms (${event.rowsPerSecond} rows/s)`)
+        } else if (event.event == "table") {
+            console.log(`Cleared ${event.table} (${event.rows} rows) in ${event.durationMs}ms`)
+        } else if (event.event == "progress") {
+            console.log(`Loading ${event.table}: ${event.rows}/${event.total} rows`)
+        }
+    })
+    if (typeof generateResult == "string") {
+        console.log(`Failed to generate dataset; error: ${generateResult}`)
+    } else {
+        console.log(`Dataset generated successfully: ${generateResult.rows} rows in ${generateResult.durationMs}ms (${generateResult.rowsPerSecond} rows/s).`)
+        for (const login of generateResult.logins) {
+            console.log(`Sample ${login.userType.toLowerCase()} login: ${login.username} / ${generateResult.password}`)
+        }
     }
 }
 
@@ -545,6 +568,10 @@ sequelize.sync({ alter: true })
         if (tools.includes("presentationtransform")) {
             await presentationTransform();
         }
+
+        if (tools.includes("generatedataset")) {
+            await generateDataset();
+        }
     })
     .catch(err => {
         console.error(err)
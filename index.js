@@ -3,7 +3,7 @@ const express = require('express');
 const cors = require('cors');
 const db = require('./models');
 const { Guest, Host } = db;
-const { Encryption, Analytics } = require('./services');
+const { Encryption, Analytics, SchemaUpgrade } = require('./services');
 const prompt = require("prompt-sync")({ sigint: true });
 require('dotenv').config()
 
@@ -18,12 +18,26 @@ const Universal = require('./services/Universal')
 const Logger = require('./services/Logger')
 Logger.setup()
 
+// Ctrl+C and termination signals end the process without emitting "exit"; exit normally instead, so services write what they still hold in memory (e.g. Logger and Cache)
+for (const [signal, exitCode] of [["SIGINT", 130], ["SIGTERM", 143]]) {
+    process.once(signal, () => process.exit(exitCode))
+}
+
 const Emailer = require('./services/Emailer')
 Emailer.checkContext()
+if (Emailer.checkPermission()) {
+    const emailerSetup = Emailer.setup()
+    if (emailerSetup !== true) {
+        console.log(`MAIN: Emailer failed to set up. Error: ${emailerSetup}`)
+    }
+}
 
 const Cache = require('./services/Cache')
 Cache.load();
 
+const RuntimeStats = require('./services/RuntimeStats')
+RuntimeStats.setup()
+
 if (Cache.get("usageLock") == undefined) {
     Cache.set("usageLock", false)
 }
@@ -63,25 +77,34 @@ const { default: rateLimit } = require('express-rate-limit');
 startWebSocketServer(app);
 
 // Rate limiters
+/// Rejections are counted per limiter for the superuser runtime stats
+const limitedHandler = (limiterName) => (req, res, next, options) => {
+    RuntimeStats.recordLimiterHit(limiterName)
+    res.status(options.statusCode).send(options.message)
+}
+
 const standardLimiter = rateLimit({
     windowMs: 1 * 60 * 1000,
     limit: 180,
     standardHeaders: true,
-    legacyHeaders: false
+    legacyHeaders: false,
+    handler: limitedHandler("standard")
 })
 
 const cdnLimiter = rateLimit({
     windowMs: 1 * 60 * 1000,
     limit: 240,
     standardHeaders: true,
-    legacyHeaders: false
+    legacyHeaders: false,
+    handler: limitedHandler("cdn")
 })
 
 const gptLimiter = rateLimit({
     windowMs: 1 * 60 * 1000,
     limit: 15,
     standardHeaders: true,
-    legacyHeaders: false
+    legacyHeaders: false,
+    handler: limitedHandler("gpt")
 })
 
 // Top-level middleware
@@ -90,10 +113,13 @@ const gptLimiter = rateLimit({
 var conditionalLimiter = (req, res, next) => {
     const requestURLOnly = req.originalUrl.split("?")[0]
     if (requestURLOnly.startsWith("/cdn")) {
+        RuntimeStats.recordLimiterRequest("cdn")
         return cdnLimiter(req, res, next)
     } else if (requestURLOnly.startsWith("/makanBot")) {
+        RuntimeStats.recordLimiterRequest("gpt")
         return gptLimiter(req, res, next)
     } else {
+        RuntimeStats.recordLimiterRequest("standard")
         return standardLimiter(req, res, next)
     }
 };
@@ -257,7 +283,13 @@ if (!SEQUELIZE_ACTIVE) {
 } else {
     // Server initialisation with sequelize
     db.sequelize.sync()
-        .then(() => {
+        .then(async () => {
+            // Bring tables created before newer model columns up to date; sync() alone never changes existing tables
+            const upgradeResult = await SchemaUpgrade.run()
+            if (upgradeResult !== true) {
+                throw new Error(upgradeResult)
+            }
+
             // Create sample FoodListing
             onDBSynchronise()
             console.log("MAIN SEQUELIZE: Database synchronised.")
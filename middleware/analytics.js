@@ -53,6 +53,31 @@ const newRequest = async (req, res, next) => {
             .catch(err => {
                 Logger.log(`ANALYTICS NEWREQUEST ERROR: Failed to update request metrics. Error: ${err}`)
             })
+
+        // Response time is measured up to the last byte being handed to the OS, whichever way the response was sent, or up to the connection closing for requests aborted before then.
+        // It supplements the request counted above, so it is recorded exactly once and not counted as another update.
+        const startTime = process.hrtime.bigint();
+        var latencyRecorded = false;
+        const recordLatency = () => {
+            if (latencyRecorded) {
+                return
+            }
+            latencyRecorded = true;
+            try {
+                const durationMs = Number(process.hrtime.bigint() - startTime) / 1e6;
+                Analytics.supplementRequestMetricUpdate(requestURLOnly, req.method, Analytics.latencyMetrics(durationMs), false)
+                    .then(result => {
+                        if (result !== true) {
+                            Logger.log(`ANALYTICS NEWREQUEST ERROR: Failed to update request latency. Error: ${result}`)
+                        }
+                    })
+                    .catch(err => {
+                        Logger.log(`ANALYTICS NEWREQUEST ERROR: Failed to update request latency. Error: ${err}`)
+                    })
+            } catch {}
+        }
+        res.on("finish", recordLatency)
+        res.on("close", recordLatency)
     } catch {}
 
     // Continue to next middleware
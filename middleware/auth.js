@@ -1,9 +1,8 @@
 const jwt = require('jsonwebtoken');
 const Logger = require('../services/Logger');
 const TokenManager = require('../services/TokenManager');
-const { UserRecord } = require('../models');
-const { Op } = require('sequelize');
 const Cache = require('../services/Cache');
+const UserRecordCache = require('../services/UserRecordCache');
 require('dotenv').config();
 
 const validateToken = async (req, res, next) => {
@@ -42,14 +41,8 @@ const validateToken = async (req, res, next) => {
         }
     }
 
-    // Verify user existence
-    const record = await UserRecord.findOne({ where: {
-        [Op.or]: [
-            { gID: payload.userID },
-            { hID: payload.userID },
-            { aID: payload.userID },
-        ]
-    }});
+    // Verify user existence (served from memory for repeat requests)
+    const record = await UserRecordCache.getRecord(payload.userID);
     if (!record) {
         return res.status(404).send("ERROR: User does not exist.");
     }
@@ -108,14 +101,8 @@ const checkUser = async (req, res, next) => {
         }
     }
 
-    // Verify user existence
-    const record = await UserRecord.findOne({ where: {
-        [Op.or]: [
-            { gID: payload.userID },
-            { hID: payload.userID },
-            { aID: payload.userID },
-        ]
-    }});
+    // Verify user existence (served from memory for repeat requests)
+    const record = await UserRecordCache.getRecord(payload.userID);
     if (!record) {
         return res.status(404).send("ERROR: User does not exist.");
     }
@@ -176,14 +163,8 @@ const validateAdmin = async (req, res, next) => {
         return res.status(403).send("ERROR: Access denied.")
     }
 
-    // Verify user existence
-    const record = await UserRecord.findOne({ where: {
-        [Op.or]: [
-            { gID: payload.userID },
-            { hID: payload.userID },
-            { aID: payload.userID },
-        ]
-    }});
+    // Verify user existence (served from memory for repeat requests)
+    const record = await UserRecordCache.getRecord(payload.userID);
     if (!record) {
         return res.status(404).send("ERROR: User does not exist.");
     }
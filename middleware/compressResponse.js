@@ -0,0 +1,146 @@
+const zlib = require('zlib');
+
+// Bodies sent in one go below this size are not worth compressing
+const COMPRESSION_THRESHOLD = 1024;
+const COMPRESSIBLE_TYPE = /^(application\/(json|x-ndjson)|text\/)/i;
+
+/**
+ * Picks the preferred encoding the client accepts, Brotli first, honouring q-values (`q=0` refuses an encoding).
+ */
+function negotiateEncoding(acceptEncoding) {
+    if (!acceptEncoding) {
+        return null;
+    }
+
+    const accepted = {};
+    for (const part of acceptEncoding.split(",")) {
+        const [name, ...params] = part.trim().toLowerCase().split(";");
+        const qParam = params.find(param => param.trim().startsWith("q="));
+        accepted[name] = qParam ? parseFloat(qParam.trim().substring(2)) : 1;
+    }
+
+    const candidates = ["br", "gzip"].filter(encoding => (accepted[encoding] ?? accepted["*"] ?? 0) > 0);
+    if (candidates.length == 0) {
+        return null;
+    }
+    return candidates.sort((a, b) => (accepted[b] ?? accepted["*"]) - (accepted[a] ?? accepted["*"]))[0];
+}
+
+function createCompressor(encoding) {
+    if (encoding == "br") {
+        return zlib.createBrotliCompress({
+            params: {
+                // Favour speed: these are large exports streamed over the network, not static assets
+                [zlib.constants.BROTLI_PARAM_QUALITY]: 4,
+                [zlib.constants.BROTLI_PARAM_MODE]: zlib.constants.BROTLI_MODE_TEXT
+            }
+        });
+    }
+    return zlib.createGzip({ level: 6 });
+}
+
+/**
+ * Compresses JSON and text responses with Brotli or gzip, as negotiated through `Accept-Encoding`.
+ *
+ * Works with responses sent in one go (`res.json`, `res.send`) as well as streamed ones (`res.write`, `stream.pipe(res)`), keeping backpressure intact.
+ * Streaming routes can call `res.flush()` to push out what has been written so far, e.g. for progress updates.
+ */
+const compressResponse = (req, res, next) => {
+    const encoding = negotiateEncoding(req.headers["accept-encoding"]);
+    res.vary("Accept-Encoding");
+    if (!encoding || req.method == "HEAD") {
+        return next();
+    }
+
+    const originalWrite = res.write;
+    const originalEnd = res.end;
+    const originalOn = res.on;
+    var compressor = null;
+    var decided = false;
+
+    res.flush = () => {
+        if (compressor) {
+            compressor.flush();
+        }
+    };
+
+    function shouldCompress(firstChunk, ending) {
+        if (res.headersSent || res.getHeader("Content-Encoding") || [204, 304].includes(res.statusCode) || res.statusCode < 200) {
+            return false;
+        }
+        if (!COMPRESSIBLE_TYPE.test(String(res.getHeader("Content-Type") || ""))) {
+            return false;
+        }
+        if (ending) {
+            const size = firstChunk ? Buffer.byteLength(firstChunk) : 0;
+            return size >= COMPRESSION_THRESHOLD;
+        }
+        return true;
+    }
+
+    function decide(firstChunk, ending) {
+        decided = true;
+        if (!shouldCompress(firstChunk, ending)) {
+            return;
+        }
+
+        res.setHeader("Content-Encoding", encoding);
+        res.removeHeader("Content-Length");
+        compressor = createCompressor(encoding);
+        compressor.on("data", (data) => {
+            if (originalWrite.call(res, data) === false) {
+                compressor.pause();
+            }
+        });
+        compressor.on("end", () => originalEnd.call(res));
+        compressor.on("error", (err) => res.destroy(err));
+        // Writers waiting on the response's drain event are waiting on the compressor's buffer
+        compressor.on("drain", () => res.emit("drain"));
+        originalOn.call(res, "drain", () => compressor.resume());
+        originalOn.call(res, "close", () => {
+            if (!res.writableFinished) {
+                compressor.destroy();
+            }
+        });
+    }
+
+    res.write = function (chunk, chunkEncoding, callback) {
+        if (!decided) {
+            decide(chunk, false);
+        }
+        if (!compressor) {
+            return originalWrite.call(res, chunk, chunkEncoding, callback);
+        }
+        return compressor.write(typeof chunk == "string" ? Buffer.from(chunk, typeof chunkEncoding == "string" ? chunkEncoding : "utf8") : chunk, typeof chunkEncoding == "function" ? chunkEncoding : callback);
+    };
+
+    res.end = function (chunk, chunkEncoding, callback) {
+        if (typeof chunk == "function") {
+            callback = chunk;
+            chunk = undefined;
+        } else if (typeof chunkEncoding == "function") {
+            callback = chunkEncoding;
+            chunkEncoding = undefined;
+        }
+
+        if (!decided) {
+            decide(chunk, true);
+        }
+        if (!compressor) {
+            return originalEnd.call(res, chunk, chunkEncoding, callback);
+        }
+        if (callback) {
+            res.once("finish", callback);
+        }
+        if (chunk) {
+            compressor.end(typeof chunk == "string" ? Buffer.from(chunk, chunkEncoding || "utf8") : chunk);
+        } else {
+            compressor.end();
+        }
+        return res;
+    };
+
+    next();
+};
+
+module.exports = compressResponse;
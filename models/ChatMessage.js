@@ -36,7 +36,11 @@ module.exports = (sequelize, DataTypes) => {
             allowNull: false,
             defaultValue: false
         }
-    }, { tableName: 'chatMessages' })
+    }, {
+        tableName: 'chatMessages',
+        // Chat history is paged newest-first within a chat
+        indexes: [{ fields: ["chatID", "datetime", "messageID"] }]
+    })
 
     // Associations
     ChatMessage.associate = (models) => {
@@ -4,6 +4,27 @@
  * @param {import('sequelize').DataTypes} DataTypes 
  * @returns 
  */
+// Response time histogram buckets (in ms); keep in sync with Analytics.latencyBuckets
+const latencyBuckets = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000];
+
+function latencyColumns(DataTypes) {
+    const columns = {};
+    for (const bucket of latencyBuckets) {
+        columns[`latencyUnder${bucket}ms`] = {
+            type: DataTypes.INTEGER,
+            allowNull: false,
+            defaultValue: 0
+        }
+    }
+    columns[`latencyOver${latencyBuckets[latencyBuckets.length - 1]}ms`] = {
+        type: DataTypes.INTEGER,
+        allowNull: false,
+        defaultValue: 0
+    }
+
+    return columns;
+}
+
 module.exports = (sequelize, DataTypes) => {
     const RequestAnalytics = sequelize.define("RequestAnalytics", {
         requestURL: {
@@ -29,7 +50,13 @@ module.exports = (sequelize, DataTypes) => {
         lastRequest: {
             type: DataTypes.STRING,
             allowNull: true
-        }
+        },
+        totalLatencyMs: {
+            type: DataTypes.DOUBLE,
+            allowNull: false,
+            defaultValue: 0
+        },
+        ...latencyColumns(DataTypes)
     }, { tableName: 'requestAnalytics' })
 
     // Associations
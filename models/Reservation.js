@@ -57,7 +57,11 @@ module.exports = (sequelize, DataTypes) => {
             allowNull: false,
             defaultValue: false
         }
-    }, { tableName: 'reservations' });
+    }, {
+        tableName: 'reservations',
+        // References are allocated by inserting and retrying on conflict, so the database must reject duplicates
+        indexes: [{ name: 'reservations_reference_num_unique', unique: true, fields: ['referenceNum'] }]
+    });
 
     // Associations
 
@@ -9,7 +9,7 @@ const { Sequelize } = require('sequelize');
 const Universal = require("../../services/Universal");
 const { validateToken, checkUser, validateAdmin } = require("../../middleware/auth");
 const { Op } = require("sequelize");
-const { Analytics } = require("../../services");
+const { Analytics, UserRecordCache } = require("../../services");
 
 router.get('/myAccount', validateToken, (req, res) => {
     const userInfo = req.user;
@@ -34,14 +34,7 @@ router.get("/listings", async (req, res) => { // GET all food listings
     }
 
     try {
-        const bannedHostIDs = (await UserRecord.findAll({
-            where: {
-                [Op.and]: [
-                    { banned: true },
-                    { hID: { [Op.not]: null } }
-                ]
-            }
-        })).map(record => record.hID);
+        const bannedHostIDs = await UserRecordCache.getBannedHostIDs();
 
         var whereClause = { published: true };
         if (hostID) {
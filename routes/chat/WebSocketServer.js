@@ -4,9 +4,12 @@ const WebSocket = require("ws");
 const { ChatHistory, ChatMessage, Reservation, FoodListing, Host, Guest } = require("../../models");
 const { Op } = require("sequelize");
 const TokenManager = require("../../services/TokenManager").default();
-const { Universal, Logger, Extensions, Emailer, HTMLRenderer, FileManager } = require("../../services");
+const { Universal, Logger, Extensions, Emailer, HTMLRenderer, FileManager, RuntimeStats } = require("../../services");
 const path = require("path");
 
+const CHAT_HISTORY_PAGE_DEFAULT = 50;
+const CHAT_HISTORY_PAGE_MAX = 200;
+
 class ChatEvent {
     static errorEvent = "error";
     static error(message, errorType = "error") {
@@ -60,6 +63,63 @@ function startWebSocketServer(app) {
     const wss = new WebSocket.Server({ server });
     let clientStore = {};
 
+    // Indexes over clientStore, kept in step as connections authorise, gain conversations and close
+    const activeUsers = new Map(); // userID -> Set of connection IDs
+    const chatConnections = new Map(); // chatID -> Set of connection IDs
+
+    RuntimeStats.registerProbe("webSockets", () => ({
+        connections: Object.keys(clientStore).length,
+        openSockets: wss.clients.size,
+        activeUsers: activeUsers.size,
+        activeChats: chatConnections.size
+    }));
+
+    function addToIndex(index, key, connectionID) {
+        if (!index.has(key)) {
+            index.set(key, new Set());
+        }
+        index.get(key).add(connectionID);
+    }
+
+    function removeFromIndex(index, key, connectionID) {
+        const connections = index.get(key);
+        if (connections) {
+            connections.delete(connectionID);
+            if (connections.size == 0) {
+                index.delete(key);
+            }
+        }
+    }
+
+    function addConversation(connectionID, chatID, conversation) {
+        clientStore[connectionID]["conversations"][chatID] = conversation;
+        addToIndex(chatConnections, chatID, connectionID);
+    }
+
+    function untrackConnection(connectionID) {
+        const client = clientStore[connectionID];
+        if (client.userID) {
+            removeFromIndex(activeUsers, client.userID, connectionID);
+        }
+        for (const chatID of Object.keys(client.conversations)) {
+            removeFromIndex(chatConnections, chatID, connectionID);
+        }
+    }
+
+    function deauthoriseConnection(connectionID) {
+        untrackConnection(connectionID);
+        clientStore[connectionID]["authToken"] = null;
+        clientStore[connectionID]["userID"] = null;
+        clientStore[connectionID]["user"] = null;
+        clientStore[connectionID]["userType"] = null;
+        clientStore[connectionID]["conversations"] = {};
+    }
+
+    function removeConnection(connectionID) {
+        untrackConnection(connectionID);
+        delete clientStore[connectionID];
+    }
+
     async function getChatAndMessages(connectionID, parsedMessage) {
         const ws = clientStore[connectionID].ws;
 
@@ -70,6 +130,21 @@ function startWebSocketServer(app) {
             return;
         }
 
+        var limit = CHAT_HISTORY_PAGE_DEFAULT;
+        if (parsedMessage.limit !== undefined) {
+            limit = parseInt(parsedMessage.limit);
+            if (isNaN(limit) || limit < 1) {
+                ws.send(ChatEvent.error("Invalid history page size.", "user"));
+                return;
+            }
+            limit = Math.min(limit, CHAT_HISTORY_PAGE_MAX);
+        }
+        const before = parsedMessage.before;
+        if (before !== undefined && typeof before != "string") {
+            ws.send(ChatEvent.error("Invalid history cursor.", "user"));
+            return;
+        }
+
         try {
             let chatHistory = await ChatHistory.findByPk(chatID);
             if (!chatHistory) {
@@ -77,11 +152,25 @@ function startWebSocketServer(app) {
                 return;
             }
 
+            // Pages are read newest-first with (datetime, messageID) as the keyset, starting before the cursor message if one is given
+            var where = { chatID: chatID };
+            if (before) {
+                const cursorMessage = await ChatMessage.findByPk(before, { attributes: ["messageID", "chatID", "datetime"] });
+                if (!cursorMessage || cursorMessage.chatID != chatID) {
+                    ws.send(ChatEvent.error("Invalid history cursor.", "user"));
+                    return;
+                }
+
+                where[Op.or] = [
+                    { datetime: { [Op.lt]: cursorMessage.datetime } },
+                    { datetime: cursorMessage.datetime, messageID: { [Op.lt]: cursorMessage.messageID } }
+                ];
+            }
+
             var previousMessages = await ChatMessage.findAll({
-                where: {
-                    chatID: chatID,
-                },
-                order: [["datetime", "ASC"]],
+                where: where,
+                order: [["datetime", "DESC"], ["messageID", "DESC"]],
+                limit: limit + 1
             });
             if (!Array.isArray(previousMessages)) {
                 ws.send(
@@ -90,18 +179,30 @@ function startWebSocketServer(app) {
                 return;
             }
 
-            // Convert messages to JSON
-            previousMessages = previousMessages.map((msg) => msg.toJSON());
+            const hasMore = previousMessages.length > limit;
+
+            // Convert messages to JSON, oldest first
+            previousMessages = previousMessages.slice(0, limit).reverse().map((msg) => msg.toJSON());
+
+            // Reply targets are looked up by ID; targets older than this page are fetched in one query
+            const messageTexts = new Map(previousMessages.map((msg) => [msg.messageID, msg.message]));
+            const missingReplyTargets = [...new Set(previousMessages
+                .filter((msg) => msg.replyToID && !messageTexts.has(msg.replyToID))
+                .map((msg) => msg.replyToID))];
+            if (missingReplyTargets.length > 0) {
+                const replyTargets = await ChatMessage.findAll({
+                    where: { messageID: { [Op.in]: missingReplyTargets } },
+                    attributes: ["messageID", "message"]
+                });
+                for (const target of replyTargets) {
+                    messageTexts.set(target.messageID, target.message);
+                }
+            }
 
             // Process and add the replyTo parameter for messages with replies
             const processedMessages = previousMessages.map((msg) => {
-                if (msg.replyToID) {
-                    const targetMessage = previousMessages.filter(
-                        (filterMsg) => filterMsg.messageID == msg.replyToID
-                    );
-                    if (targetMessage[0]) {
-                        msg.replyTo = targetMessage[0].message;
-                    }
+                if (msg.replyToID && messageTexts.has(msg.replyToID)) {
+                    msg.replyTo = messageTexts.get(msg.replyToID);
                 }
 
                 if (msg.senderID == clientStore[connectionID].userID) {
@@ -113,17 +214,27 @@ function startWebSocketServer(app) {
                 return msg;
             });
 
-            // Active users is a userID to connectionID map
-            var activeUsers = {};
-            for (const connectionID of Object.keys(clientStore)) {
-                activeUsers[clientStore[connectionID].userID] = connectionID;
+            const nextCursor = hasMore ? processedMessages[0].messageID : null;
+
+            if (before) {
+                // Older pages only go to the connection that asked for them
+                ws.send(JSON.stringify({
+                    action: "older_messages",
+                    previousMessages: processedMessages,
+                    chatID: chatHistory.chatID,
+                    before: before,
+                    nextCursor: nextCursor
+                }));
+                return;
             }
-            const partnerIsActive = Object.keys(activeUsers).includes(clientStore[connectionID].conversations[chatID].recipientID);
+
+            const partnerIsActive = activeUsers.has(clientStore[connectionID].conversations[chatID].recipientID);
             const message = {
                 action: "chat_history",
                 previousMessages: processedMessages,
                 chatID: chatHistory.chatID,
                 currentStatus: partnerIsActive,
+                nextCursor: nextCursor
             };
 
             broadcastMessage(message, chatID);
@@ -184,14 +295,14 @@ function startWebSocketServer(app) {
             if (clientStore[connectionID].authToken == null && (Date.now() - new Date(clientStore[connectionID].lastUpdate).getTime()) > TEN_MINUTES) {
                 Logger.log(`WEBSOCKETSERVER: Closing connection ${connectionID} due to unauthenticated state for 10 minutes.`);
                 ws.close(1008);
-                delete clientStore[connectionID];
+                removeConnection(connectionID);
                 return;
             } else if (
                 Date.now() - new Date(clientStore[connectionID].lastUpdate).getTime() > ONE_HOUR
             ) {
                 Logger.log(`WEBSOCKETSERVER: Closing connection ${connectionID} due to inactivity for 1 hour.`);
                 ws.close(1008);
-                delete clientStore[connectionID];
+                removeConnection(connectionID);
                 return;
             } else {
                 clientStore[connectionID].lastUpdate = new Date().toISOString();
@@ -225,11 +336,7 @@ function startWebSocketServer(app) {
                 const refreshResult = await authenticateConnection(clientStore[connectionID].authToken);
                 if (typeof refreshResult == "string" && refreshResult.startsWith("ERROR")) {
                     // Failed to verify authorised connection's credential. De-authorise connection.
-                    clientStore[connectionID]["authToken"] = null;
-                    clientStore[connectionID]["userID"] = null;
-                    clientStore[connectionID]["user"] = null;
-                    clientStore[connectionID]["userType"] = null;
-                    clientStore[connectionID]["conversations"] = {};
+                    deauthoriseConnection(connectionID);
                     ws.send(JSON.stringify({ event: "error", message: refreshResult }));
                     return;
                 }
@@ -272,11 +379,7 @@ function startWebSocketServer(app) {
                     user = await Guest.findByPk(userID);
                     if (!user) {
                         // User could not be found based on authToken provided userID. De-authorise connection.
-                        clientStore[connectionID]["authToken"] = null;
-                        clientStore[connectionID]["userID"] = null;
-                        clientStore[connectionID]["user"] = null;
-                        clientStore[connectionID]["userType"] = null;
-                        clientStore[connectionID]["conversations"] = {};
+                        deauthoriseConnection(connectionID);
                         ws.send(ChatEvent.error("User not found. Re-connect with the auth token of an existing user."));
                         return;
                     }
@@ -284,10 +387,13 @@ function startWebSocketServer(app) {
                     userType = "Guest";
                 }
 
-                // Store in client store
+                // Store in client store, replacing any user this connection was previously authorised as
+                untrackConnection(connectionID);
                 clientStore[connectionID].userID = userID;
                 clientStore[connectionID].user = user;
                 clientStore[connectionID].userType = userType;
+                clientStore[connectionID].conversations = {};
+                addToIndex(activeUsers, userID, connectionID);
 
                 ws.send(JSON.stringify({
                     event: "connected",
@@ -352,11 +458,11 @@ function startWebSocketServer(app) {
                             return;
                         }
                         // Add conversation to clientStore
-                        clientStore[connectionID]["conversations"][chatID] = {
+                        addConversation(connectionID, chatID, {
                             recipientID: hostID,
                             recipientUsername: hostUsername,
                             reservationReferenceNum: reservation.referenceNum,
-                        };
+                        });
 
                         // Send down chat ID event
                         const message = JSON.stringify({
@@ -397,11 +503,11 @@ function startWebSocketServer(app) {
                             }
 
                             // Add guest information to client store, including reservation reference
-                            clientStore[connectionID]["conversations"][chatID] = {
+                            addConversation(connectionID, chatID, {
                                 recipientID: guestID,
                                 recipientUsername: guestUsername,
                                 reservationReferenceNum: reservationReferenceNum,
-                            };
+                            });
 
                             // Send down the chat ID event
                             const message = JSON.stringify({
@@ -431,8 +537,11 @@ function startWebSocketServer(app) {
         });
 
         ws.on("close", () => {
+            if (!clientStore[connectionID]) {
+                return;
+            }
             broadcastActivity(connectionID, false);
-            delete clientStore[connectionID];
+            removeConnection(connectionID);
         });
 
         ws.on("error", (error) => {
@@ -633,29 +742,25 @@ function startWebSocketServer(app) {
     }
 
     function broadcastActivity(connectionID, activityStatus) {
-        // Active users is a userID to connectionID map
-        var activeUsers = {};
-        for (const connectionID of Object.keys(clientStore)) {
-            activeUsers[clientStore[connectionID].userID] = connectionID;
-        }
-
         for (const chatID of Object.keys(clientStore[connectionID].conversations)) {
             // Loop through connection's chats to get the respective recipient's websockets
             const recipientID = clientStore[connectionID].conversations[chatID].recipientID; // recipient of chat
-            if (Object.keys(activeUsers).includes(recipientID)) {
-                // Check if chat recipient is currently active
-                // Obtain the recipient's websocket from clientStore
-                const recipientWS = clientStore[activeUsers[recipientID]].ws;
-
-                const message = {
-                    action: activityStatus
-                        ? "chat_partner_online"
-                        : "chat_partner_offline",
-                    chatID: chatID,
-                };
+            const recipientConnections = activeUsers.get(recipientID);
+            if (!recipientConnections) {
+                // Chat recipient is not currently active
+                continue;
+            }
+
+            const message = JSON.stringify({
+                action: activityStatus
+                    ? "chat_partner_online"
+                    : "chat_partner_offline",
+                chatID: chatID,
+            });
 
+            for (const recipientConnectionID of recipientConnections) {
                 try {
-                    recipientWS.send(JSON.stringify(message));
+                    clientStore[recipientConnectionID].ws.send(message);
                 } catch (error) {
                     Logger.log(
                         `CHAT WEBSOCKETSERVER BROADCASTACTIVITY ERROR: Failed to update recipient ${recipientID} of connection ${connectionID} with new status information; error: ${error}`
@@ -667,15 +772,8 @@ function startWebSocketServer(app) {
 
     function broadcastMessage(message, chatID) {
         const processedMessage = JSON.stringify(message);
-        var sockets = [];
-        for (const connectionID of Object.keys(clientStore)) {
-            const connectionConversations = clientStore[connectionID]["conversations"];
-            if (Object.keys(connectionConversations).includes(chatID)) {
-                sockets.push(clientStore[connectionID]["ws"]);
-            }
-        }
-
-        for (const socket of sockets) {
+        for (const connectionID of chatConnections.get(chatID) || []) {
+            const socket = clientStore[connectionID]["ws"];
             if (socket.readyState === WebSocket.OPEN) {
                 socket.send(processedMessage);
             }
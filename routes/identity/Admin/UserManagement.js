@@ -3,7 +3,7 @@ const router = express.Router();
 const { Guest, Host, Admin, UserRecord } = require("../../../models");
 const { validateAdmin } = require("../../../middleware/auth");
 const { Op } = require("sequelize");
-const { Logger, Universal } = require("../../../services");
+const { Logger, Universal, UserRecordCache } = require("../../../services");
 const yup = require("yup");
 const { dispatchVerificationEmail } = require("../emailVerification");
 
@@ -55,6 +55,7 @@ router.post('/toggleBanUser', validateAdmin, async (req, res) => {
             Logger.log(`IDENTITY USERMANAGEMENT BANUSER ERROR: Failed to toggle ban status for user with ID ${userID}`)
             return res.status(500).send("ERROR: Failed to ban user");
         }
+        UserRecordCache.invalidate(userID);
 
         Logger.log(`IDENTITY USERMANAGEMENT BANUSER: ${user.banned ? 'Banned' : 'Unbanned'} user with ID ${userID}`);
         res.status(200).json({ message: "SUCCESS: Ban status updated", banned: user.banned });
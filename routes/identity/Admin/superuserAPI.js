@@ -1,5 +1,5 @@
 const express = require("express");
-const { Admin, ChatHistory, ChatMessage, FavouriteListing, FoodListing, Guest, Host, ListingAnalytics, RequestAnalytics, Reservation, Review, ReviewLike, SystemAnalytics, UserRecord, Warning } = require('../../../models');
+const { Admin, ChatHistory, ChatMessage, FoodListing, Guest, Host, Reservation, Review } = require('../../../models');
 const Logger = require("../../../services/Logger");
 const Universal = require("../../../services/Universal");
 const Extensions = require("../../../services/Extensions");
@@ -7,9 +7,21 @@ const Cache = require("../../../services/Cache");
 const Analytics = require("../../../services/Analytics");
 const Encryption = require("../../../services/Encryption");
 const FileManager = require("../../../services/FileManager");
+const RuntimeStats = require("../../../services/RuntimeStats");
+const DatabaseReset = require("../../../services/DatabaseReset");
+const DatasetGenerator = require("../../../services/DatasetGenerator");
+const UserRecordCache = require("../../../services/UserRecordCache");
+const Emailer = require("../../../services/Emailer");
 const { validateSuperuser, validateSuperuserSensitive } = require("../../../middleware/auth");
+const compressResponse = require("../../../middleware/compressResponse");
+const { Op } = require("sequelize");
 const router = express.Router();
 
+const BULK_ACCOUNT_INFO_LIMIT = 500;
+const ANALYTICS_PAGE_DEFAULT_LIMIT = 1000;
+const ANALYTICS_PAGE_MAX_LIMIT = 5000;
+const RUNTIME_TOGGLES = ["analyticsEnabled", "openaiChatEnabled", "usageLock", "superuserSensitiveActive"];
+
 async function isUniqueUsername(username) {
     const usernameExists = await Guest.findOne({ where: { username } }) ||
         await Host.findOne({ where: { username } }) ||
@@ -24,6 +36,9 @@ async function isUniqueEmail(email) {
     return !emailExists;
 }
 
+// Account, analytics and log exports can run to many megabytes; compress them for the console
+router.use(compressResponse);
+
 router.get("/", (req, res) => {
     return res.send("SUCCESS: Superuser API is healthy!");
 })
@@ -64,16 +79,102 @@ router.post("/accountInfo", validateSuperuser, async (req, res) => {
     }
 })
 
+router.post("/bulkAccountInfo", validateSuperuser, async (req, res) => {
+    const { identifiers } = req.body;
+    if (!Array.isArray(identifiers) || identifiers.length == 0) {
+        return res.status(400).send("ERROR: One or more required payloads were not provided.");
+    }
+    if (identifiers.length > BULK_ACCOUNT_INFO_LIMIT) {
+        return res.status(400).send(`ERROR: A maximum of ${BULK_ACCOUNT_INFO_LIMIT} identifiers can be looked up at once.`);
+    }
+
+    const lookup = { userID: [], username: [], email: [] };
+    for (const identifier of identifiers) {
+        if (!identifier || !Object.keys(lookup).includes(identifier.type) || typeof identifier.value !== "string") {
+            return res.status(400).send("ERROR: Invalid identifier provided.");
+        }
+        lookup[identifier.type].push(identifier.value);
+    }
+
+    const whereClause = {
+        [Op.or]: Object.keys(lookup)
+            .filter(type => lookup[type].length > 0)
+            .map(type => ({ [type]: { [Op.in]: lookup[type] } }))
+    };
+
+    try {
+        // One IN (...) query per account table, instead of up to three point lookups per identifier
+        const accountsByTable = await Promise.all([Admin, Host, Guest].map(model => model.findAll({ where: whereClause })));
+
+        // Tables are indexed in reverse priority so that, as with accountInfo, Guest matches take precedence over Host and Admin matches
+        const accountIndex = { userID: {}, username: {}, email: {} };
+        for (const accounts of accountsByTable) {
+            for (const account of accounts) {
+                const processedData = account.toJSON();
+                if (processedData.password) {
+                    delete processedData.password;
+                }
+
+                for (const type of Object.keys(accountIndex)) {
+                    accountIndex[type][processedData[type]] = processedData;
+                }
+            }
+        }
+
+        const results = identifiers.map(identifier => ({
+            identifierType: identifier.type,
+            identifier: identifier.value,
+            account: accountIndex[identifier.type][identifier.value] || null
+        }));
+
+        return res.status(200).json(results);
+    } catch (err) {
+        Logger.log(`SUPERUSERAPI BULKACCOUNTINFO ERROR: Failed to retrieve account info in bulk; error: ${err}`);
+        return res.status(500).send("ERROR: Failed to retrieve account info.")
+    }
+})
+
 router.post("/getAnalytics", validateSuperuser, async (req, res) => {
     if (!Analytics.checkPermission()) {
         return res.status(400).send("ERROR: Analytics service is not enabled.");
     }
 
     try {
-        const persistResult = await Analytics.persistData();
-        if (persistResult !== true) {
-            Logger.log(`SUPERUSERAPI GETANALYTICS ERROR: Failed to persist analytics data; error: ${persistResult}`);
-            return res.status(500).send("ERROR: Failed to persist and retrieve analytics data.");
+        // Incremental mode: only rows updated since the `since` watermark, one page at a time
+        const incremental = req.body && "since" in req.body;
+        var { since, until, limit, cursor } = req.body || {};
+        if (incremental) {
+            const isValidDate = (value) => typeof value === "string" && !isNaN(new Date(value).getTime());
+            if ((since !== null && !isValidDate(since)) || (until !== undefined && !isValidDate(until))) {
+                return res.status(400).send("ERROR: Invalid since or until timestamp provided.");
+            }
+            if (limit === undefined) {
+                limit = ANALYTICS_PAGE_DEFAULT_LIMIT;
+            } else if (!Number.isInteger(limit) || limit <= 0 || limit > ANALYTICS_PAGE_MAX_LIMIT) {
+                return res.status(400).send(`ERROR: Limit must be an integer between 1 and ${ANALYTICS_PAGE_MAX_LIMIT}.`);
+            }
+            if (cursor !== undefined && cursor !== null && (typeof cursor !== "object" || Array.isArray(cursor))) {
+                return res.status(400).send("ERROR: Invalid cursor provided.");
+            }
+        }
+
+        // Continuation pages are read up to the first page's `until`, so cached updates only need to be persisted once per pull
+        if (!incremental || !cursor) {
+            const persistResult = await Analytics.persistData();
+            if (persistResult !== true) {
+                Logger.log(`SUPERUSERAPI GETANALYTICS ERROR: Failed to persist analytics data; error: ${persistResult}`);
+                return res.status(500).send("ERROR: Failed to persist and retrieve analytics data.");
+            }
+        }
+
+        if (incremental) {
+            const changedData = await Analytics.getMetricsChangedSince(since, until, limit, cursor);
+            if (typeof changedData == "string") {
+                Logger.log(`SUPERUSERAPI GETANALYTICS ERROR: Failed to retrieve changed analytics data; error: ${changedData}`);
+                return res.status(500).send("ERROR: Failed to persist and retrieve analytics data.");
+            }
+
+            return res.status(200).json(changedData);
         }
 
         const allData = await Analytics.getAllMetrics();
@@ -89,6 +190,48 @@ router.post("/getAnalytics", validateSuperuser, async (req, res) => {
     }
 })
 
+router.post("/analyticsHealth", validateSuperuser, (req, res) => {
+    try {
+        return res.status(200).json(Analytics.getPersistenceHealth());
+    } catch (err) {
+        Logger.log(`SUPERUSERAPI ANALYTICSHEALTH ERROR: Failed to retrieve analytics persistence health; error: ${err}`);
+        return res.status(500).send("ERROR: Failed to retrieve analytics health.");
+    }
+})
+
+router.post("/runtimeStats", validateSuperuser, (req, res) => {
+    try {
+        return res.status(200).json(RuntimeStats.getStats());
+    } catch (err) {
+        Logger.log(`SUPERUSERAPI RUNTIMESTATS ERROR: Failed to retrieve runtime stats; error: ${err}`);
+        return res.status(500).send("ERROR: Failed to retrieve runtime stats.");
+    }
+})
+
+router.post("/emailQueue", validateSuperuser, (req, res) => {
+    try {
+        return res.status(200).json(Emailer.getQueueStats());
+    } catch (err) {
+        Logger.log(`SUPERUSERAPI EMAILQUEUE ERROR: Failed to retrieve email queue stats; error: ${err}`);
+        return res.status(500).send("ERROR: Failed to retrieve email queue stats.");
+    }
+})
+
+router.post("/userRecordCache", validateSuperuser, (req, res) => {
+    try {
+        return res.status(200).json(UserRecordCache.getStats());
+    } catch (err) {
+        Logger.log(`SUPERUSERAPI USERRECORDCACHE ERROR: Failed to retrieve user record cache stats; error: ${err}`);
+        return res.status(500).send("ERROR: Failed to retrieve user record cache stats.");
+    }
+})
+
+router.post("/flushUserRecordCache", validateSuperuser, (req, res) => {
+    const dropped = UserRecordCache.flush();
+    Logger.log(`SUPERUSERAPI FLUSHUSERRECORDCACHE: User record cache flushed; ${dropped} records dropped.`);
+    return res.status(200).json({ message: "SUCCESS: User record cache flushed.", dropped: dropped });
+})
+
 router.post("/toggleAnalytics", validateSuperuser, (req, res) => {
     const { newStatus } = req.body;
     if (newStatus && typeof newStatus !== "boolean") {
@@ -174,6 +317,7 @@ router.post("/deleteAdmin", validateSuperuser, async (req, res) => {
         }
 
         await targetAdmin.destroy();
+        UserRecordCache.invalidate(targetAdmin.userID);
         return res.status(200).send("SUCCESS: Admin deleted successfully.");
     } catch (err) {
         Logger.log(`SUPERUSERAPI DELETEADMIN ERROR: Failed to identify and delete admin; error: ${err}`);
@@ -244,21 +388,95 @@ router.post("/getLogs", validateSuperuser, async (req, res) => {
         return res.status(400).send("ERROR: Logging service is not enabled.");
     }
 
-    try {
-        const logs = Logger.readLogs();
-        if (typeof logs == "string") {
-            Logger.log(`SUPERUSERAPI GETLOGS ERROR: Failed to retrieve logs; error: ${logs}`);
+    // Manifest mode: describe the rotated log segments and the live logs file, with their cursor ranges
+    if (req.body.manifest === true) {
+        try {
+            return res.status(200).json(Logger.getManifest());
+        } catch (err) {
+            Logger.log(`SUPERUSERAPI GETLOGS ERROR: Failed to retrieve logs manifest; error: ${err}`);
+            return res.status(500).send("ERROR: Failed to retrieve logs manifest.");
+        }
+    }
+
+    // Streamed mode: send raw log lines from a byte offset cursor onwards. The cursor to resume from is sent back in the LogCursor header.
+    const { stream, cursor } = req.body;
+    if (stream === true) {
+        const startCursor = cursor === undefined || cursor === null ? 0 : parseInt(cursor);
+        if (isNaN(startCursor) || startCursor < 0) {
+            return res.status(400).send("ERROR: Invalid cursor provided.");
+        }
+
+        const logsStream = Logger.streamLogs(startCursor);
+        if (typeof logsStream == "string") {
+            Logger.log(`SUPERUSERAPI GETLOGS ERROR: Failed to stream logs; error: ${logsStream}`);
             return res.status(500).send("ERROR: Failed to retrieve logs.");
         }
 
-        return res.status(200).json(logs);
+        res.status(200);
+        res.setHeader("Content-Type", "text/plain; charset=utf-8");
+        res.setHeader("LogCursor", String(logsStream.nextCursor));
+        res.setHeader("LogCursorStart", String(logsStream.startCursor));
+        res.setHeader("LogCursorReset", logsStream.reset ? "True" : "False");
+        if (!logsStream.stream) {
+            return res.end();
+        }
+
+        logsStream.stream.on("error", (err) => {
+            Logger.log(`SUPERUSERAPI GETLOGS ERROR: Logs stream failed; error: ${err}`);
+            res.destroy(err);
+        });
+        return logsStream.stream.pipe(res);
+    }
+
+    // Array mode: all log lines as a JSON array, written out line by line across segments
+    var started = false;
+    try {
+        for await (const log of Logger.readLines(0)) {
+            if (!started) {
+                res.status(200);
+                res.setHeader("Content-Type", "application/json; charset=utf-8");
+                started = true;
+                res.write("[" + JSON.stringify(log));
+            } else if (!res.write("," + JSON.stringify(log))) {
+                await new Promise(resolve => res.once("drain", resolve));
+            }
+        }
+
+        if (!started) {
+            return res.status(200).json([]);
+        }
+        return res.end("]");
     } catch (err) {
+        Logger.log(`SUPERUSERAPI GETLOGS ERROR: Failed to retrieve logs; error: ${err}`);
+        if (started) {
+            return res.destroy(err);
+        }
         return res.status(500).send("ERROR: Failed to retrieve logs.");
     }
 });
 
 router.get("/getFileManagerContext", validateSuperuser, async (req, res) => {
     try {
+        const version = FileManager.getContextVersion();
+        if (version.startsWith("ERROR")) {
+            return res.status(500).send(version)
+        }
+
+        // The version identifies the context state; with `since`, the response holds only the changes after that version
+        const etag = `"${version}"`;
+        res.set("ETag", etag);
+        if (req.headers["if-none-match"] === etag) {
+            return res.status(304).end();
+        }
+
+        if (req.query.since !== undefined) {
+            const changes = FileManager.getContextChangesSince(req.query.since);
+            if (typeof changes == "string") {
+                return res.status(500).send(changes)
+            }
+            return res.json(changes)
+        }
+
         const context = FileManager.getContext();
         if (typeof context == "string") {
             return res.status(500).send(context)
@@ -286,6 +504,38 @@ router.post("/toggleSuperuserSensitive", validateSuperuser, async (req, res) =>
     return res.status(200).send(`SUCCESS: Superuser sensitive actions toggled to ${Cache.get("superuserSensitiveActive")}`);
 })
 
+router.post("/cacheState", validateSuperuser, (req, res) => {
+    return res.status(200).json(Cache.getState());
+})
+
+router.post("/updateToggles", validateSuperuser, (req, res) => {
+    const { toggles, expectedVersion } = req.body;
+    if (!toggles || typeof toggles !== "object" || Array.isArray(toggles) || Object.keys(toggles).length == 0) {
+        return res.status(400).send("ERROR: One or more required payloads were not provided.");
+    }
+    for (const key of Object.keys(toggles)) {
+        if (!RUNTIME_TOGGLES.includes(key) || typeof toggles[key] !== "boolean") {
+            return res.status(400).send(`ERROR: Invalid toggle '${key}' provided.`);
+        }
+    }
+    if (toggles.superuserSensitiveActive !== undefined && process.env.SUPERUSER_SENSITIVE_ACTIONS_ENABLED !== "True") {
+        return res.status(403).send("ERROR: Superuser sensitive actions are denied.")
+    }
+    if (expectedVersion !== undefined && expectedVersion !== null && expectedVersion !== Cache.getVersion()) {
+        return res.status(409).send(`UERROR: Runtime toggles were changed by someone else (version ${Cache.getVersion()}, expected ${expectedVersion}). Reload and try again.`);
+    }
+
+    const saveResult = Cache.setMany(toggles);
+    if (saveResult !== true) {
+        Logger.log(`SUPERUSERAPI UPDATETOGGLES ERROR: Failed to update runtime toggles; error: ${saveResult}`);
+        return res.status(500).send("ERROR: Failed to update runtime toggles.");
+    }
+
+    Logger.log(`SUPERUSERAPI UPDATETOGGLES: Runtime toggles updated to ${JSON.stringify(toggles)} (cache version ${Cache.getVersion()}).`);
+
+    return res.status(200).json(Cache.getState());
+})
+
 router.post("/clearFM", validateSuperuser, validateSuperuserSensitive, async (req, res) => {
     try {
         const clearResult = await FileManager.deleteAll();
@@ -299,61 +549,56 @@ router.post("/clearFM", validateSuperuser, validateSuperuserSensitive, async (re
     }
 })
 
+/**
+ * Starts an NDJSON response and returns a function that writes one event per line, flushed through compression straight away so the console sees progress live.
+ */
+function progressStream(res) {
+    res.status(200);
+    res.setHeader("Content-Type", "application/x-ndjson; charset=utf-8");
+    return (event) => {
+        res.write(JSON.stringify(event) + "\n");
+        if (typeof res.flush == "function") {
+            res.flush();
+        }
+    }
+}
+
 router.post("/softReset", validateSuperuser, validateSuperuserSensitive, async (req, res) => {
-    try {
-        await Admin.destroy({ where: {} });
-        await ChatHistory.destroy({ where: {} });
-        await ChatMessage.destroy({ where: {} });
-        await FavouriteListing.destroy({ where: {} });
-        await FoodListing.destroy({ where: {} });
-        await Guest.destroy({ where: {} });
-        await Host.destroy({ where: {} });
-        await ListingAnalytics.destroy({ where: {} });
-        await RequestAnalytics.destroy({ where: {} });
-        await Reservation.destroy({ where: {} });
-        await Review.destroy({ where: {} });
-        await ReviewLike.destroy({ where: {} });
-        await SystemAnalytics.destroy({ where: {} });
-        await UserRecord.destroy({ where: {} });
-        await Warning.destroy({ where: {} });
-
-        await Analytics.createRecordIfNotExist("system");
-
-        Logger.log(`SUPERUSERAPI SOFTRESET: Database soft reset successful.`);
-        console.log("SUPERUSERAPI PRESENTATIONTRANSFORM: Database soft reset successful.");
-        return res.status(200).send("SUCCESS: Database soft reset successful.");
-    } catch (err) {
-        Logger.log(`SUPERUSERAPI SOFTRESET ERROR: Failed to soft reset database; error: ${err}`);
-        return res.status(500).send("ERROR: Failed to soft reset database. This could critically cripple the system. Please run checks.")
+    // Streamed mode: report every step of the reset as a line of NDJSON as it completes
+    const report = req.body.stream === true ? progressStream(res) : null;
+
+    const resetResult = await DatabaseReset.reset(report);
+    if (typeof resetResult == "string") {
+        Logger.log(`SUPERUSERAPI SOFTRESET ERROR: Failed to soft reset database; error: ${resetResult}`);
+        if (report) {
+            return res.end();
+        }
+        return res.status(500).send("ERROR: Failed to soft reset database. All changes were rolled back; please run checks.")
     }
+
+    Logger.log(`SUPERUSERAPI SOFTRESET: Database soft reset successful; ${resetResult.rows} rows cleared in ${resetResult.durationMs}ms.`);
+    console.log("SUPERUSERAPI SOFTRESET: Database soft reset successful.");
+    if (report) {
+        return res.end();
+    }
+    return res.status(200).send("SUCCESS: Database soft reset successful.");
 })
 
 router.post("/presentationTransform", validateSuperuser, validateSuperuserSensitive, async (req, res) => {
     // Soft reset first
-    try {
-        await Admin.destroy({ where: {} });
-        await ChatHistory.destroy({ where: {} });
-        await ChatMessage.destroy({ where: {} });
-        await FavouriteListing.destroy({ where: {} });
-        await FoodListing.destroy({ where: {} });
-        await Guest.destroy({ where: {} });
-        await Host.destroy({ where: {} });
-        await ListingAnalytics.destroy({ where: {} });
-        await RequestAnalytics.destroy({ where: {} });
-        await Reservation.destroy({ where: {} });
-        await Review.destroy({ where: {} });
-        await ReviewLike.destroy({ where: {} });
-        await SystemAnalytics.destroy({ where: {} });
-        await UserRecord.destroy({ where: {} });
-        await Warning.destroy({ where: {} });
-
-        Logger.log(`SUPERUSERAPI PRESENTATIONTRANSFORM: Database soft reset successful.`);
-        console.log("SUPERUSERAPI PRESENTATIONTRANSFORM: Database soft reset successful.");
-    } catch (err) {
-        Logger.log(`SUPERUSERAPI PRESENTATIONTRANSFORM ERROR: Failed to soft reset database; error: ${err}`);
-        return res.status(500).send("ERROR: Failed to soft reset database. This could critically cripple the system. Please run checks.")
+    const report = req.body.stream === true ? progressStream(res) : null;
+    const resetResult = await DatabaseReset.reset(report);
+    if (typeof resetResult == "string") {
+        Logger.log(`SUPERUSERAPI PRESENTATIONTRANSFORM ERROR: Failed to soft reset database; error: ${resetResult}`);
+        if (report) {
+            return res.end();
+        }
+        return res.status(500).send("ERROR: Failed to soft reset database. All changes were rolled back; please run checks.")
     }
 
+    Logger.log(`SUPERUSERAPI PRESENTATIONTRANSFORM: Database soft reset successful.`);
+    console.log("SUPERUSERAPI PRESENTATIONTRANSFORM: Database soft reset successful.");
+
     // Create presentation data
     try {
         // Create Jamie Oliver
@@ -564,11 +809,47 @@ router.post("/presentationTransform", validateSuperuser, validateSuperuserSensit
             `Chat Message with ID ${chatMessage.messageID} (Datetime: ${new Date(chatMessage.datetime).toString()}) created for ${chatMessage.senderID}`
         ]
 
+        if (report) {
+            report({ event: "presentation", success: true, messages: messages });
+            return res.end();
+        }
         return res.json({ messages: messages })
     } catch (err) {
         Logger.log(`SUPERUSERAPI PRESENTATIONTRANSFORM ERROR: Failed to create presentation data; error: ${err}`);
+        if (report) {
+            report({ event: "error", success: false, error: "Failed to create presentation data. This could critically cripple the system. Please run checks." });
+            return res.end();
+        }
         return res.status(500).send("ERROR: Failed to create presentation data. This could critically cripple the system. Please run checks.")
     }
 })
 
+router.post("/generateDataset", validateSuperuser, validateSuperuserSensitive, async (req, res) => {
+    const parameters = req.body.parameters || {};
+    if (typeof parameters != "object" || Array.isArray(parameters)) {
+        return res.status(400).send("UERROR: Dataset parameters must be an object.");
+    }
+    const validated = DatasetGenerator.validate(parameters);
+    if (typeof validated == "string") {
+        return res.status(400).send(validated.replace(/^ERROR: /, "UERROR: "));
+    }
+
+    // Large datasets take minutes to load, so progress can be streamed like resets
+    const report = req.body.stream === true ? progressStream(res) : null;
+    const generateResult = await DatasetGenerator.generate(validated, report);
+    if (typeof generateResult == "string") {
+        Logger.log(`SUPERUSERAPI GENERATEDATASET ERROR: Failed to generate dataset; error: ${generateResult}`);
+        if (report) {
+            return res.end();
+        }
+        return res.status(500).send("ERROR: Failed to generate dataset. All changes were rolled back.");
+    }
+
+    Logger.log(`SUPERUSERAPI GENERATEDATASET: Generated dataset with seed ${generateResult.seed}; ${generateResult.rows} rows loaded in ${generateResult.durationMs}ms.`);
+    if (report) {
+        return res.end();
+    }
+    return res.json(generateResult);
+})
+
 module.exports = { router, at: '/admin/super' };
\ No newline at end of file
@@ -2,7 +2,7 @@ const express = require('express');
 const router = express.Router();
 const yup = require('yup');
 const axios = require('axios');
-const { Logger, Encryption } = require('../../services');
+const { Logger, Encryption, UserRecordCache } = require('../../services');
 const { Guest, Host, Admin, FoodListing, Review, ChatMessage } = require('../../models');
 const { validateToken } = require('../../middleware/auth');
 const FileManager = require('../../services/FileManager');
@@ -206,6 +206,7 @@ router.delete('/deleteAccount', validateToken, async (req, res) => {
             res.status(500).send(`ERROR: Failed to delete user ${userID}`)
             return
         }
+        UserRecordCache.invalidate(userID);
 
         Logger.log(`IDENTITY MYACCOUNT DELETEACCOUNT: ${userType} account ${userID} deleted.`)
         res.send(`SUCCESS: User ${userID} deleted successfully.`);
@@ -5,11 +5,78 @@ const Logger = require('../../services/Logger');
 const Universal = require('../../services/Universal');
 const yup = require('yup');
 const path = require('path');
-const { Op } = require('sequelize');
-const { Extensions, Emailer, HTMLRenderer } = require('../../services');
+const { Op, UniqueConstraintError } = require('sequelize');
+const { Extensions, Emailer, HTMLRenderer, RuntimeStats } = require('../../services');
 const router = express.Router();
 
+const REFERENCE_ALLOCATION_ATTEMPTS = 5;
+
+// Since boot, except the window fields, which restart every time runtime stats are read
+const bookingStats = { bookings: 0, failed: 0, allocationRetries: 0, allocationExhausted: 0, maxAttempts: 0, totalLatencyMs: 0, maxLatencyMs: 0, windowBookings: 0, windowLatencyMs: 0, windowMaxLatencyMs: 0 };
+
+RuntimeStats.registerProbe("reservations", () => {
+    const round = (value) => Math.round(value * 100) / 100;
+    const readings = {
+        bookings: bookingStats.bookings,
+        failed: bookingStats.failed,
+        allocationRetries: bookingStats.allocationRetries,
+        allocationExhausted: bookingStats.allocationExhausted,
+        maxAttempts: bookingStats.maxAttempts,
+        meanLatencyMs: bookingStats.bookings > 0 ? round(bookingStats.totalLatencyMs / bookingStats.bookings) : null,
+        maxLatencyMs: round(bookingStats.maxLatencyMs),
+        window: {
+            bookings: bookingStats.windowBookings,
+            meanLatencyMs: bookingStats.windowBookings > 0 ? round(bookingStats.windowLatencyMs / bookingStats.windowBookings) : null,
+            maxLatencyMs: round(bookingStats.windowMaxLatencyMs)
+        }
+    };
+    bookingStats.windowBookings = 0;
+    bookingStats.windowLatencyMs = 0;
+    bookingStats.windowMaxLatencyMs = 0;
+    return readings;
+});
+
+function recordBooking(startTime, succeeded) {
+    if (!succeeded) {
+        bookingStats.failed += 1;
+        return;
+    }
+    const latencyMs = Number(process.hrtime.bigint() - startTime) / 1e6;
+    bookingStats.bookings += 1;
+    bookingStats.totalLatencyMs += latencyMs;
+    bookingStats.maxLatencyMs = Math.max(bookingStats.maxLatencyMs, latencyMs);
+    bookingStats.windowBookings += 1;
+    bookingStats.windowLatencyMs += latencyMs;
+    bookingStats.windowMaxLatencyMs = Math.max(bookingStats.windowMaxLatencyMs, latencyMs);
+}
+
+/**
+ * Creates a reservation under a new random reference number. The unique index on `referenceNum` rejects a reference already in use, in which case another is drawn; a collision is rare (36^6 references), so this is constant work per booking.
+ */
+async function createWithReference(fields) {
+    for (let attempt = 1; attempt <= REFERENCE_ALLOCATION_ATTEMPTS; attempt++) {
+        try {
+            const reservation = await Reservation.create({
+                ...fields,
+                referenceNum: Universal.generateUniqueID(6).toUpperCase()
+            })
+            bookingStats.maxAttempts = Math.max(bookingStats.maxAttempts, attempt);
+            return reservation;
+        } catch (err) {
+            if (!(err instanceof UniqueConstraintError)) {
+                throw err;
+            }
+            bookingStats.allocationRetries += 1;
+        }
+    }
+
+    bookingStats.allocationExhausted += 1;
+    bookingStats.maxAttempts = REFERENCE_ALLOCATION_ATTEMPTS;
+    throw new Error(`No free reference number found in ${REFERENCE_ALLOCATION_ATTEMPTS} attempts.`);
+}
+
 router.post("/createReservation", validateToken, async (req, res) => {
+    const startTime = process.hrtime.bigint();
     const guestID = req.user.userID;
     var { listingID, portions } = req.body;
     if (!listingID || !portions) {
@@ -69,21 +136,23 @@ router.post("/createReservation", validateToken, async (req, res) => {
         return res.status(400).send("UERROR: Not enough portions available.")
     }
 
-    const allReservationReferences = (await Reservation.findAll({ attributes: ['referenceNum'] })).map(r => r.referenceNum)
-
     const totalPrice = portions * listing.portionPrice
-    const reservation = await Reservation.create({
-        guestID: guestID,
-        listingID: listingID,
-        referenceNum: Universal.generateUniqueID(6, allReservationReferences).toUpperCase(),
-        datetime: new Date().toISOString(),
-        portions: portions,
-        totalPrice: totalPrice,
-        markedPaid: false,
-        paidAndPresent: false
-    })
+    var reservation;
+    try {
+        reservation = await createWithReference({
+            guestID: guestID,
+            listingID: listingID,
+            datetime: new Date().toISOString(),
+            portions: portions,
+            totalPrice: totalPrice,
+            markedPaid: false,
+            paidAndPresent: false
+        })
+    } catch (err) {
+        Logger.log(`ORDERS CONFIRMRESERVATION CREATERESERVATION ERROR: Failed to make reservation for guest ${guestID} for listing ${listingID}. Error: ${err}`)
+    }
+    recordBooking(startTime, !!reservation)
     if (!reservation) {
-        Logger.log(`ORDERS CONFIRMRESERVATION CREATERESERVATION ERROR: Failed to make reservation for guest ${guestID} for listing ${listingID}. Sequelize create response: ${reservation}`)
         return res.status(500).send("ERROR: Failed to create reservation.")
     }
 
@@ -1,4 +1,5 @@
 const { SystemAnalytics, ListingAnalytics, RequestAnalytics } = require('../models');
+const { Op } = require('sequelize');
 const Cache = require('./Cache');
 const Extensions = require('./Extensions');
 const Logger = require('./Logger');
@@ -17,10 +18,12 @@ require('dotenv').config()
  * @class Analytics
  * @method setup - Set up the analytics service. Must be called before any other method. Set withLastBoot to true to update last boot time in system metrics instance. Set updatePersistenceInterval to change the interval at which data is persisted.
  * @method createRecordIfNotExist - Create a new record if it doesn't exist. Mode can be "system", "listing", or "request". For "listing" and "request", provide listingID or requestURL and requestMethod respectively.
- * @method persistData - Persist all cached data to the database.
+ * @method persistData - Persist all cached data to the database in one transaction, with chunked multi-row upserts that increment counters in the database. Persists run one at a time; failed updates are kept for the next persist.
+ * @method getPersistenceHealth - Get persistence statistics (count, failures, rows, durations, last run and failure) and the number of pending updates.
+ * @method discardPending - Drop all cached updates without persisting them, once any persist under way has finished. For when the underlying records are being wiped.
  * @method checkForUpdates - Check if there are enough updates to persist data.
  * @method supplementListingMetricUpdate - Update listing metrics. Provide listingID and data in the form of key-value pairs.
- * @method supplementRequestMetricUpdate - Update request metrics. Provide requestURL, requestMethod, and data in the form of key-value pairs.
+ * @method supplementRequestMetricUpdate - Update request metrics. Provide requestURL, requestMethod, and data in the form of key-value pairs. Set `countUpdate` to false for data supplementing an update already counted (e.g. a request's response time), so it rides along with the next persist without bringing it forward.
  * @method supplementSystemMetricUpdate - Update system metrics. Provide data in the form of key-value pairs.
  * @method reset - Reset metrics. Mode can be "system", "listing", "request", or "all". For "listing" and "request", you can provide listingID or requestURL and requestMethod respectively to reset a specific listing/request's metrics.
  * @method setListingMetrics - Set listing metrics. Provide listingID and data in the form of key-value pairs. Removes any associated updates from the cache.
@@ -29,8 +32,10 @@ require('dotenv').config()
  * @method getListingMetrics - Get listing metrics. Provide listingID to get a specific listing's metrics, or leave blank to get all listings' metrics.
  * @method getRequestMetrics - Get request metrics. Provide requestURL and method to get a specific request's metrics, or leave blank to get all requests' metrics.
  * @method getSystemMetrics - Get system metrics.
+ * @method getMetricsChangedSince - Get one page of listing and request metrics updated between `since` and `until` (inclusive), ordered by `updatedAt`. Provide the `nextCursor` of the previous page to continue. Also returns system metrics and the current row counts of both tables.
  * @method checkPermission - Check if the analytics service is enabled.
  * @method ignoreCDN - Check if the analytics service should ignore CDN requests.
+ * @method latencyMetrics - Get the request metric update recording a response time of `durationMs` (total latency and the matching histogram bucket).
  */
 class Analytics {
     static defaultInterval = 20;
@@ -47,10 +52,27 @@ class Analytics {
         requestUpdates: {},
         systemUpdates: {}
     }
+    static #persisting = Promise.resolve()
+    static #persistInFlight = false
+    static #persistenceStats = {
+        persists: 0,
+        failures: 0,
+        rows: 0,
+        totalDurationMs: 0,
+        maxDurationMs: 0,
+        last: null,
+        lastFailure: null
+    }
+
+    // Rows per multi-row upsert statement when persisting
+    static persistChunkSize = 500;
+
+    // Upper bounds (in ms) of the response time histogram buckets recorded per request; keep in sync with the RequestAnalytics model
+    static latencyBuckets = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000];
 
     static metricRegistry = {
         listingMetrics: ["impressions", "clicks"],
-        requestMetrics: ["requestsCount", "successResponses", "lastRequest"],
+        requestMetrics: ["requestsCount", "successResponses", "lastRequest", "totalLatencyMs", ...this.latencyBuckets.map(bucket => `latencyUnder${bucket}ms`), `latencyOver${this.latencyBuckets[this.latencyBuckets.length - 1]}ms`],
         systemMetrics: ["lastBoot", "accountCreations", "listingCreations", "emailDispatches", "fileUploads", "logins"]
     }
 
@@ -68,6 +90,14 @@ class Analytics {
         return process.env.ANALYTICS_ENABLED === "True" && Cache.get("analyticsEnabled") !== false
     }
 
+    static latencyMetrics(durationMs) {
+        const bucket = this.latencyBuckets.find(bucket => durationMs <= bucket);
+        return {
+            totalLatencyMs: Math.round(durationMs),
+            [bucket !== undefined ? `latencyUnder${bucket}ms` : `latencyOver${this.latencyBuckets[this.latencyBuckets.length - 1]}ms`]: 1
+        }
+    }
+
     static ignoreCDN() {
         return process.env.ANALYTICS_CDN_IGNORE !== "False"
     }
@@ -183,107 +213,219 @@ class Analytics {
         }
     }
 
-    static async persistData() {
-        const cacheCopy = structuredClone(this.#cacheData)
-
-        if (!this.#setup || !Analytics.checkPermission()) {
-            return "ERROR: Analytics service not yet set up."
-        }
-
-        if (process.env.DEBUG_MODE === "True") {
-            console.log("Persisting data...")
+    static #emptyCache() {
+        return {
+            listingUpdates: {},
+            requestUpdates: {},
+            systemUpdates: {}
         }
+    }
 
-        // Process listing metrics
-        for (const listingID of Object.keys(cacheCopy.listingUpdates)) {
-            var listingMetricsRecord = await this.createRecordIfNotExist("listing", listingID);
-            if (typeof listingMetricsRecord === "string") {
-                return listingMetricsRecord
+    static #mergeUpdates(target, source, nonNumericalMetrics, override) {
+        // Numerical metrics are summed; non-numerical metrics keep the target's value unless override is set
+        for (const metric of Object.keys(source)) {
+            if (target[metric] === undefined) {
+                target[metric] = source[metric]
+            } else if (!nonNumericalMetrics.includes(metric)) {
+                target[metric] += source[metric]
+            } else if (override) {
+                target[metric] = source[metric]
             }
+        }
+    }
 
-            var newData = listingMetricsRecord.toJSON()
-            for (const metric of Object.keys(cacheCopy.listingUpdates[listingID])) {
-                if (!this.nonNumericalMetricRegistry.listingMetrics.includes(metric)) {
-                    newData[metric] += cacheCopy.listingUpdates[listingID][metric]
-                } else {
-                    newData[metric] = cacheCopy.listingUpdates[listingID][metric]
+    static async #bulkIncrement(Model, keyColumns, rows, nonNumericalMetrics, transaction) {
+        // One multi-row upsert per chunk: missing rows are inserted with the deltas, existing rows get `metric = metric + delta`
+        const sequelize = Model.sequelize;
+        const dialect = sequelize.getDialect();
+        if (!["mysql", "sqlite", "mariadb"].includes(dialect)) {
+            throw new Error(`Bulk analytics persistence is not supported for dialect '${dialect}'.`)
+        }
+
+        const quote = (identifier) => sequelize.getQueryInterface().quoteIdentifier(identifier);
+        const now = new Date();
+        for (let offset = 0; offset < rows.length; offset += this.persistChunkSize) {
+            const chunk = rows.slice(offset, offset + this.persistChunkSize);
+            const metrics = [...new Set(chunk.flatMap(row => Object.keys(row.updates)))];
+            const columns = keyColumns.concat(metrics, ["createdAt", "updatedAt"]);
+
+            const replacements = [];
+            const valueRows = chunk.map(row => {
+                for (const column of keyColumns) {
+                    replacements.push(row.keys[column]);
                 }
-            }
-
-            try {
-                listingMetricsRecord.set(newData);
-                await listingMetricsRecord.save();
-                // console.log("ListingAnalytics record updated:", listingMetricsRecord.toJSON())
-                if (this.#cacheData.listingUpdates[listingID] !== undefined) {
-                    delete this.#cacheData.listingUpdates[listingID]
+                for (const metric of metrics) {
+                    // Non-numerical metrics left out of a row are NULL here and keep their stored value below
+                    replacements.push(row.updates[metric] !== undefined ? row.updates[metric] : (nonNumericalMetrics.includes(metric) ? null : 0));
                 }
-            } catch (err) {
-                return `ERROR: Failed to persist ListingAnalytics updates for ID ${listingID}; error: ${err}`
+                replacements.push(now, now);
+                return `(${columns.map(() => "?").join(", ")})`
+            });
+
+            const incoming = (column) => dialect == "sqlite" ? `excluded.${quote(column)}` : `VALUES(${quote(column)})`;
+            const assignments = metrics.map(metric => nonNumericalMetrics.includes(metric)
+                ? `${quote(metric)} = COALESCE(${incoming(metric)}, ${quote(metric)})`
+                : `${quote(metric)} = ${quote(metric)} + ${incoming(metric)}`
+            ).concat([`${quote("updatedAt")} = ${incoming("updatedAt")}`]);
+
+            var statement = `INSERT INTO ${quote(Model.getTableName())} (${columns.map(quote).join(", ")}) VALUES ${valueRows.join(", ")}`;
+            if (dialect == "sqlite") {
+                statement += ` ON CONFLICT (${keyColumns.map(quote).join(", ")}) DO UPDATE SET ${assignments.join(", ")}`;
+            } else {
+                statement += ` ON DUPLICATE KEY UPDATE ${assignments.join(", ")}`;
             }
+
+            await sequelize.query(statement, { replacements, transaction });
         }
+    }
 
-        // Process request metrics
-        for (const requestIdentifier of Object.keys(cacheCopy.requestUpdates)) {
-            const requestMethod = requestIdentifier.split("_")[0]
-            const requestURL = requestIdentifier.split("_")[1]
+    static async #persistPending(pending) {
+        const listingRows = Object.keys(pending.listingUpdates).map(listingID => ({
+            keys: { listingID: listingID },
+            updates: pending.listingUpdates[listingID]
+        }));
+        const requestRows = Object.keys(pending.requestUpdates).map(requestIdentifier => {
+            // Identifiers are `METHOD_URL`; URLs may themselves contain underscores
+            const separator = requestIdentifier.indexOf("_");
+            return {
+                keys: { requestURL: requestIdentifier.substring(separator + 1), method: requestIdentifier.substring(0, separator) },
+                updates: pending.requestUpdates[requestIdentifier]
+            }
+        });
 
-            var requestMetricsRecord = await this.createRecordIfNotExist("request", null, requestURL, requestMethod);
-            if (typeof requestMetricsRecord === "string") {
-                return requestMetricsRecord
+        var systemInstanceID = this.#metadata.systemMetricsInstanceID;
+        if (Object.keys(pending.systemUpdates).length !== 0 && !systemInstanceID) {
+            const systemAnalyticsRecord = await this.createRecordIfNotExist("system");
+            if (typeof systemAnalyticsRecord === "string") {
+                throw new Error(systemAnalyticsRecord)
             }
+            systemInstanceID = systemAnalyticsRecord.instanceID;
+        }
 
-            var newData = requestMetricsRecord.toJSON()
-            for (const metric of Object.keys(cacheCopy.requestUpdates[requestIdentifier])) {
-                if (!this.nonNumericalMetricRegistry.requestMetrics.includes(metric)) {
-                    newData[metric] += cacheCopy.requestUpdates[requestIdentifier][metric]
-                } else {
-                    newData[metric] = cacheCopy.requestUpdates[requestIdentifier][metric]
+        await ListingAnalytics.sequelize.transaction(async (transaction) => {
+            await this.#bulkIncrement(ListingAnalytics, ["listingID"], listingRows, this.nonNumericalMetricRegistry.listingMetrics, transaction);
+            await this.#bulkIncrement(RequestAnalytics, ["requestURL", "method"], requestRows, this.nonNumericalMetricRegistry.requestMetrics, transaction);
+
+            if (Object.keys(pending.systemUpdates).length !== 0) {
+                const increments = {};
+                const assignments = {};
+                for (const metric of Object.keys(pending.systemUpdates)) {
+                    if (!this.nonNumericalMetricRegistry.systemMetrics.includes(metric)) {
+                        increments[metric] = pending.systemUpdates[metric]
+                    } else {
+                        assignments[metric] = pending.systemUpdates[metric]
+                    }
                 }
-            }
 
-            try {
-                requestMetricsRecord.set(newData);
-                await requestMetricsRecord.save();
-                // console.log("RequestAnalytics record updated:", requestMetricsRecord.toJSON())
-                if (this.#cacheData.requestUpdates[requestIdentifier] !== undefined) {
-                    delete this.#cacheData.requestUpdates[requestIdentifier]
+                const where = { instanceID: systemInstanceID };
+                if (Object.keys(increments).length !== 0) {
+                    await SystemAnalytics.increment(increments, { where, transaction });
+                }
+                if (Object.keys(assignments).length !== 0) {
+                    await SystemAnalytics.update(assignments, { where, transaction });
                 }
-            } catch (err) {
-                return `ERROR: Failed to persist RequestAnalytics updates for identifier ${requestIdentifier}; error: ${err}`
             }
+        });
+
+        return listingRows.length + requestRows.length + (Object.keys(pending.systemUpdates).length !== 0 ? 1 : 0);
+    }
+
+    static async persistData() {
+        if (!this.#setup || !Analytics.checkPermission()) {
+            return "ERROR: Analytics service not yet set up."
         }
 
-        // Process system metrics
-        if (Object.keys(cacheCopy.systemUpdates).length !== 0) {
-            var systemAnalyticsRecord = await this.createRecordIfNotExist("system");
-            if (typeof systemAnalyticsRecord === "string") {
-                return systemAnalyticsRecord
-            }
+        // Persists run one at a time; each takes every update cached when it starts
+        const previous = this.#persisting;
+        const run = previous.then(() => this.#persistOnce());
+        this.#persisting = run.catch(() => {});
+        return await run;
+    }
 
-            var newData = systemAnalyticsRecord.toJSON()
-            for (const metric of Object.keys(cacheCopy.systemUpdates)) {
-                if (!this.nonNumericalMetricRegistry.systemMetrics.includes(metric)) {
-                    newData[metric] += cacheCopy.systemUpdates[metric]
-                } else {
-                    newData[metric] = cacheCopy.systemUpdates[metric]
-                }
-            }
+    static async #persistOnce() {
+        const pending = this.#cacheData;
+        const pendingUpdates = this.#metadata.updates;
+        this.#cacheData = this.#emptyCache();
+        this.#metadata.updates = 0;
 
-            try {
-                systemAnalyticsRecord.set(newData);
-                await systemAnalyticsRecord.save();
-                // console.log("SystemAnalytics record updated:", systemAnalyticsRecord.toJSON())
-                this.#cacheData.systemUpdates = {}
-            } catch (err) {
-                return `ERROR: Failed to persist SystemAnalytics updates; error: ${err}`
+        if (process.env.DEBUG_MODE === "True") {
+            console.log("Persisting data...")
+        }
+
+        const startTime = process.hrtime.bigint();
+        this.#persistInFlight = true;
+        try {
+            const rows = await this.#persistPending(pending);
+            const durationMs = Number(process.hrtime.bigint() - startTime) / 1e6;
+
+            this.#persistenceStats.persists += 1;
+            this.#persistenceStats.rows += rows;
+            this.#persistenceStats.totalDurationMs += durationMs;
+            this.#persistenceStats.maxDurationMs = Math.max(this.#persistenceStats.maxDurationMs, durationMs);
+            this.#persistenceStats.last = { at: new Date().toISOString(), durationMs: Math.round(durationMs * 100) / 100, rows: rows };
+        } catch (err) {
+            // Put the updates back, underneath anything cached since, so they are retried by the next persist
+            const current = this.#cacheData;
+            this.#cacheData = pending;
+            for (const listingID of Object.keys(current.listingUpdates)) {
+                this.#cacheData.listingUpdates[listingID] = this.#cacheData.listingUpdates[listingID] || {};
+                this.#mergeUpdates(this.#cacheData.listingUpdates[listingID], current.listingUpdates[listingID], this.nonNumericalMetricRegistry.listingMetrics, true);
             }
+            for (const requestIdentifier of Object.keys(current.requestUpdates)) {
+                this.#cacheData.requestUpdates[requestIdentifier] = this.#cacheData.requestUpdates[requestIdentifier] || {};
+                this.#mergeUpdates(this.#cacheData.requestUpdates[requestIdentifier], current.requestUpdates[requestIdentifier], this.nonNumericalMetricRegistry.requestMetrics, true);
+            }
+            this.#mergeUpdates(this.#cacheData.systemUpdates, current.systemUpdates, this.nonNumericalMetricRegistry.systemMetrics, true);
+            this.#metadata.updates += pendingUpdates;
+
+            this.#persistenceStats.failures += 1;
+            this.#persistenceStats.lastFailure = { at: new Date().toISOString(), error: String(err) };
+            return `ERROR: Failed to persist analytics updates; error: ${err}`
+        } finally {
+            this.#persistInFlight = false;
         }
 
-        this.#metadata.updates = 0
         this.#metadata.lastPersistence = new Date().toISOString();
         return true;
     }
 
+    static getPersistenceHealth() {
+        const stats = this.#persistenceStats;
+        return {
+            enabled: this.checkPermission(),
+            setup: this.#setup,
+            persistenceInterval: this.#metadata.updatePersistenceInterval,
+            chunkSize: this.persistChunkSize,
+            lastUpdate: this.#metadata.lastUpdate,
+            lastPersistence: this.#metadata.lastPersistence,
+            pending: {
+                updates: this.#metadata.updates,
+                listings: Object.keys(this.#cacheData.listingUpdates).length,
+                requests: Object.keys(this.#cacheData.requestUpdates).length,
+                systemMetrics: Object.keys(this.#cacheData.systemUpdates).length
+            },
+            persists: stats.persists,
+            failures: stats.failures,
+            rowsPersisted: stats.rows,
+            meanDurationMs: stats.persists > 0 ? Math.round(stats.totalDurationMs / stats.persists * 100) / 100 : null,
+            maxDurationMs: Math.round(stats.maxDurationMs * 100) / 100,
+            last: stats.last,
+            lastFailure: stats.lastFailure
+        }
+    }
+
+    static async discardPending() {
+        if (!this.#setup) {
+            return "ERROR: Analytics service not yet set up."
+        }
+
+        // A persist under way (or putting its updates back after failing) finishes before the cache is emptied
+        await this.#persisting;
+        this.#cacheData = this.#emptyCache();
+        this.#metadata.updates = 0;
+        return true;
+    }
+
     static async checkForUpdates() {
         if (!this.#setup) {
             return "ERROR: Analytics service not yet set up."
@@ -293,6 +435,11 @@ class Analytics {
             console.log(`Update ${this.#metadata.updates} queued.`)
         }
 
+        // Updates cached while a persist is running are picked up by the next one
+        if (this.#persistInFlight) {
+            return true;
+        }
+
         if (this.#metadata.updates >= this.#metadata.updatePersistenceInterval || Extensions.timeDiffInSeconds(new Date(this.#metadata.lastPersistence), new Date()) >= 180) {
             return await this.persistData()
         }
@@ -352,7 +499,7 @@ class Analytics {
         return true;
     }
 
-    static async supplementRequestMetricUpdate(requestURL, requestMethod, data) {
+    static async supplementRequestMetricUpdate(requestURL, requestMethod, data, countUpdate = true) {
         if (!this.#setup) {
             return "ERROR: Analytics service not yet set up."
         }
@@ -399,8 +546,12 @@ class Analytics {
             }
         }
 
-        this.#metadata.updates += 1
         this.#metadata.lastUpdate = new Date().toISOString()
+        if (!countUpdate) {
+            return true;
+        }
+
+        this.#metadata.updates += 1
         await this.checkForUpdates();
         return true;
     }
@@ -539,11 +690,14 @@ class Analytics {
                         return "ERROR: Failed to retrieve RequestAnalytics record for reset."
                     }
 
-                    requestMetricsInstance.set({
-                        requestsCount: 0,
-                        successResponses: 0,
-                        lastRequest: null
-                    })
+                    const resetData = { lastRequest: null };
+                    for (const metric of this.metricRegistry.requestMetrics) {
+                        if (!this.nonNumericalMetricRegistry.requestMetrics.includes(metric)) {
+                            resetData[metric] = 0
+                        }
+                    }
+
+                    requestMetricsInstance.set(resetData)
                     await requestMetricsInstance.save()
 
                     return true;
@@ -801,6 +955,94 @@ class Analytics {
         }
     }
 
+    static #keysetWhere(cursor, keyColumns) {
+        // Rows strictly after the cursor in (updatedAt, ...keyColumns) order
+        const updatedAt = new Date(cursor.updatedAt);
+        const after = [];
+        for (let i = keyColumns.length - 1; i >= 0; i--) {
+            const condition = { [keyColumns[i]]: { [Op.gt]: cursor[keyColumns[i]] } };
+            keyColumns.slice(0, i).forEach(column => condition[column] = cursor[column]);
+            after.push(condition);
+        }
+
+        return {
+            [Op.or]: [
+                { updatedAt: { [Op.gt]: updatedAt } },
+                { updatedAt: updatedAt, [Op.or]: after }
+            ]
+        }
+    }
+
+    static async #getChangedPage(model, keyColumns, since, until, limit, cursor) {
+        const conditions = [{ updatedAt: { [Op.lte]: until } }];
+        if (since) {
+            conditions.push({ updatedAt: { [Op.gte]: since } });
+        }
+        if (cursor) {
+            conditions.push(this.#keysetWhere(cursor, keyColumns));
+        }
+
+        const rows = await model.findAll({
+            where: { [Op.and]: conditions },
+            order: [["updatedAt", "ASC"], ...keyColumns.map(column => [column, "ASC"])],
+            limit: limit
+        });
+
+        var nextCursor = null;
+        if (rows.length == limit) {
+            const last = rows[rows.length - 1];
+            nextCursor = { updatedAt: last.updatedAt.toISOString() };
+            keyColumns.forEach(column => nextCursor[column] = last[column]);
+        }
+
+        return { rows: rows.map(row => row.toJSON()), nextCursor: nextCursor }
+    }
+
+    static async getMetricsChangedSince(since = null, until = null, limit = 1000, cursor = null) {
+        if (!this.#setup) {
+            return "ERROR: Analytics service not yet set up."
+        }
+
+        try {
+            since = since ? new Date(since) : null;
+            until = until ? new Date(until) : new Date();
+            cursor = cursor || {};
+
+            // A persist under way may have stamped its rows at or before `until` without committing them yet; reading before it commits would skip them for good, since the next pull starts after `until`. Persists starting from here on stamp later times.
+            await this.#persisting;
+
+            // A table whose cursor is explicitly null has been fully read on an earlier page
+            const [listingPage, requestPage] = await Promise.all([
+                cursor.listingMetrics === null ? { rows: [], nextCursor: null } : this.#getChangedPage(ListingAnalytics, ["listingID"], since, until, limit, cursor.listingMetrics),
+                cursor.requestMetrics === null ? { rows: [], nextCursor: null } : this.#getChangedPage(RequestAnalytics, ["requestURL", "method"], since, until, limit, cursor.requestMetrics)
+            ]);
+
+            const systemMetricResults = await this.getSystemMetrics();
+            if (typeof systemMetricResults === "string") {
+                return systemMetricResults
+            }
+
+            const [listingCount, requestCount] = await Promise.all([ListingAnalytics.count(), RequestAnalytics.count()]);
+
+            return {
+                listingMetrics: listingPage.rows,
+                requestMetrics: requestPage.rows,
+                systemMetrics: systemMetricResults,
+                totals: {
+                    listingMetrics: listingCount,
+                    requestMetrics: requestCount
+                },
+                until: until.toISOString(),
+                nextCursor: listingPage.nextCursor || requestPage.nextCursor ? {
+                    listingMetrics: listingPage.nextCursor,
+                    requestMetrics: requestPage.nextCursor
+                } : null
+            }
+        } catch (err) {
+            return `ERROR: Failed to retrieve changed metrics; error: ${err}`
+        }
+    }
+
     static async getAllMetrics() {
         const listingMetricResults = await this.getListingMetrics();
         if (typeof listingMetricResults === "string") {
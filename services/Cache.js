@@ -1,28 +1,76 @@
+const fs = require('fs');
 const FileOps = require("./FileOps");
 
 /**
  * Cache class to store data in memory and persist to disk. Key-value store for small persistence needs.
- * 
- * @method load: Load the cache from disk
- * @method save: Save the cache to disk
+ *
+ * Reads are served from memory. Writes are write-behind: every change bumps the cache version and is appended to `cache.journal` synchronously (one short line), and `cache.json` is rewritten at most once every `CACHE_FLUSH_DELAY` milliseconds (default 250) no matter how many changes arrive in between. A change is therefore on disk as soon as `set` returns, even if the process is killed before the next snapshot.
+ * Snapshots are written to a temporary file and renamed over `cache.json`, so the file is never torn. Once a snapshot is in place, the journal is cut down to the entries it does not cover. On load, journal entries newer than the snapshot are replayed on top of it.
+ *
+ * @method load: Load the cache from disk, replaying any journal entries newer than the snapshot
+ * @method save: Synchronously write a snapshot of the cache to disk
+ * @method flush: Write a snapshot of the cache to disk now. Returns a promise resolving to `true` or an error string.
  * @method set: Set a key-value pair in the cache
+ * @method setMany: Set (and optionally delete) several keys as one change with a single version bump
  * @method get: Get a value from the cache using the key
  * @method delete: Delete a key-value pair from the cache
+ * @method getVersion: Get the version of the cache, incremented on every change
+ * @method getState: Get a copy of the whole cache along with its version and persistence state
  */
 class Cache {
     static cache = {};
     static dataFile = "cache.json"
+    static journalFile = "cache.journal"
+
+    static #version = 0;
+    static #persistedVersion = 0;
+    static #flushTimer = null;
+    static #writing = Promise.resolve();
+    static #journalEntries = []; // Journal lines not yet covered by a snapshot, with their versions
+    static #exitHandler = false;
+
+    static #flushDelay() {
+        const value = parseInt(process.env.CACHE_FLUSH_DELAY);
+        return isNaN(value) || value < 0 ? 250 : value
+    }
 
     static load() {
         try {
+            this.cache = {}
+            this.#version = 0
+            this.#journalEntries = []
             if (FileOps.exists(this.dataFile)) {
                 const readResult = FileOps.read(this.dataFile)
                 if (readResult.startsWith("ERROR")) {
                     throw new Error(readResult)
                 }
-                this.cache = JSON.parse(readResult)
-            } else {
-                FileOps.writeTo(this.dataFile, "{}")
+                const snapshot = JSON.parse(readResult)
+                if (this.#isSnapshot(snapshot)) {
+                    this.cache = snapshot.data
+                    this.#version = snapshot.version
+                } else {
+                    // Plain key-value file written before snapshots were versioned
+                    this.cache = snapshot
+                }
+            }
+
+            const replayed = this.#replayJournal()
+            this.#persistedVersion = this.#version
+            if (replayed > 0 || !FileOps.exists(this.dataFile)) {
+                const saveResult = this.save()
+                if (saveResult !== true) {
+                    throw new Error(saveResult)
+                }
+            }
+
+            if (!this.#exitHandler) {
+                // Changes still waiting for a flush are written synchronously when the process exits
+                process.on("exit", () => {
+                    if (this.#version !== this.#persistedVersion) {
+                        this.save()
+                    }
+                })
+                this.#exitHandler = true
             }
             return true
         } catch (err) {
@@ -30,18 +78,149 @@ class Cache {
         }
     }
 
+    static #isSnapshot(snapshot) {
+        return snapshot != null
+            && Object.keys(snapshot).length == 2
+            && Number.isInteger(snapshot.version)
+            && typeof snapshot.data == "object"
+            && snapshot.data != null
+            && !Array.isArray(snapshot.data)
+    }
+
+    static #replayJournal() {
+        if (!FileOps.exists(this.journalFile)) {
+            return 0
+        }
+        const readResult = FileOps.read(this.journalFile)
+        if (readResult.startsWith("ERROR")) {
+            throw new Error(readResult)
+        }
+
+        var replayed = 0;
+        for (const line of readResult.split("\n")) {
+            if (line.trim() == "") {
+                continue
+            }
+            var entry;
+            try {
+                entry = JSON.parse(line)
+            } catch {
+                // A torn final line from a crash mid-append; everything before it is intact
+                console.log(`CACHE REPLAYJOURNAL ERROR: Skipping unreadable journal entry.`)
+                continue
+            }
+            if (!Number.isInteger(entry.version) || entry.version <= this.#version) {
+                continue
+            }
+            this.#apply(entry.set || {}, entry.delete || [])
+            this.#version = entry.version
+            replayed += 1
+        }
+        return replayed
+    }
+
+    static #apply(changes, deletions) {
+        for (const key of Object.keys(changes)) {
+            this.cache[key] = changes[key]
+        }
+        for (const key of deletions) {
+            delete this.cache[key]
+        }
+    }
+
+    static #snapshotData() {
+        return JSON.stringify({ version: this.#version, data: this.cache })
+    }
+
     static save() {
-        const response = FileOps.writeTo(this.dataFile, JSON.stringify(this.cache))
-        if (response === true) {
+        const temporaryFile = `${this.dataFile}.tmp`
+        try {
+            const version = this.#version
+            fs.writeFileSync(temporaryFile, this.#snapshotData(), "utf8")
+            fs.renameSync(temporaryFile, this.dataFile)
+            fs.writeFileSync(this.journalFile, "", "utf8")
+            this.#journalEntries = []
+            this.#persistedVersion = version
             return true
-        } else {
-            return `CACHE ERROR: Failed to persist cache; error: ${response}`
+        } catch (err) {
+            return `CACHE ERROR: Failed to persist cache; error: ${err}`
         }
     }
 
+    static flush() {
+        if (this.#flushTimer != null) {
+            clearTimeout(this.#flushTimer)
+            this.#flushTimer = null
+        }
+
+        this.#writing = this.#writing.then(async () => {
+            if (this.#version === this.#persistedVersion) {
+                return true
+            }
+
+            const temporaryFile = `${this.dataFile}.tmp`
+            const version = this.#version
+            try {
+                await fs.promises.writeFile(temporaryFile, this.#snapshotData(), "utf8")
+                await fs.promises.rename(temporaryFile, this.dataFile)
+                // Changes made while the snapshot was being written are not in it; keep their entries. Done synchronously so no append lands in between.
+                this.#journalEntries = this.#journalEntries.filter(entry => entry.version > version)
+                fs.writeFileSync(this.journalFile, this.#journalEntries.map(entry => entry.line).join(""), "utf8")
+                this.#persistedVersion = version
+                return true
+            } catch (err) {
+                console.log(`CACHE FLUSH ERROR: Failed to write cache snapshot; error: ${err}`)
+                return `CACHE ERROR: Failed to persist cache; error: ${err}`
+            }
+        })
+        return this.#writing
+    }
+
+    static #scheduleFlush() {
+        if (this.#flushTimer == null) {
+            this.#flushTimer = setTimeout(() => {
+                this.#flushTimer = null
+                this.flush()
+            }, this.#flushDelay())
+            this.#flushTimer.unref()
+        }
+    }
+
+    static #record(changes, deletions) {
+        this.#apply(changes, deletions)
+        this.#version += 1
+
+        const entry = { version: this.#version }
+        if (Object.keys(changes).length > 0) {
+            entry.set = changes
+        }
+        if (deletions.length > 0) {
+            entry.delete = deletions
+        }
+        const line = JSON.stringify(entry) + "\n"
+        try {
+            fs.appendFileSync(this.journalFile, line, "utf8")
+        } catch (err) {
+            console.log(`CACHE JOURNAL ERROR: Failed to append to ${this.journalFile}; error: ${err}`)
+        }
+        this.#journalEntries.push({ version: this.#version, line })
+
+        this.#scheduleFlush()
+        return true
+    }
+
     static set(key, value) {
-        this.cache[key] = value
-        return this.save()
+        return this.#record({ [key]: value }, [])
+    }
+
+    static setMany(changes, deletions = []) {
+        if (typeof changes != "object" || changes == null || Array.isArray(changes) || !Array.isArray(deletions)) {
+            return "CACHE ERROR: Changes must be an object of key-value pairs and deletions an array of keys."
+        }
+        if (Object.keys(changes).length == 0 && deletions.length == 0) {
+            return true
+        }
+        return this.#record({ ...changes }, [...deletions])
     }
 
     static get(key) {
@@ -49,9 +228,21 @@ class Cache {
     }
 
     static delete(key) {
-        delete this.cache[key]
-        return this.save()
+        return this.#record({}, [key])
+    }
+
+    static getVersion() {
+        return this.#version
+    }
+
+    static getState() {
+        return {
+            version: this.#version,
+            persistedVersion: this.#persistedVersion,
+            flushPending: this.#version !== this.#persistedVersion,
+            data: JSON.parse(JSON.stringify(this.cache))
+        }
     }
 }
 
-module.exports = Cache;
\ No newline at end of file
+module.exports = Cache;
@@ -0,0 +1,100 @@
+const { sequelize, Admin, ChatHistory, ChatMessage, FavouriteListing, FoodListing, Guest, Host, ListingAnalytics, RequestAnalytics, Reservation, Review, ReviewLike, SystemAnalytics, UserRecord, Warning } = require('../models');
+const Analytics = require('./Analytics');
+const Universal = require('./Universal');
+const UserRecordCache = require('./UserRecordCache');
+
+/**
+ * DatabaseReset service to wipe every table (a soft reset) as one all-or-nothing transaction.
+ *
+ * Foreign key checks are switched off for the transaction (deferred to commit on SQLite), so each table is cleared with a single bulk `DELETE` without hooks, and a fresh system analytics record is created before committing. Once committed, the user record cache is flushed. If any step fails, the whole reset is rolled back and the database is left as it was.
+ * Callers can pass a progress callback, which receives an event object as each step completes (e.g. to stream progress to the superuser console):
+ * - `{ event: "start", dialect, tables }` before anything is cleared
+ * - `{ event: "table", table, rows, durationMs, step, steps }` for every table cleared
+ * - `{ event: "analytics", instanceID, durationMs }` once the new system analytics record is created
+ * - `{ event: "reset", success: true, rows, durationMs }` once the transaction has committed, or `{ event: "error", success: false, table, error, rolledBack: true }` if it was rolled back
+ *
+ * @method setForeignKeyChecks: Switch foreign key checks off or back on for a transaction on the given dialect. On SQLite, checks are deferred to commit instead and switch back on by themselves.
+ * @method reset: Clear all tables and create a new system analytics record. Returns a summary of the reset, or an error string if it was rolled back.
+ */
+class DatabaseReset {
+    // Dependents before the records they reference, so cascades never clear a table ahead of its own step
+    static models = [ReviewLike, Review, FavouriteListing, Reservation, Warning, ChatMessage, ChatHistory, FoodListing, UserRecord, Guest, Host, Admin, ListingAnalytics, RequestAnalytics, SystemAnalytics];
+
+    static #elapsedMs(startTime) {
+        return Math.round(Number(process.hrtime.bigint() - startTime) / 1e4) / 100
+    }
+
+    static async setForeignKeyChecks(dialect, enabled, transaction) {
+        if (dialect == "mysql") {
+            // Session variable on a pooled connection, so it must be switched back on before the connection is released
+            await sequelize.query(`SET FOREIGN_KEY_CHECKS = ${enabled ? 1 : 0}`, { transaction })
+        } else if (dialect == "sqlite" && !enabled) {
+            // foreign_keys cannot be changed inside a transaction; deferred checks run at commit and reset automatically afterwards
+            await sequelize.query("PRAGMA defer_foreign_keys = ON", { transaction })
+        }
+    }
+
+    static async reset(onProgress = null) {
+        const report = (event) => {
+            if (onProgress) {
+                try {
+                    onProgress(event)
+                } catch (err) {
+                    console.log(`DATABASERESET RESET ERROR: Progress callback failed; error: ${err}`)
+                }
+            }
+        }
+
+        const dialect = sequelize.getDialect()
+        const startTime = process.hrtime.bigint()
+        var currentTable = null;
+        var rows = 0;
+
+        try {
+            // Cached updates for records about to be wiped would otherwise recreate them on the next persist
+            const analyticsActive = await Analytics.discardPending() === true
+
+            report({ event: "start", dialect: dialect, tables: this.models.map(model => model.name) })
+            await sequelize.transaction(async (transaction) => {
+                await this.setForeignKeyChecks(dialect, false, transaction)
+                try {
+                    for (const [index, model] of this.models.entries()) {
+                        currentTable = model.name
+                        const tableStart = process.hrtime.bigint()
+                        const deleted = await model.destroy({ where: {}, hooks: false, transaction })
+                        rows += deleted
+                        report({ event: "table", table: model.name, rows: deleted, durationMs: this.#elapsedMs(tableStart), step: index + 1, steps: this.models.length })
+                    }
+                    currentTable = null
+
+                    const analyticsStart = process.hrtime.bigint()
+                    const systemRecord = await SystemAnalytics.create({ instanceID: Universal.generateUniqueID() }, { transaction })
+                    report({ event: "analytics", instanceID: systemRecord.instanceID, durationMs: this.#elapsedMs(analyticsStart) })
+                } finally {
+                    await this.setForeignKeyChecks(dialect, true, transaction)
+                }
+            })
+
+            // Every cached user record belonged to an account that no longer exists
+            UserRecordCache.flush()
+
+            if (analyticsActive) {
+                // Drop anything cached while the reset ran and attach the analytics service to the new record
+                await Analytics.discardPending()
+                const systemRecord = await Analytics.createRecordIfNotExist("system")
+                if (typeof systemRecord === "string") {
+                    console.log(`DATABASERESET RESET ERROR: Failed to attach analytics to the new system record; error: ${systemRecord}`)
+                }
+            }
+
+            const summary = { rows: rows, durationMs: this.#elapsedMs(startTime) }
+            report({ event: "reset", success: true, ...summary })
+            return summary
+        } catch (err) {
+            report({ event: "error", success: false, table: currentTable, error: "Failed to reset database; all changes were rolled back.", rolledBack: true })
+            return `ERROR: Failed to reset database${currentTable ? ` while clearing ${currentTable}` : ""}; all changes were rolled back. Error: ${err}`
+        }
+    }
+}
+
+module.exports = DatabaseReset;
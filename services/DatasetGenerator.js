@@ -0,0 +1,597 @@
+const crypto = require('crypto');
+const { sequelize, ChatHistory, ChatMessage, FoodListing, Guest, Host, ListingAnalytics, RequestAnalytics, Reservation, Review, ReviewLike, SystemAnalytics, UserRecord } = require('../models');
+const Analytics = require('./Analytics');
+const DatabaseReset = require('./DatabaseReset');
+const Encryption = require('./Encryption');
+const UserRecordCache = require('./UserRecordCache');
+
+/**
+ * DatasetGenerator service to fill the database with reproducible synthetic data for staging environments and benchmarks.
+ *
+ * Generates hosts and guests (with their `UserRecord`s), listings, reservations, reviews with likes, chat histories with messages, and listing, request and system analytics. Reservations never exceed a listing's slots, so fewer are generated if the listings are fully booked. Popularity is skewed: with `skew` above 1, a few hosts own most listings and a few listings, guests, reviews and chats attract most of the activity. Aggregates (host ratings and review counts, hosts' and guests' meals matched, review like counts) match the rows generated.
+ * The same parameters and `seed` always produce the same dataset, IDs and reservation reference numbers included (dates are relative to when it is generated), while no table is ever held in memory whole; rows are generated in batches and bulk-loaded with multi-row inserts.
+ * Everything is loaded in one transaction with foreign key checks off (see `DatabaseReset.setForeignKeyChecks`), so a failed load leaves the database as it was. Every generated account uses the same password (the `password` parameter, `123456` by default, hashed once).
+ *
+ * Progress is reported through an optional callback, in the same shape as `DatabaseReset` progress:
+ * - `{ event: "generate", seed, counts }` before loading starts
+ * - `{ event: "progress", table, rows, total }` every `progressInterval` rows of a large table
+ * - `{ event: "table", table, rows, durationMs, rowsPerSecond, step, steps }` for every table loaded
+ * - `{ event: "generated", success: true, rows, durationMs, rowsPerSecond, logins }` once committed, or `{ event: "error", success: false, table, error, rolledBack: true }` if rolled back
+ *
+ * @method validate: Merge parameters with the defaults and validate them. Returns the full parameters, or an error string.
+ * @method generate: Generate and load a dataset. Set `reset` to soft reset the database first. Returns a summary of the load, or an error string.
+ */
+class DatasetGenerator {
+    static defaults = {
+        seed: 1,
+        hosts: 100,
+        guests: 1000,
+        listings: 1000,
+        reservations: 5000,
+        reviews: 2000,
+        likes: 5000,
+        chats: 500,
+        messages: 10000,
+        skew: 2,
+        batchSize: 1000,
+        password: "123456",
+        reset: false
+    }
+    static maxRows = 10000000;
+    static progressInterval = 50000;
+
+    static #firstNames = ["Wei Ling", "Arjun", "Siti", "Marcus", "Priya", "Jun Hao", "Nurul", "Daniel", "Mei Xin", "Rahul", "Aisyah", "Ethan", "Kavya", "Zhi Wei", "Farah", "Ryan", "Hui Min", "Imran", "Chloe", "Vikram"];
+    static #lastNames = ["Tan", "Lim", "Lee", "Ng", "Wong", "Goh", "Chua", "Koh", "Rahman", "Kumar", "Singh", "Ong", "Teo", "Ismail", "Pillai", "Yeo", "Chan", "Abdullah", "Menon", "Sim"];
+    static #cuisines = ["Chinese", "Malay", "Indian", "Peranakan", "Western", "Japanese", "Korean", "Thai", "Vietnamese", "Fusion"];
+    static #dishes = ["Chicken Rice", "Nasi Lemak", "Laksa", "Mee Rebus", "Roti Prata", "Char Kway Teow", "Bak Kut Teh", "Fish Head Curry", "Ayam Penyet", "Hokkien Mee", "Satay", "Rendang", "Pani Puri", "Kaya Toast", "Chilli Crab", "Mee Siam", "Lontong", "Popiah", "Carrot Cake", "Dumplings"];
+    static #areas = ["Tampines", "Jurong West", "Woodlands", "Bedok", "Ang Mo Kio", "Toa Payoh", "Clementi", "Punggol", "Sengkang", "Bishan", "Queenstown", "Yishun", "Hougang", "Pasir Ris", "Bukit Batok"];
+    static #comments = ["Delicious and generous portions!", "Host was really friendly, would come again.", "Food was okay, a bit too salty for me.", "Kitchen could be cleaner.", "Best home-cooked meal I've had in a while!", "Arrived a little late but the food made up for it.", "Authentic flavours, just like my grandmother's.", "Portions were small for the price.", "Great conversation and great food.", "Too spicy for me but well cooked."];
+    static #messages = ["Hi, is there parking nearby?", "Can I bring a friend?", "See you at 7!", "Thanks for hosting, it was lovely.", "Is the dish halal?", "I'm running 10 minutes late, sorry!", "Do you have a vegetarian option?", "Which block is it?", "Just made the payment.", "Looking forward to it!"];
+    static #requestRoutes = [["/cdn/listings", "GET", 0.25], ["/cdn/getListing", "GET", 0.2], ["/cdn/getReviews", "GET", 0.15], ["/cdn/accountInfo", "GET", 0.1], ["/cdn/fetchAllUsers", "GET", 0.02], ["/listings/addListing", "POST", 0.03], ["/orders/confirmReservation", "POST", 0.05], ["/identity/loginAccount", "POST", 0.08], ["/reviews/submitReview", "POST", 0.02], ["/reviews/likeReview", "POST", 0.1]];
+
+    static validate(parameters = {}) {
+        const params = { ...this.defaults }
+        for (const key of Object.keys(parameters)) {
+            if (!(key in this.defaults)) {
+                return `ERROR: Unknown dataset parameter '${key}'.`
+            }
+            if (parameters[key] !== undefined && parameters[key] !== null) {
+                params[key] = parameters[key]
+            }
+        }
+
+        for (const key of ["seed", "hosts", "guests", "listings", "reservations", "reviews", "likes", "chats", "messages"]) {
+            if (!Number.isInteger(params[key]) || params[key] < 0 || params[key] > this.maxRows) {
+                return `ERROR: Dataset parameter '${key}' must be a whole number between 0 and ${this.maxRows}.`
+            }
+        }
+        if (typeof params.skew != "number" || params.skew < 1 || params.skew > 10) {
+            return "ERROR: Dataset parameter 'skew' must be a number between 1 (uniform) and 10."
+        }
+        if (!Number.isInteger(params.batchSize) || params.batchSize < 1 || params.batchSize > 10000) {
+            return "ERROR: Dataset parameter 'batchSize' must be a whole number between 1 and 10000."
+        }
+        if (typeof params.password != "string" || params.password.length == 0) {
+            return "ERROR: Dataset parameter 'password' must be a non-empty string."
+        }
+        if (typeof params.reset != "boolean") {
+            return "ERROR: Dataset parameter 'reset' must be a boolean."
+        }
+
+        const requirements = [
+            ["listings", "hosts"], ["reviews", "hosts"], ["chats", "hosts"],
+            ["reservations", "guests"], ["reviews", "guests"], ["likes", "guests"], ["chats", "guests"],
+            ["reservations", "listings"], ["likes", "reviews"], ["messages", "chats"]
+        ]
+        for (const [dependent, requirement] of requirements) {
+            if (params[dependent] > 0 && params[requirement] == 0) {
+                return `ERROR: Generating ${dependent} requires at least one of ${requirement}.`
+            }
+        }
+        if (params.chats > params.hosts * params.guests) {
+            return "ERROR: There can be at most one chat per host and guest pair."
+        }
+        if (params.likes > params.reviews * params.guests) {
+            return "ERROR: There can be at most one like per review and guest pair."
+        }
+        return params
+    }
+
+    /**
+     * Returns a seeded pseudo-random number generator (mulberry32) for one stream of the dataset, so each table is reproducible on its own.
+     */
+    static #random(seed, stream) {
+        var state = crypto.createHash("sha256").update(`${seed}:${stream}`).digest().readUInt32LE(0)
+        return () => {
+            state = (state + 0x6D2B79F5) | 0
+            var t = Math.imul(state ^ (state >>> 15), 1 | state)
+            t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t
+            return ((t ^ (t >>> 14)) >>> 0) / 4294967296
+        }
+    }
+
+    // Index in [0, count) favouring low indices more strongly as skew grows (1 is uniform)
+    static #pick(random, count, skew) {
+        return Math.min(count - 1, Math.floor(count * Math.pow(random(), skew)))
+    }
+
+    static #choice(random, values) {
+        return values[Math.floor(random() * values.length)]
+    }
+
+    static #idPrefixes = new Map();
+
+    // UUID-formatted IDs made of a prefix per seed and kind and the row's index, so rows can reference each other by index without keeping IDs in memory
+    static #id(seed, kind, index) {
+        const key = `${seed}:${kind}`
+        var prefix = this.#idPrefixes.get(key)
+        if (prefix === undefined) {
+            const hex = crypto.createHash("md5").update(key).digest("hex")
+            prefix = `${hex.substring(0, 8)}-${hex.substring(8, 12)}-4${hex.substring(13, 16)}-${"89ab"[parseInt(hex[16], 16) & 3]}${hex.substring(17, 20)}-`
+            this.#idPrefixes.set(key, prefix)
+        }
+        return prefix + index.toString(16).padStart(12, "0")
+    }
+
+    /**
+     * Maps reservation indices onto distinct six-character references (as issued by `/orders/confirmReservation`) with an affine permutation of the 36^6 possible references, so no set of used references is needed.
+     */
+    static #referenceNum(seed, index) {
+        const space = 36 ** 6
+        // Coprime with 36^6 (odd and not a multiple of 3), so distinct indices give distinct references
+        const multiplier = 1664525
+        const offset = crypto.createHash("md5").update(`${seed}:referenceNum`).digest().readUInt32LE(0) % space
+        return ((index * multiplier + offset) % space).toString(36).toUpperCase().padStart(6, "0")
+    }
+
+    static #person(random, index) {
+        const fname = this.#choice(random, this.#firstNames)
+        const lname = this.#choice(random, this.#lastNames)
+        const username = `${fname}${lname}${index}`.replace(/ /g, "").toLowerCase()
+        return { fname, lname, username, email: `${username}@example.com` }
+    }
+
+    static #location(random) {
+        const area = this.#choice(random, this.#areas)
+        const block = 100 + Math.floor(random() * 800)
+        const latitude = (1.29 + (random() - 0.5) * 0.16).toFixed(7)
+        const longitude = (103.85 + (random() - 0.5) * 0.24).toFixed(7)
+        return {
+            approxAddress: `${area}, Singapore`,
+            address: `Block ${block} ${area} Street ${1 + Math.floor(random() * 90)}, Singapore ${String(400000 + Math.floor(random() * 400000))}`,
+            coordinates: `${latitude}, ${longitude}`,
+            approxCoordinates: `${Number(latitude).toFixed(3)}, ${Number(longitude).toFixed(3)}`
+        }
+    }
+
+    static #elapsedMs(startTime) {
+        return Number(process.hrtime.bigint() - startTime) / 1e6
+    }
+
+    /**
+     * Loads one table: `produce(add)` calls `add(row)` for every row, and rows are inserted in multi-row batches within the transaction.
+     */
+    static async #load(model, transaction, params, progress, produce, total = null) {
+        const startTime = process.hrtime.bigint()
+        const now = new Date()
+        const queryInterface = sequelize.getQueryInterface()
+        const tableName = model.getTableName()
+        const options = { transaction, logging: false }
+        if (model === RequestAnalytics) {
+            // Live request metrics share these keys, so generated ones replace them
+            options.updateOnDuplicate = Object.keys(model.rawAttributes).filter(column => !["requestURL", "method", "createdAt"].includes(column))
+            options.upsertKeys = ["requestURL", "method"]
+        }
+
+        var batch = []
+        var rows = 0
+        const flush = async () => {
+            if (batch.length > 0) {
+                await queryInterface.bulkInsert(tableName, batch, options)
+                rows += batch.length
+                batch = []
+                if (total !== null && total >= this.progressInterval && rows % this.progressInterval < params.batchSize) {
+                    progress.report({ event: "progress", table: model.name, rows, total })
+                }
+            }
+        }
+
+        progress.table = model.name
+        await produce(async (row) => {
+            row.createdAt = row.createdAt ?? now
+            row.updatedAt = row.updatedAt ?? now
+            batch.push(row)
+            if (batch.length >= params.batchSize) {
+                await flush()
+            }
+        })
+        await flush()
+
+        const durationMs = this.#elapsedMs(startTime)
+        progress.step += 1
+        progress.rows += rows
+        progress.report({ event: "table", table: model.name, rows, durationMs: Math.round(durationMs * 100) / 100, rowsPerSecond: durationMs > 0 ? Math.round(rows / durationMs * 1000) : rows, step: progress.step, steps: progress.steps })
+    }
+
+    static async #loadAll(params, transaction, progress) {
+        const { seed, hosts, guests, listings, reservations, reviews, likes, chats, messages, skew } = params
+        const now = Date.now()
+        const day = 86400000
+        const passwordHash = await Encryption.hash(params.password)
+        // A host and a guest to sign in as, e.g. for benchmarks of authenticated routes
+        const logins = []
+
+        // Per-row state other tables depend on, kept in typed arrays so even million-row datasets stay small in memory
+        const listingHost = new Uint32Array(listings)
+        const listingSlots = new Uint8Array(listings)
+        const listingTaken = new Uint8Array(listings)
+        const listingPrice = new Float32Array(listings)
+        const listingTime = new Float64Array(listings)
+        const listingReservations = new Uint32Array(listings)
+        const guestMeals = new Uint32Array(guests)
+        const hostMeals = new Uint32Array(hosts)
+        const reviewLikes = new Uint32Array(reviews)
+        const hostQuality = new Float32Array(hosts)
+        const hostFood = new Float64Array(hosts)
+        const hostHygiene = new Float64Array(hosts)
+        const hostReviews = new Uint32Array(hosts)
+
+        const qualityRandom = this.#random(seed, "hostQuality")
+        for (let h = 0; h < hosts; h++) {
+            hostQuality[h] = 2.5 + qualityRandom() * 2.5
+        }
+
+        await this.#load(FoodListing, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "listings")
+            for (let l = 0; l < listings; l++) {
+                const host = this.#pick(random, hosts, skew)
+                const dish = this.#choice(random, this.#dishes)
+                const location = this.#location(random)
+                listingHost[l] = host
+                listingSlots[l] = 2 + Math.floor(random() * 11)
+                listingPrice[l] = Math.round((3 + random() * 22) * 2) / 2
+                listingTime[l] = now + Math.floor((random() * 90 - 60) * day)
+                await add({
+                    listingID: this.#id(seed, "listing", l),
+                    title: dish,
+                    images: null,
+                    shortDescription: `Home-cooked ${dish}`.substring(0, 50),
+                    longDescription: `Join me for ${dish.toLowerCase()} cooked the way my family has made it for years. ${this.#choice(random, this.#cuisines)} flavours, freshly prepared.`,
+                    portionPrice: listingPrice[l],
+                    approxAddress: location.approxAddress,
+                    address: location.address,
+                    totalSlots: listingSlots[l],
+                    datetime: new Date(listingTime[l]).toISOString(),
+                    published: random() < 0.95,
+                    approxCoordinates: location.approxCoordinates,
+                    hostID: this.#id(seed, "host", host)
+                })
+            }
+        }, listings)
+
+        await this.#load(Reservation, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "reservations")
+            // A guest reserves a listing at most once, and never beyond its slots; busy listings fill up and the rest spill over to others
+            const taken = new Set()
+            var made = 0
+            for (let attempt = 0; made < reservations && attempt < reservations * 5; attempt++) {
+                const g = this.#pick(random, guests, skew)
+                var l = this.#pick(random, listings, skew)
+                for (let probe = 0; probe < 32 && (listingTaken[l] >= listingSlots[l] || taken.has(l * guests + g)); probe++) {
+                    l = (l + 1) % listings
+                }
+                const free = listingSlots[l] - listingTaken[l]
+                if (free <= 0 || taken.has(l * guests + g)) {
+                    continue
+                }
+                taken.add(l * guests + g)
+
+                const portions = random() < 0.7 ? 1 : 1 + Math.floor(random() * Math.min(3, free))
+                const attended = listingTime[l] < now && random() < 0.85
+                listingTaken[l] += portions
+                listingReservations[l] += 1
+                if (attended) {
+                    guestMeals[g] += 1
+                    hostMeals[listingHost[l]] += 1
+                }
+                await add({
+                    guestID: this.#id(seed, "guest", g),
+                    listingID: this.#id(seed, "listing", l),
+                    referenceNum: this.#referenceNum(seed, made),
+                    datetime: new Date(listingTime[l] - Math.floor(random() * 7 * day)).toISOString(),
+                    portions: portions,
+                    totalPrice: portions * listingPrice[l],
+                    markedPaid: attended || random() < 0.5,
+                    paidAndPresent: attended,
+                    chargeableCancelActive: false
+                })
+                made += 1
+            }
+        }, reservations)
+
+        // Likes come before reviews so every review's likeCount matches its likes
+        await this.#load(ReviewLike, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "likes")
+            const liked = new Set()
+            var made = 0
+            for (let attempt = 0; made < likes && attempt < likes * 5; attempt++) {
+                const r = this.#pick(random, reviews, skew)
+                const g = this.#pick(random, guests, skew)
+                if (liked.has(r * guests + g)) {
+                    continue
+                }
+                liked.add(r * guests + g)
+                reviewLikes[r] += 1
+                await add({ reviewID: this.#id(seed, "review", r), guestID: this.#id(seed, "guest", g) })
+                made += 1
+            }
+        }, likes)
+
+        await this.#load(Review, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "reviews")
+            for (let r = 0; r < reviews; r++) {
+                const h = this.#pick(random, hosts, skew)
+                const g = this.#pick(random, guests, skew)
+                const foodRating = Math.max(1, Math.min(5, Math.round(hostQuality[h] + (random() - 0.5) * 2)))
+                const hygieneRating = Math.max(1, Math.min(5, Math.round(hostQuality[h] + (random() - 0.5) * 2.5)))
+                hostFood[h] += foodRating
+                hostHygiene[h] += hygieneRating
+                hostReviews[h] += 1
+                await add({
+                    reviewID: this.#id(seed, "review", r),
+                    foodRating: foodRating,
+                    hygieneRating: hygieneRating,
+                    comments: this.#choice(random, this.#comments),
+                    images: null,
+                    likeCount: reviewLikes[r],
+                    dateCreated: new Date(now - Math.floor(random() * 180 * day)).toISOString(),
+                    guestID: this.#id(seed, "guest", g),
+                    hostID: this.#id(seed, "host", h)
+                })
+            }
+        }, reviews)
+
+        await this.#load(Host, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "hosts")
+            for (let h = 0; h < hosts; h++) {
+                const location = this.#location(random)
+                const person = this.#person(random, h)
+                const rated = hostReviews[h] > 0
+                if (h == 0) {
+                    logins.push({ username: person.username, userType: "Host" })
+                }
+                await add({
+                    userID: this.#id(seed, "host", h),
+                    ...person,
+                    password: passwordHash,
+                    contactNum: String(80000000 + h),
+                    ...location,
+                    emailVerified: true,
+                    favCuisine: this.#choice(random, this.#cuisines),
+                    mealsMatched: hostMeals[h],
+                    foodRating: rated ? Math.round(hostFood[h] / hostReviews[h] * 100) / 100 : 0,
+                    hygieneGrade: rated ? Math.round(hostHygiene[h] / hostReviews[h] * 100) / 100 : 0,
+                    reviewsCount: hostReviews[h],
+                    flaggedForHygiene: rated && hostHygiene[h] / hostReviews[h] < 2.5
+                })
+            }
+        }, hosts)
+
+        await this.#load(Guest, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "guests")
+            for (let g = 0; g < guests; g++) {
+                const person = this.#person(random, g)
+                if (g == 0) {
+                    logins.push({ username: `g${person.username}`, userType: "Guest" })
+                }
+                await add({
+                    userID: this.#id(seed, "guest", g),
+                    ...person,
+                    username: `g${person.username}`,
+                    email: `g${person.email}`,
+                    password: passwordHash,
+                    contactNum: String(90000000 + g),
+                    address: this.#location(random).address,
+                    emailVerified: true,
+                    favCuisine: this.#choice(random, this.#cuisines),
+                    mealsMatched: guestMeals[g]
+                })
+            }
+        }, guests)
+
+        await this.#load(UserRecord, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "userRecords")
+            for (let h = 0; h < hosts; h++) {
+                // A few banned hosts, so listing queries exercise their ban filter
+                await add({ recordID: this.#id(seed, "hostRecord", h), hID: this.#id(seed, "host", h), gID: null, aID: null, banned: random() < 0.02 })
+            }
+            for (let g = 0; g < guests; g++) {
+                await add({ recordID: this.#id(seed, "guestRecord", g), hID: null, gID: this.#id(seed, "guest", g), aID: null, banned: false })
+            }
+        }, hosts + guests)
+
+        const chatHost = new Uint32Array(chats)
+        const chatGuest = new Uint32Array(chats)
+        const chatTime = new Float64Array(chats)
+        await this.#load(ChatHistory, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "chats")
+            const paired = new Set()
+            var made = 0
+            while (made < chats) {
+                const h = this.#pick(random, hosts, skew)
+                const g = this.#pick(random, guests, skew)
+                if (paired.has(h * guests + g)) {
+                    // Busy pairs are exhausted first when chats approach hosts x guests; fall back to uniform picks
+                    const uniformH = Math.floor(random() * hosts)
+                    const uniformG = Math.floor(random() * guests)
+                    if (paired.has(uniformH * guests + uniformG)) {
+                        continue
+                    }
+                    paired.add(uniformH * guests + uniformG)
+                    chatHost[made] = uniformH
+                    chatGuest[made] = uniformG
+                } else {
+                    paired.add(h * guests + g)
+                    chatHost[made] = h
+                    chatGuest[made] = g
+                }
+                chatTime[made] = now - Math.floor(random() * 120 * day)
+                await add({
+                    chatID: this.#id(seed, "chat", made),
+                    user1ID: this.#id(seed, "host", chatHost[made]),
+                    user2ID: this.#id(seed, "guest", chatGuest[made]),
+                    datetime: new Date(chatTime[made]).toISOString()
+                })
+                made += 1
+            }
+        }, chats)
+
+        await this.#load(ChatMessage, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "messages")
+            for (let m = 0; m < messages; m++) {
+                const c = this.#pick(random, chats, skew)
+                const fromHost = random() < 0.5
+                await add({
+                    messageID: this.#id(seed, "message", m),
+                    message: this.#choice(random, this.#messages),
+                    image: null,
+                    senderID: this.#id(seed, fromHost ? "host" : "guest", fromHost ? chatHost[c] : chatGuest[c]),
+                    datetime: new Date(chatTime[c] + Math.floor(random() * (now - chatTime[c]))).toISOString(),
+                    replyToID: null,
+                    edited: random() < 0.03,
+                    chatID: this.#id(seed, "chat", c)
+                })
+            }
+        }, messages)
+
+        await this.#load(ListingAnalytics, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "listingAnalytics")
+            for (let l = 0; l < listings; l++) {
+                // Views follow bookings: popular listings were seen far more often
+                const impressions = Math.round((listingReservations[l] + 1) * (20 + random() * 80))
+                await add({ listingID: this.#id(seed, "listing", l), impressions: impressions, clicks: Math.round(impressions * (0.05 + random() * 0.25)) })
+            }
+        }, listings)
+
+        const totalRequests = Math.max(1000, (hosts + guests) * 50)
+        await this.#load(RequestAnalytics, transaction, params, progress, async (add) => {
+            const random = this.#random(seed, "requestAnalytics")
+            for (const [requestURL, method, share] of this.#requestRoutes) {
+                const requestsCount = Math.round(totalRequests * share)
+                const row = { requestURL, method, requestsCount, successResponses: Math.round(requestsCount * (0.95 + random() * 0.05)), lastRequest: new Date(now).toISOString(), totalLatencyMs: 0 }
+                for (const bucket of Analytics.latencyBuckets) {
+                    row[`latencyUnder${bucket}ms`] = 0
+                }
+                const overflowColumn = `latencyOver${Analytics.latencyBuckets[Analytics.latencyBuckets.length - 1]}ms`
+                row[overflowColumn] = 0
+
+                // Log-normal response times around a per-route median, sampled and scaled up to the request count
+                const medianMs = 15 + random() * 120
+                const samples = 1000
+                for (let i = 0; i < samples; i++) {
+                    const normal = Math.sqrt(-2 * Math.log(1 - random())) * Math.cos(2 * Math.PI * random())
+                    const latency = medianMs * Math.exp(0.8 * normal)
+                    const bucket = Analytics.latencyBuckets.find(bucket => latency <= bucket)
+                    row[bucket !== undefined ? `latencyUnder${bucket}ms` : overflowColumn] += 1
+                    row.totalLatencyMs += latency
+                }
+                var assigned = 0
+                for (const column of [...Analytics.latencyBuckets.map(bucket => `latencyUnder${bucket}ms`), overflowColumn]) {
+                    row[column] = Math.floor(row[column] * requestsCount / samples)
+                    assigned += row[column]
+                }
+                row[`latencyUnder${Analytics.latencyBuckets.find(bucket => medianMs <= bucket)}ms`] += requestsCount - assigned
+                row.totalLatencyMs = Math.round(row.totalLatencyMs * requestsCount / samples)
+                await add(row)
+            }
+        })
+
+        await this.#load(SystemAnalytics, transaction, params, progress, async (add) => {
+            // Recorded as an earlier boot, so the analytics service stays attached to the latest (live) system record
+            await add({
+                instanceID: this.#id(seed, "system", 0),
+                lastBoot: new Date(now - day).toISOString(),
+                accountCreations: hosts + guests,
+                listingCreations: listings,
+                emailDispatches: (hosts + guests) * 2,
+                fileUploads: listings,
+                logins: Math.round(totalRequests * 0.08),
+                createdAt: new Date(now - day),
+                updatedAt: new Date(now - day)
+            })
+        })
+
+        return logins
+    }
+
+    static async generate(parameters = {}, onProgress = null) {
+        const params = this.validate(parameters)
+        if (typeof params == "string") {
+            return params
+        }
+
+        const progress = {
+            table: null,
+            step: 0,
+            steps: 12,
+            rows: 0,
+            report: (event) => {
+                if (onProgress) {
+                    try {
+                        onProgress(event)
+                    } catch (err) {
+                        console.log(`DATASETGENERATOR GENERATE ERROR: Progress callback failed; error: ${err}`)
+                    }
+                }
+            }
+        }
+
+        if (params.reset) {
+            const resetResult = await DatabaseReset.reset(progress.report)
+            if (typeof resetResult == "string") {
+                return resetResult
+            }
+        }
+
+        const dialect = sequelize.getDialect()
+        const startTime = process.hrtime.bigint()
+        try {
+            const counts = {}
+            for (const key of ["hosts", "guests", "listings", "reservations", "reviews", "likes", "chats", "messages"]) {
+                counts[key] = params[key]
+            }
+            progress.report({ event: "generate", seed: params.seed, skew: params.skew, counts })
+
+            var logins;
+            await sequelize.transaction(async (transaction) => {
+                await DatabaseReset.setForeignKeyChecks(dialect, false, transaction)
+                try {
+                    logins = await this.#loadAll(params, transaction, progress)
+                    progress.table = null
+                } finally {
+                    await DatabaseReset.setForeignKeyChecks(dialect, true, transaction)
+                }
+            })
+
+            // Cached records and banned hosts predate the generated accounts
+            UserRecordCache.flush()
+
+            const durationMs = this.#elapsedMs(startTime)
+            const summary = {
+                seed: params.seed,
+                rows: progress.rows,
+                durationMs: Math.round(durationMs * 100) / 100,
+                rowsPerSecond: durationMs > 0 ? Math.round(progress.rows / durationMs * 1000) : progress.rows,
+                logins: logins,
+                password: params.password
+            }
+            progress.report({ event: "generated", success: true, ...summary })
+            return summary
+        } catch (err) {
+            progress.report({ event: "error", success: false, table: progress.table, error: "Failed to generate dataset; all changes were rolled back.", rolledBack: true })
+            return `ERROR: Failed to generate dataset${progress.table ? ` while loading ${progress.table}` : ""}; all changes were rolled back. Error: ${err}`
+        }
+    }
+}
+
+module.exports = DatasetGenerator;
@@ -1,16 +1,69 @@
+const fs = require('fs');
 const nodeMailer = require('nodemailer');
 const Analytics = require('./Analytics');
+const FileOps = require('./FileOps');
+const RuntimeStats = require('./RuntimeStats');
 require('dotenv').config();
 
 /**
  * Emailer class to send emails
- * 
+ *
+ * Emails are queued and sent in the background over one long-lived, pooled SMTP transport, so callers never wait on an SMTP handshake.
+ * Every queued email is first appended to `emailQueue.journal`, so emails still queued when the process stops are sent after the next boot (an email being sent at that moment may go out twice). Up to `memoryLimit` queued emails are held in memory; any beyond that wait in the journal until there is room. At most `EMAIL_QUEUE_LIMIT` emails (default 10000) can be queued at once, beyond which new emails are refused.
+ * Queued emails are sent in batches of `batchSize`, over at most `EMAIL_POOL_SIZE` SMTP connections (default 3). Emails failing with a temporary error (connection problems, 4xx responses) are retried with exponential backoff, up to `EMAIL_MAX_ATTEMPTS` attempts (default 5); emails rejected outright (5xx responses) are dropped.
+ * The SMTP server defaults to Gmail and can be pointed elsewhere (e.g. a local SMTP stand-in for testing) with `EMAIL_SMTP_HOST`, `EMAIL_SMTP_PORT` and `EMAIL_SMTP_SECURE`.
+ *
  * @method checkPermission: Checks if the system has permission to send emails
  * @method checkContext: Checks if the system context is set up properly
- * @method sendEmail: Sends an email. Provide a destination email, subject line, fallback text content and HTML content.
+ * @method setup: Creates the pooled transport and resumes sending any emails left queued in the journal
+ * @method sendEmail: Queues an email. Provide a destination email, subject line, fallback text content and HTML content. Resolves to `true` once queued, or `false` if it could not be.
+ * @method getQueueStats: Gets queue depth, throughput and delivery counts since boot
  */
 class Emailer {
     static contextChecked = false;
+    static journalFile = "emailQueue.journal";
+    static memoryLimit = 500;
+    static batchSize = 10;
+    static retryBaseMs = 2000;
+    static retryMaxMs = 300000;
+    static compactionLines = 5000;
+
+    static #setup = false;
+    static #transport = null;
+    static #queue = [];
+    static #sending = new Set();
+    static #spilled = 0;
+    static #inFlight = 0;
+    static #draining = false;
+    static #wakeTimer = null;
+    static #wakeAt = null;
+    static #journalLines = 0;
+    static #sentPerSecond = new Map();
+    static #stats = { enqueued: 0, sent: 0, failed: 0, retries: 0, rejected: 0, lastSent: null, lastFailure: null };
+
+    static #intSetting(name, fallback) {
+        const value = parseInt(process.env[name]);
+        return isNaN(value) || value <= 0 ? fallback : value
+    }
+
+    static #transportOptions() {
+        const port = this.#intSetting("EMAIL_SMTP_PORT", 465)
+        const options = {
+            pool: true,
+            host: process.env.EMAIL_SMTP_HOST || "smtp.gmail.com",
+            port: port,
+            secure: process.env.EMAIL_SMTP_SECURE !== undefined ? process.env.EMAIL_SMTP_SECURE === "True" : port == 465,
+            maxConnections: this.#intSetting("EMAIL_POOL_SIZE", 3),
+            maxMessages: 100
+        }
+        if (process.env.EMAIL_PASSWORD) {
+            options.auth = {
+                user: process.env.EMAIL_ADDRESS,
+                pass: process.env.EMAIL_PASSWORD
+            }
+        }
+        return options
+    }
 
     static checkPermission() {
         return process.env.EMAILING_ENABLED === "True";
@@ -26,6 +79,258 @@ class Emailer {
         this.contextChecked = true;
     }
 
+    static setup() {
+        if (this.#setup) {
+            return true
+        }
+        if (!this.checkPermission()) {
+            return "ERROR: Emailing services are not enabled."
+        }
+
+        try {
+            this.#transport = nodeMailer.createTransport(this.#transportOptions())
+            const pending = this.#readPending()
+            this.#queue = pending.slice(0, this.memoryLimit).map(job => ({ ...job, attempts: 0, nextAttemptAt: 0 }))
+            this.#spilled = pending.length - this.#queue.length
+            this.#rewriteJournal(pending)
+
+            RuntimeStats.registerProbe("emailQueue", () => ({
+                queued: this.#queue.length + this.#spilled + this.#inFlight,
+                inFlight: this.#inFlight,
+                sent: this.#stats.sent,
+                failed: this.#stats.failed,
+                retries: this.#stats.retries
+            }))
+
+            this.#setup = true
+            if (pending.length > 0) {
+                console.log(`EMAILER: Resuming ${pending.length} queued emails from ${this.journalFile}.`)
+                this.#wake(0)
+            }
+            return true
+        } catch (err) {
+            return `ERROR: Failed to set up emailer; error: ${err}`
+        }
+    }
+
+    /**
+     * Emails added to the journal and not yet marked done, oldest first. A torn final line from a crash mid-append is skipped.
+     */
+    static #readPending() {
+        if (!FileOps.exists(this.journalFile)) {
+            return []
+        }
+        const readResult = FileOps.read(this.journalFile)
+        if (readResult.startsWith("ERROR")) {
+            throw new Error(readResult)
+        }
+
+        const pending = new Map()
+        for (const line of readResult.split("\n")) {
+            if (line.trim() == "") {
+                continue
+            }
+            try {
+                const entry = JSON.parse(line)
+                if (entry.add) {
+                    pending.set(entry.add.id, entry.add)
+                } else if (Array.isArray(entry.done)) {
+                    entry.done.forEach(id => pending.delete(id))
+                }
+            } catch {
+                console.log("EMAILER READPENDING ERROR: Skipping unreadable journal entry.")
+            }
+        }
+        return Array.from(pending.values())
+    }
+
+    static #rewriteJournal(pending) {
+        const temporaryFile = `${this.journalFile}.tmp`
+        fs.writeFileSync(temporaryFile, pending.map(job => JSON.stringify({ add: job }) + "\n").join(""), "utf8")
+        fs.renameSync(temporaryFile, this.journalFile)
+        this.#journalLines = pending.length
+    }
+
+    static #appendJournal(entry) {
+        try {
+            fs.appendFileSync(this.journalFile, JSON.stringify(entry) + "\n", "utf8")
+            this.#journalLines += 1
+            return true
+        } catch (err) {
+            console.log(`EMAILER JOURNAL ERROR: Failed to append to ${this.journalFile}; error: ${err}`)
+            return false
+        }
+    }
+
+    static #compact() {
+        try {
+            if (this.#queue.length == 0 && this.#spilled == 0 && this.#inFlight == 0) {
+                fs.writeFileSync(this.journalFile, "", "utf8")
+                this.#journalLines = 0
+            } else if (this.#journalLines > this.compactionLines) {
+                this.#rewriteJournal(this.#readPending())
+            }
+        } catch (err) {
+            console.log(`EMAILER COMPACT ERROR: Failed to compact ${this.journalFile}; error: ${err}`)
+        }
+    }
+
+    // Brings emails waiting in the journal into memory once there is room, oldest first
+    static #refill() {
+        if (this.#spilled == 0 || this.#queue.length > this.memoryLimit / 2) {
+            return
+        }
+        try {
+            const known = new Set(this.#queue.map(job => job.id))
+            const room = this.memoryLimit - this.#queue.length
+            const waiting = this.#readPending().filter(job => !known.has(job.id) && !this.#sending.has(job.id))
+            for (const job of waiting.slice(0, room)) {
+                this.#queue.push({ ...job, attempts: 0, nextAttemptAt: 0 })
+            }
+            this.#spilled = Math.max(waiting.length - room, 0)
+        } catch (err) {
+            console.log(`EMAILER REFILL ERROR: Failed to read queued emails from ${this.journalFile}; error: ${err}`)
+        }
+    }
+
+    static #wake(delayMs) {
+        const wakeAt = Date.now() + delayMs
+        if (this.#wakeTimer != null) {
+            if (this.#wakeAt <= wakeAt) {
+                return
+            }
+            clearTimeout(this.#wakeTimer)
+        }
+        this.#wakeAt = wakeAt
+        this.#wakeTimer = setTimeout(() => {
+            this.#wakeTimer = null
+            this.#wakeAt = null
+            this.#drain()
+        }, delayMs)
+        this.#wakeTimer.unref()
+    }
+
+    static #isPermanent(err) {
+        // Rejected outright by the server (e.g. no such mailbox); authentication failures are a configuration problem worth retrying
+        return err && err.code != "EAUTH" && Number.isInteger(err.responseCode) && err.responseCode >= 500
+    }
+
+    static #backoffMs(attempts) {
+        const delay = Math.min(this.retryBaseMs * 2 ** (attempts - 1), this.retryMaxMs)
+        return Math.round(delay * (0.5 + Math.random() * 0.5))
+    }
+
+    static #recordSent() {
+        const second = Math.floor(Date.now() / 1000)
+        this.#sentPerSecond.set(second, (this.#sentPerSecond.get(second) || 0) + 1)
+        for (const key of this.#sentPerSecond.keys()) {
+            if (key > second - 60) {
+                break
+            }
+            this.#sentPerSecond.delete(key)
+        }
+    }
+
+    static async #deliver(job) {
+        await this.#transport.sendMail({
+            from: {
+                name: 'MakanMatch System',
+                address: process.env.EMAIL_ADDRESS
+            },
+            to: job.to,
+            subject: job.subject,
+            text: job.text,
+            html: job.html
+        })
+    }
+
+    static async #drain() {
+        if (this.#draining) {
+            return
+        }
+        this.#draining = true
+
+        try {
+            while (true) {
+                this.#refill()
+                const now = Date.now()
+                const batch = []
+                for (const job of this.#queue) {
+                    if (job.nextAttemptAt <= now) {
+                        batch.push(job)
+                        if (batch.length >= this.batchSize) {
+                            break
+                        }
+                    }
+                }
+                if (batch.length == 0) {
+                    break
+                }
+
+                const batchIDs = new Set(batch.map(job => job.id))
+                this.#queue = this.#queue.filter(job => !batchIDs.has(job.id))
+                batch.forEach(job => this.#sending.add(job.id))
+                this.#inFlight = batch.length
+
+                // The pool spreads the batch over its connections and queues whatever exceeds them
+                const results = await Promise.allSettled(batch.map(job => this.#deliver(job)))
+
+                const finished = []
+                results.forEach((result, index) => {
+                    const job = batch[index]
+                    if (result.status == "fulfilled") {
+                        finished.push(job.id)
+                        this.#stats.sent += 1
+                        this.#stats.lastSent = new Date().toISOString()
+                        this.#recordSent()
+                        console.log(`EMAILER: Sent email to ${job.to}.`)
+                        if (Analytics.checkPermission()) {
+                            Analytics.supplementSystemMetricUpdate({
+                                emailDispatches: 1
+                            })
+                            .catch(err => {
+                                console.log(`EMAILER ANALYTICS: Failed to supplement email dispatch metric. Error: ${err}`)
+                            })
+                        }
+                        return
+                    }
+
+                    const err = result.reason
+                    job.attempts += 1
+                    if (this.#isPermanent(err) || job.attempts >= this.#intSetting("EMAIL_MAX_ATTEMPTS", 5)) {
+                        finished.push(job.id)
+                        this.#stats.failed += 1
+                        this.#stats.lastFailure = { at: new Date().toISOString(), to: job.to, error: String(err) }
+                        console.log(`EMAILER ERROR: Failed to send email to ${job.to} after ${job.attempts} attempts; giving up. Error: ${err}`)
+                    } else {
+                        this.#stats.retries += 1
+                        job.nextAttemptAt = Date.now() + this.#backoffMs(job.attempts)
+                        this.#queue.push(job)
+                        console.log(`EMAILER ERROR: Failed to send email to ${job.to} (attempt ${job.attempts}); retrying. Error: ${err}`)
+                    }
+                })
+
+                batch.forEach(job => this.#sending.delete(job.id))
+                this.#inFlight = 0
+                if (finished.length > 0) {
+                    this.#appendJournal({ done: finished })
+                    this.#compact()
+                }
+            }
+        } catch (err) {
+            console.log(`EMAILER DRAIN ERROR: Failed to process email queue; error: ${err}`)
+        } finally {
+            this.#draining = false
+        }
+
+        if (this.#queue.length > 0) {
+            this.#wake(Math.max(Math.min(...this.#queue.map(job => job.nextAttemptAt)) - Date.now(), 0))
+        } else if (this.#spilled > 0) {
+            this.#wake(0)
+        }
+        this.#compact()
+    }
+
     static async sendEmail(to, subject, text, html) {
         if (!this.contextChecked) {
             console.log("EMAILER ERROR: System context was not checked before sending email. Skipping email.")
@@ -37,49 +342,70 @@ class Emailer {
             return true;
         }
 
-        try {
-            const transporter = nodeMailer.createTransport({
-                host: "smtp.gmail.com",
-                port: 465,
-                auth: {
-                    user: process.env.EMAIL_ADDRESS,
-                    pass: process.env.EMAIL_PASSWORD
-                }
-            });
-
-            if (Array.isArray(to)) {
-                to = to.join(", ");
+        if (!this.#setup) {
+            const setupResult = this.setup()
+            if (setupResult !== true) {
+                console.log(`EMAILER ERROR: Failed to queue email to ${to}. Error: ${setupResult}`)
+                return false;
             }
+        }
 
-            await transporter.sendMail({
-                from: {
-                    name: 'MakanMatch System',
-                    address: process.env.EMAIL_ADDRESS
-                },
-                to: to,
-                subject: subject,
-                text: text,
-                html: html
-            })
-            .then(() => {
-                console.log(`EMAILER: Sent email to ${to}.`)
-                if (Analytics.checkPermission()) {
-                    Analytics.supplementSystemMetricUpdate({
-                        emailDispatches: 1
-                    })
-                    .catch(err => {
-                        console.log(`EMAILER ANALYTICS: Failed to supplement email dispatch metric. Error: ${err}`)
-                    })
-                }
-                return true;
-            })
+        if (Array.isArray(to)) {
+            to = to.join(", ");
+        }
 
-            return true;
-        } catch (err) {
-            console.log(`EMAILER ERROR: Failed to send email to ${to}. Error: ${err}`)
+        if (this.#queue.length + this.#spilled + this.#inFlight >= this.#intSetting("EMAIL_QUEUE_LIMIT", 10000)) {
+            this.#stats.rejected += 1
+            console.log(`EMAILER ERROR: Email queue is full. Failed to queue email to ${to}.`)
             return false;
         }
+
+        const job = { id: `${Date.now().toString(36)}-${Math.random().toString(36).substring(2, 10)}`, to, subject, text, html, enqueuedAt: Date.now() }
+        if (!this.#appendJournal({ add: job })) {
+            // Still worth sending, just without surviving a restart
+            console.log(`EMAILER WARNING: Email to ${to} queued in memory only.`)
+        }
+        this.#stats.enqueued += 1
+
+        // Once emails wait in the journal, newer ones must queue behind them to keep their order
+        if (this.#spilled == 0 && this.#queue.length < this.memoryLimit) {
+            this.#queue.push({ ...job, attempts: 0, nextAttemptAt: 0 })
+        } else {
+            this.#spilled += 1
+        }
+        this.#wake(0)
+        return true;
+    }
+
+    static getQueueStats() {
+        const now = Date.now()
+        const second = Math.floor(now / 1000)
+        var sentLastMinute = 0
+        for (const [key, count] of this.#sentPerSecond.entries()) {
+            if (key > second - 60) {
+                sentLastMinute += count
+            }
+        }
+        const oldest = this.#queue.reduce((oldest, job) => Math.min(oldest, job.enqueuedAt), Infinity)
+        const options = this.#transportOptions()
+
+        return {
+            setup: this.#setup,
+            queued: this.#queue.length + this.#spilled + this.#inFlight,
+            inMemory: this.#queue.length,
+            spilled: this.#spilled,
+            inFlight: this.#inFlight,
+            retrying: this.#queue.filter(job => job.attempts > 0).length,
+            oldestQueuedMs: oldest === Infinity ? null : now - oldest,
+            sentLastMinute: sentLastMinute,
+            ...this.#stats,
+            queueLimit: this.#intSetting("EMAIL_QUEUE_LIMIT", 10000),
+            maxAttempts: this.#intSetting("EMAIL_MAX_ATTEMPTS", 5),
+            batchSize: this.batchSize,
+            poolSize: options.maxConnections,
+            smtpHost: `${options.host}:${options.port}${options.secure ? " (TLS)" : ""}`
+        }
     }
 }
 
-module.exports = Emailer;
\ No newline at end of file
+module.exports = Emailer;
@@ -61,6 +61,16 @@ class FileManager {
     static fileStoreContextPath = path.join(this.fileStorePath, 'context.json')
     static #fileStoreContext = {};
 
+    // Context change tracking, served to the superuser console as versioned diffs.
+    // Versions are only meaningful within one process lifetime, so tokens carry a per-process epoch.
+    static #contextEpoch = Universal.generateUniqueID();
+    static #contextVersion = 0;
+    static #contextSnapshot = new Map(); // file -> serialised entry as of the latest version
+    static #contextEntryVersions = new Map(); // file -> version the entry last changed in
+    static #contextTombstones = new Map(); // file -> version the entry was removed in, oldest first
+    static #contextTombstoneLimit = 10000;
+    static #contextFloor = 0; // Changes since versions below this can no longer be served incrementally
+
     // File context schema:
     // {
     //     "id": "string",
@@ -180,6 +190,70 @@ class FileManager {
         return this.#fileStoreContext;
     }
 
+    static #trackContextChanges() {
+        const changed = [];
+        for (const file of Object.keys(this.#fileStoreContext)) {
+            const serialised = JSON.stringify(this.#fileStoreContext[file]);
+            if (this.#contextSnapshot.get(file) !== serialised) {
+                changed.push([file, serialised]);
+            }
+        }
+        const deleted = [...this.#contextSnapshot.keys()].filter(file => !(file in this.#fileStoreContext));
+        if (changed.length == 0 && deleted.length == 0) { return; }
+
+        this.#contextVersion += 1;
+        for (const [file, serialised] of changed) {
+            this.#contextSnapshot.set(file, serialised);
+            this.#contextEntryVersions.set(file, this.#contextVersion);
+            this.#contextTombstones.delete(file);
+        }
+        for (const file of deleted) {
+            this.#contextSnapshot.delete(file);
+            this.#contextEntryVersions.delete(file);
+            this.#contextTombstones.delete(file);
+            this.#contextTombstones.set(file, this.#contextVersion);
+        }
+
+        // Forget the oldest removals; clients older than them must re-download the full context
+        for (const [file, version] of this.#contextTombstones) {
+            if (this.#contextTombstones.size <= this.#contextTombstoneLimit) { break; }
+            this.#contextTombstones.delete(file);
+            this.#contextFloor = version;
+        }
+    }
+
+    static getContextVersion() {
+        if (!this.#initialized) { return 'ERROR: FileManager must be setup first.' }
+        this.#trackContextChanges();
+        return `${this.#contextEpoch}.${this.#contextVersion}`;
+    }
+
+    static getContextChangesSince(versionToken) {
+        const version = this.getContextVersion();
+        if (version.startsWith("ERROR")) { return version; }
+
+        const [epoch, sinceString] = String(versionToken).split(".");
+        const since = parseInt(sinceString);
+        if (epoch !== this.#contextEpoch || isNaN(since) || since < this.#contextFloor || since > this.#contextVersion) {
+            return { version: version, full: true, context: this.#fileStoreContext };
+        }
+
+        const changed = {};
+        for (const [file, entryVersion] of this.#contextEntryVersions) {
+            if (entryVersion > since) {
+                changed[file] = this.#fileStoreContext[file];
+            }
+        }
+        const deleted = [];
+        for (const [file, removedVersion] of this.#contextTombstones) {
+            if (removedVersion > since) {
+                deleted.push(file);
+            }
+        }
+
+        return { version: version, full: false, changed: changed, deleted: deleted };
+    }
+
     static async setup(mode = "cloud") {
         if (!this.checkPermission()) { return "ERROR: FileManager operation permission denied." }
         if (this.#initialized) { return true; }
@@ -8,6 +8,8 @@ const path = require('path');
  * @method read: Reads a file
  * @method writeTo: Writes to a file
  * @method appendTo: Appends to a file
+ * @method getSize: Gets the size of a file in bytes
+ * @method createReadStream: Creates a readable stream over a file, optionally over a byte range (`start` and `end` are inclusive)
  * @method getFilenames: Gets all filenames in a directory
  * @method deleteFile: Deletes a file
  * @method createFolder: Creates a directory
@@ -45,6 +47,18 @@ class FileOps {
         }
     }
 
+    static getSize(file) {
+        try {
+            return fs.statSync(file).size;
+        } catch (err) {
+            return `ERROR: Failed to get size of file ${file}; error: ${err}`;
+        }
+    }
+
+    static createReadStream(file, start=0, end=undefined) {
+        return fs.createReadStream(file, { start, end });
+    }
+
     static getFilenames(dir, fileNameEncoding='utf8') {
         try {
             const files = fs.readdirSync(dir, fileNameEncoding)
@@ -1,29 +1,64 @@
+const fs = require('fs');
+const path = require('path');
+const zlib = require('zlib');
+const { Readable } = require('stream');
+const readline = require('readline');
 const FileOps = require('./FileOps')
 require('dotenv').config()
 
 /**
  * Logger class to log messages to a file
- * 
+ *
  * Recommended format for log messages:
- * 
+ *
  * `ROUTENAME SERVICENAME FUNCTIONNAME [METHOD] [ERROR]: Message here`
- * 
+ *
  * Provide as many log tags as you wish to help identify the source of the log message. These log tags can be used for filtering later on to group and analyse log messages.
- * 
+ *
+ * Log lines are buffered in memory and written to `logs.txt` through a single append stream, flushed once the buffer reaches `LOG_FLUSH_BYTES` (default 64KB) or every `LOG_FLUSH_INTERVAL` milliseconds (default 1000), so logging never blocks the event loop. Lines not yet written when the process exits are written synchronously.
+ * Once `logs.txt` reaches `LOG_ROTATE_BYTES` (default 10MB), it is rotated into a gzip-compressed, numbered segment in `logs/`, described by `logs/manifest.json`. Only the newest `LOG_MAX_SEGMENTS` (default 20) segments are kept.
+ *
+ * Readers address logs by cursor: a byte offset into the uncompressed concatenation of all segments followed by `logs.txt`, so cursors stay valid across rotations.
+ *
  * @method checkPermission: Checks if the system has permission to log messages
- * @method setup: Sets up the logger database file
+ * @method setup: Sets up the logger database file, segment manifest and write stream
  * @method log: Logs a message
- * @method destroyLogs: Deletes the logs file
+ * @method flush: Writes buffered log lines to the logs file. Returns a promise resolving once they have been handed to the OS.
+ * @method destroyLogs: Deletes the logs file and all segments
+ * @method getManifest: Returns the segment manifest, with the live logs file as the last entry
  * @method readLogs: Reads all logs
+ * @method readLines: Async generator of log lines from a cursor onwards, read lazily across segments
+ * @method streamLogs: Opens a byte-range stream of the logs starting at a cursor (byte offset), across segments. Returns the stream (or `null` if there is nothing new), the cursor the stream starts at (later than the given one if older logs were pruned), the cursor to resume from next and whether the given cursor had to be reset.
  * @method logAndThrow: Logs a message and throws an error (`Error` object)
  */
 class Logger {
     static logsFile = "logs.txt"
+    static segmentsDirectory = "logs"
+    static manifestFile = path.join(this.segmentsDirectory, "manifest.json")
+
+    static #buffer = [];
+    static #bufferBytes = 0;
+    static #flushTimer = null;
+    static #stream = null;
+    static #writing = Promise.resolve();
+    static #rotating = false;
+    static #compression = Promise.resolve();
+    static #manifest = null;
+    static #activeSize = 0; // Bytes of logs.txt already handed to the OS
+    static #activeFirstLog = null;
+    static #activeLastLog = null;
+    static #exitHandlers = false;
+    static #unacknowledged = []; // Chunks taken from the buffer whose write has not completed yet
 
     static checkPermission() {
         return process.env.LOGGING_ENABLED === "True"
     }
 
+    static #setting(name, defaultValue) {
+        const value = parseInt(process.env[name]);
+        return isNaN(value) || value <= 0 ? defaultValue : value
+    }
+
     static setup() {
         if (this.checkPermission()) {
             try {
@@ -31,12 +66,64 @@ class Logger {
                     const datetime = new Date();
                     FileOps.writeTo(Logger.logsFile, `${datetime.toISOString()} LOGGER: Logger database file setup complete.\n`)
                 }
+                this.#loadManifest();
+                if (this.#stream == null) {
+                    this.#openStream();
+                }
+                // Finish compressing segments left uncompressed by an earlier process
+                this.#compressSegments();
+
+                if (!this.#exitHandlers) {
+                    // Whatever has not been written yet when the process exits (chunks still queued for the stream, then the buffer) is written synchronously, in order
+                    process.on("exit", () => {
+                        const pending = this.#unacknowledged.concat(this.#buffer).join("")
+                        if (pending.length > 0) {
+                            try {
+                                fs.appendFileSync(Logger.logsFile, pending)
+                            } catch {}
+                        }
+                    })
+                    this.#exitHandlers = true
+                }
             } catch (err) {
                 console.log(`LOGGER SETUP ERROR: Failed to set up ${this.logsFile} database file. Setup permissions have been granted. Error: ${err}`)
             }
         }
     }
 
+    static #loadManifest() {
+        this.#manifest = { nextSegment: 1, activeStart: 0, segments: [] }
+        if (FileOps.exists(Logger.manifestFile)) {
+            try {
+                this.#manifest = JSON.parse(FileOps.read(Logger.manifestFile))
+            } catch (err) {
+                console.log(`LOGGER LOADMANIFEST ERROR: Failed to parse segment manifest, segments will be ignored. Error: ${err}`)
+            }
+        }
+
+        const size = FileOps.getSize(Logger.logsFile)
+        this.#activeSize = typeof size == "string" ? 0 : size
+        this.#activeFirstLog = null
+        this.#activeLastLog = null
+    }
+
+    static #persistManifest() {
+        if (!FileOps.exists(Logger.segmentsDirectory)) {
+            FileOps.createFolder(Logger.segmentsDirectory)
+        }
+        const result = FileOps.writeTo(Logger.manifestFile, JSON.stringify(this.#manifest))
+        if (result !== true) {
+            console.log(`LOGGER PERSISTMANIFEST ERROR: ${result}`)
+        }
+    }
+
+    static #openStream() {
+        this.#stream = fs.createWriteStream(Logger.logsFile, { flags: "a" })
+        this.#stream.on("error", (err) => {
+            console.log(`LOGGER STREAM ERROR: Failed to write to ${Logger.logsFile}. Error: ${err}`)
+        })
+    }
+
     static log(message, debugPrintExplicitDeny = false) {
         if (process.env.DEBUG_MODE === "True" && !debugPrintExplicitDeny) {
             console.log(message)
@@ -44,27 +131,253 @@ class Logger {
 
         if (this.checkPermission()) {
             try {
-                const datetime = new Date();
-                FileOps.appendTo(Logger.logsFile, `${datetime.toISOString()} ${message}\n`)
+                const datetime = new Date().toISOString();
+                const line = `${datetime} ${message}\n`
+                this.#buffer.push(line)
+                this.#bufferBytes += Buffer.byteLength(line)
+
+                if (this.#bufferBytes >= this.#setting("LOG_FLUSH_BYTES", 64 * 1024)) {
+                    this.flush()
+                } else if (this.#flushTimer == null) {
+                    this.#flushTimer = setTimeout(() => this.flush(), this.#setting("LOG_FLUSH_INTERVAL", 1000))
+                    this.#flushTimer.unref()
+                }
             } catch (err) {
                 console.log(`LOGGER LOG ERROR: Failed to log message ${message}. Error: ${err}`)
             }
         }
     }
 
+    static flush() {
+        if (this.#flushTimer != null) {
+            clearTimeout(this.#flushTimer)
+            this.#flushTimer = null
+        }
+        if (this.#buffer.length == 0 || this.#rotating) {
+            // Lines logged during a rotation are flushed into the new logs file afterwards
+            return this.#writing
+        }
+        if (this.#manifest == null) {
+            this.#loadManifest()
+        }
+        const chunk = this.#buffer.join("")
+        const chunkBytes = this.#bufferBytes
+        const firstLog = this.#buffer[0].slice(0, 24)
+        const lastLog = this.#buffer[this.#buffer.length - 1].slice(0, 24)
+        this.#buffer = []
+        this.#bufferBytes = 0
+        this.#unacknowledged.push(chunk)
+
+        this.#writing = this.#writing.then(() => new Promise((resolve) => {
+            if (this.#stream == null) {
+                this.#openStream()
+            }
+            this.#stream.write(chunk, (err) => {
+                const position = this.#unacknowledged.indexOf(chunk)
+                if (position != -1) {
+                    this.#unacknowledged.splice(position, 1)
+                }
+                if (err) {
+                    console.log(`LOGGER FLUSH ERROR: Failed to write ${chunkBytes} bytes of logs. Error: ${err}`)
+                } else {
+                    this.#activeSize += chunkBytes
+                    this.#activeFirstLog = this.#activeFirstLog || firstLog
+                    this.#activeLastLog = lastLog
+                }
+                resolve()
+            })
+        }))
+            .then(() => {
+                if (this.#activeSize >= this.#setting("LOG_ROTATE_BYTES", 10 * 1024 * 1024) && !this.#rotating) {
+                    return this.#rotate()
+                }
+            })
+
+        return this.#writing
+    }
+
+    static async #rotate() {
+        this.#rotating = true
+        var rotated = false
+        try {
+            await new Promise((resolve) => this.#stream.end(resolve))
+            this.#stream = null
+
+            if (!FileOps.exists(Logger.segmentsDirectory)) {
+                FileOps.createFolder(Logger.segmentsDirectory)
+            }
+            const segmentNumber = this.#manifest.nextSegment
+            const rawPath = path.join(Logger.segmentsDirectory, `${segmentNumber}.txt`)
+            const segment = {
+                segment: segmentNumber,
+                file: `${segmentNumber}.txt`,
+                compressed: false,
+                start: this.#manifest.activeStart,
+                end: this.#manifest.activeStart + this.#activeSize,
+                firstLog: this.#activeFirstLog,
+                lastLog: this.#activeLastLog
+            }
+
+            await fs.promises.rename(Logger.logsFile, rawPath)
+            this.#manifest.segments.push(segment)
+            this.#manifest.nextSegment = segmentNumber + 1
+            this.#manifest.activeStart = segment.end
+            this.#activeSize = 0
+            this.#activeFirstLog = null
+            this.#activeLastLog = null
+            this.#persistManifest()
+            this.#openStream()
+            rotated = true
+        } catch (err) {
+            console.log(`LOGGER ROTATE ERROR: Failed to rotate ${Logger.logsFile}. Error: ${err}`)
+            if (this.#stream == null) {
+                this.#openStream()
+            }
+        } finally {
+            this.#rotating = false
+        }
+
+        // New lines are written while the rotated segment is compressed
+        this.flush()
+        if (rotated) {
+            this.#compressSegments().then(() => this.#pruneSegments())
+        }
+    }
+
+    static #compressSegments() {
+        // Compressions run one after another so a segment is never compressed twice
+        this.#compression = this.#compression.then(() => this.#compressPendingSegments())
+        return this.#compression
+    }
+
+    static async #compressPendingSegments() {
+        for (const segment of this.#manifest.segments) {
+            if (segment.compressed) { continue; }
+
+            const rawPath = path.join(Logger.segmentsDirectory, segment.file)
+            const compressedFile = `${segment.segment}.txt.gz`
+            try {
+                await new Promise((resolve, reject) => {
+                    fs.createReadStream(rawPath)
+                        .on("error", reject)
+                        .pipe(zlib.createGzip())
+                        .on("error", reject)
+                        .pipe(fs.createWriteStream(path.join(Logger.segmentsDirectory, compressedFile)))
+                        .on("error", reject)
+                        .on("finish", resolve)
+                })
+
+                segment.file = compressedFile
+                segment.compressed = true
+                this.#persistManifest()
+                await fs.promises.unlink(rawPath)
+            } catch (err) {
+                console.log(`LOGGER COMPRESSSEGMENTS ERROR: Failed to compress log segment ${segment.segment}; it will be kept uncompressed. Error: ${err}`)
+            }
+        }
+    }
+
+    static #pruneSegments() {
+        const maxSegments = this.#setting("LOG_MAX_SEGMENTS", 20)
+        while (this.#manifest.segments.length > maxSegments) {
+            const segment = this.#manifest.segments.shift()
+            const result = FileOps.deleteFile(path.join(Logger.segmentsDirectory, segment.file))
+            if (result !== true) {
+                console.log(`LOGGER PRUNESEGMENTS ERROR: ${result}`)
+            }
+        }
+        this.#persistManifest()
+    }
+
     static destroyLogs() {
+        this.#buffer = []
+        this.#unacknowledged = []
+        this.#bufferBytes = 0
+        if (this.#stream != null) {
+            this.#stream.end()
+            this.#stream = null
+        }
+
         if (FileOps.exists(Logger.logsFile)) {
             try {
                 const status = FileOps.deleteFile(Logger.logsFile)
                 if (status != true) {
                     console.log(`LOGGER ERROR: Failed to delete logs file. Error: ${status}`)
                 }
-
-                return
             } catch (err) {
                 console.log(`LOGGER DESTROYLOGS ERROR: Failed to delete logs file. Error: ${err}`)
             }
         }
+
+        if (FileOps.exists(Logger.segmentsDirectory)) {
+            const status = FileOps.deleteFolder(Logger.segmentsDirectory)
+            if (status !== true) {
+                console.log(`LOGGER DESTROYLOGS ERROR: Failed to delete log segments. Error: ${status}`)
+            }
+        }
+        this.#manifest = { nextSegment: 1, activeStart: 0, segments: [] }
+        this.#activeSize = 0
+        this.#activeFirstLog = null
+        this.#activeLastLog = null
+    }
+
+    static getManifest() {
+        if (this.#manifest == null) {
+            this.#loadManifest()
+        }
+
+        return {
+            segments: this.#manifest.segments.map(segment => ({ ...segment })),
+            active: {
+                file: Logger.logsFile,
+                start: this.#manifest.activeStart,
+                end: this.#manifest.activeStart + this.#activeSize,
+                firstLog: this.#activeFirstLog,
+                lastLog: this.#activeLastLog
+            }
+        }
+    }
+
+    static #sourcesFrom(cursor, end) {
+        // The byte ranges of each segment, and then the live logs file, that hold logs from cursor up to end
+        const manifest = this.getManifest()
+        const sources = []
+        for (const segment of manifest.segments.concat([manifest.active])) {
+            if (segment.end <= cursor || segment.start >= end) { continue; }
+            sources.push({
+                path: segment.file == Logger.logsFile ? Logger.logsFile : path.join(Logger.segmentsDirectory, segment.file),
+                compressed: segment.compressed === true,
+                skip: Math.max(cursor - segment.start, 0),
+                length: Math.min(segment.end, end) - Math.max(cursor, segment.start)
+            })
+        }
+        return sources
+    }
+
+    static async *#readSources(sources) {
+        for (const source of sources) {
+            var skip = source.skip
+            var remaining = source.length
+            const stream = source.compressed
+                ? fs.createReadStream(source.path).pipe(zlib.createGunzip())
+                : FileOps.createReadStream(source.path, skip, skip + remaining - 1)
+            if (!source.compressed) { skip = 0; }
+
+            for await (var chunk of stream) {
+                if (skip >= chunk.length) {
+                    skip -= chunk.length
+                    continue
+                }
+                chunk = chunk.subarray(skip, skip + remaining)
+                skip = 0
+                remaining -= chunk.length
+                yield chunk
+                if (remaining <= 0) {
+                    stream.destroy()
+                    break
+                }
+            }
+        }
     }
 
     static readLogs() {
@@ -72,17 +385,66 @@ class Logger {
             return "ERROR: Logging-related services do not have permission to operate."
         }
 
-        if (FileOps.exists(Logger.logsFile)) {
-            try {
-                var logs = FileOps.read(Logger.logsFile)
-                logs = logs.split("\n").filter(log => log != "")
-                return logs
-            } catch (err) {
-                console.log(`LOGGER READALL ERROR: Failed to read logs file. Error: ${err}`)
-                return `ERROR: Failed to read logs file. Error: ${err}`
+        try {
+            const manifest = this.getManifest()
+            var logs = []
+            for (const segment of manifest.segments) {
+                const segmentPath = path.join(Logger.segmentsDirectory, segment.file)
+                const data = fs.readFileSync(segmentPath)
+                logs = logs.concat((segment.compressed ? zlib.gunzipSync(data) : data).toString("utf8").split("\n").filter(log => log != ""))
+            }
+            if (FileOps.exists(Logger.logsFile)) {
+                logs = logs.concat(FileOps.read(Logger.logsFile).split("\n").filter(log => log != ""))
             }
-        } else {
-            return []
+            return logs
+        } catch (err) {
+            console.log(`LOGGER READALL ERROR: Failed to read logs file. Error: ${err}`)
+            return `ERROR: Failed to read logs file. Error: ${err}`
+        }
+    }
+
+    static async *readLines(cursor = 0) {
+        const manifest = this.getManifest()
+        const sources = this.#sourcesFrom(cursor, manifest.active.end)
+        const lines = readline.createInterface({ input: Readable.from(this.#readSources(sources)), crlfDelay: Infinity })
+        for await (const line of lines) {
+            if (line != "") {
+                yield line
+            }
+        }
+    }
+
+    static streamLogs(cursor = 0) {
+        if (!this.checkPermission()) {
+            return "ERROR: Logging-related services do not have permission to operate."
+        }
+
+        try {
+            const manifest = this.getManifest()
+            const size = manifest.active.end
+
+            // Logs were destroyed and re-created since the cursor was issued
+            var reset = false;
+            if (cursor > size) {
+                cursor = 0
+                reset = true
+            }
+
+            // Logs before the oldest kept segment have been pruned
+            const firstAvailable = manifest.segments.length > 0 ? manifest.segments[0].start : manifest.active.start
+            if (cursor < firstAvailable) {
+                cursor = firstAvailable
+            }
+
+            if (cursor == size) {
+                return { stream: null, startCursor: cursor, nextCursor: size, reset }
+            }
+
+            const stream = Readable.from(this.#readSources(this.#sourcesFrom(cursor, size)))
+            return { stream, startCursor: cursor, nextCursor: size, reset }
+        } catch (err) {
+            console.log(`LOGGER STREAMLOGS ERROR: Failed to open logs file stream. Error: ${err}`)
+            return `ERROR: Failed to open logs file stream. Error: ${err}`
         }
     }
 
@@ -92,4 +454,4 @@ class Logger {
     }
 }
 
-module.exports = Logger;
\ No newline at end of file
+module.exports = Logger;
@@ -0,0 +1,208 @@
+const v8 = require('v8');
+const { monitorEventLoopDelay, performance, PerformanceObserver, constants } = require('perf_hooks');
+const { sequelize } = require('../models');
+const Analytics = require('./Analytics');
+
+/**
+ * RuntimeStats service to report how the Node process is performing, for diagnosing latency spikes (GC pauses, DB pool starvation or event-loop blocking).
+ *
+ * Event-loop delay, event-loop utilisation, CPU time and GC pauses are reported for the window since the previous call to `getStats` (or since setup), so a poller sees what happened between two polls. Everything else is a point-in-time reading.
+ * Other parts of the system contribute their own readings with `registerProbe` (e.g. the chat WebSocket server reports its connection store).
+ *
+ * @method setup: Starts the event-loop delay monitor and GC observer
+ * @method registerProbe: Registers a function returning readings to include in stats under the given name
+ * @method recordLimiterRequest: Counts a request passed to a rate limiter
+ * @method recordLimiterHit: Counts a request rejected by a rate limiter
+ * @method getStats: Returns the current stats and starts a new measurement window
+ */
+class RuntimeStats {
+    static delayResolutionMs = 10;
+    static #setup = false;
+    static #eventLoopDelay = null;
+    static #gcObserver = null;
+    static #gc = { count: 0, totalMs: 0, maxMs: 0, byKind: {} };
+    static #windowStart = null;
+    static #eventLoopUtilisation = null;
+    static #cpuUsage = null;
+    static #probes = {};
+    static #limiters = {};
+
+    static #gcKinds = {
+        [constants.NODE_PERFORMANCE_GC_MINOR]: "minor",
+        [constants.NODE_PERFORMANCE_GC_MAJOR]: "major",
+        [constants.NODE_PERFORMANCE_GC_INCREMENTAL]: "incremental",
+        [constants.NODE_PERFORMANCE_GC_WEAKCB]: "weakCallbacks"
+    }
+
+    static setup() {
+        if (this.#setup) {
+            return true
+        }
+
+        try {
+            this.#eventLoopDelay = monitorEventLoopDelay({ resolution: this.delayResolutionMs })
+            this.#eventLoopDelay.enable()
+
+            this.#gcObserver = new PerformanceObserver((list) => {
+                for (const entry of list.getEntries()) {
+                    const kind = this.#gcKinds[entry.detail ? entry.detail.kind : entry.kind] || "other"
+                    this.#gc.count += 1
+                    this.#gc.totalMs += entry.duration
+                    this.#gc.maxMs = Math.max(this.#gc.maxMs, entry.duration)
+                    this.#gc.byKind[kind] = (this.#gc.byKind[kind] || 0) + 1
+                }
+            })
+            this.#gcObserver.observe({ entryTypes: ["gc"] })
+
+            this.#startWindow()
+            this.#setup = true
+            return true
+        } catch (err) {
+            return `ERROR: Failed to set up runtime stats; error: ${err}`
+        }
+    }
+
+    static #startWindow() {
+        this.#windowStart = performance.now()
+        this.#eventLoopUtilisation = performance.eventLoopUtilization()
+        this.#cpuUsage = process.cpuUsage()
+        this.#gc = { count: 0, totalMs: 0, maxMs: 0, byKind: {} }
+        if (this.#eventLoopDelay) {
+            this.#eventLoopDelay.reset()
+        }
+    }
+
+    static registerProbe(name, probe) {
+        this.#probes[name] = probe
+    }
+
+    static #limiter(name) {
+        if (!this.#limiters[name]) {
+            this.#limiters[name] = { requests: 0, limited: 0 }
+        }
+        return this.#limiters[name]
+    }
+
+    static recordLimiterRequest(name) {
+        this.#limiter(name).requests += 1
+    }
+
+    static recordLimiterHit(name) {
+        this.#limiter(name).limited += 1
+    }
+
+    static #round(value) {
+        return Math.round(value * 100) / 100
+    }
+
+    static #eventLoopStats() {
+        const histogram = this.#eventLoopDelay
+        if (!histogram || histogram.count == 0) {
+            return null
+        }
+        // Histogram values are in nanoseconds and include the sampling interval itself, so only the lag beyond it is reported
+        const toMs = (value) => this.#round(Math.max(value / 1e6 - this.delayResolutionMs, 0))
+        return {
+            samples: histogram.count,
+            minMs: toMs(histogram.min),
+            meanMs: toMs(histogram.mean),
+            stddevMs: this.#round(histogram.stddev / 1e6),
+            maxMs: toMs(histogram.max),
+            percentilesMs: {
+                p50: toMs(histogram.percentile(50)),
+                p90: toMs(histogram.percentile(90)),
+                p99: toMs(histogram.percentile(99)),
+                p999: toMs(histogram.percentile(99.9))
+            }
+        }
+    }
+
+    static #poolStats() {
+        const pool = sequelize.connectionManager && sequelize.connectionManager.pool
+        if (!pool) {
+            // SQLite keeps its own connections rather than a pool
+            return { dialect: sequelize.getDialect(), pooled: false }
+        }
+
+        const read = (target) => ({
+            size: target.size,
+            available: target.available,
+            using: target.using,
+            waiting: target.waiting,
+            minSize: target.minSize,
+            maxSize: target.maxSize
+        })
+        if (pool.write && pool.read) {
+            return { dialect: sequelize.getDialect(), pooled: true, read: read(pool.read), write: read(pool.write) }
+        }
+        return { dialect: sequelize.getDialect(), pooled: true, ...read(pool) }
+    }
+
+    static #handleStats() {
+        const resources = typeof process.getActiveResourcesInfo == "function" ? process.getActiveResourcesInfo() : []
+        const byType = {}
+        for (const resource of resources) {
+            byType[resource] = (byType[resource] || 0) + 1
+        }
+        return { total: resources.length, byType }
+    }
+
+    static getStats() {
+        if (!this.#setup) {
+            this.setup()
+        }
+
+        const windowMs = performance.now() - this.#windowStart
+        const memory = process.memoryUsage()
+        const heap = v8.getHeapStatistics()
+        const cpu = process.cpuUsage(this.#cpuUsage)
+
+        const probes = {}
+        for (const [name, probe] of Object.entries(this.#probes)) {
+            try {
+                probes[name] = probe()
+            } catch (err) {
+                probes[name] = { error: String(err) }
+            }
+        }
+
+        const stats = {
+            timestamp: new Date().toISOString(),
+            uptimeSeconds: this.#round(process.uptime()),
+            windowMs: this.#round(windowMs),
+            eventLoop: {
+                delay: this.#eventLoopStats(),
+                utilisation: this.#round(performance.eventLoopUtilization(this.#eventLoopUtilisation).utilization)
+            },
+            cpu: {
+                userMs: this.#round(cpu.user / 1000),
+                systemMs: this.#round(cpu.system / 1000),
+                percent: windowMs > 0 ? this.#round((cpu.user + cpu.system) / 10 / windowMs) : 0
+            },
+            gc: {
+                count: this.#gc.count,
+                totalMs: this.#round(this.#gc.totalMs),
+                maxMs: this.#round(this.#gc.maxMs),
+                byKind: this.#gc.byKind
+            },
+            memory: {
+                rss: memory.rss,
+                heapUsed: memory.heapUsed,
+                heapTotal: memory.heapTotal,
+                heapLimit: heap.heap_size_limit,
+                external: memory.external,
+                arrayBuffers: memory.arrayBuffers
+            },
+            handles: this.#handleStats(),
+            databasePool: this.#poolStats(),
+            analyticsPending: Analytics.getPersistenceHealth().pending,
+            limiters: JSON.parse(JSON.stringify(this.#limiters)),
+            ...probes
+        }
+
+        this.#startWindow()
+        return stats
+    }
+}
+
+module.exports = RuntimeStats;
@@ -0,0 +1,85 @@
+const db = require('../models');
+
+/**
+ * SchemaUpgrade service to bring an existing database up to date with the models at boot.
+ *
+ * The server synchronises with a plain `sequelize.sync()`, which creates missing tables but never changes existing ones. Columns added to a model since a table was created are added here, using the model's type, nullability and default, so existing rows take the default. Named indexes a model defines are created if missing; a unique index cannot be created while the table holds duplicate values, which must be resolved first. `dbTools.js` (which synchronises with `alter`) makes the same changes.
+ *
+ * @method addMissingColumns: Add the columns a model defines that its table lacks. Returns the names of the columns added.
+ * @method addMissingIndexes: Add the named indexes a model defines that its table lacks. Returns the names of the indexes added.
+ * @method run: Apply all upgrades. Returns `true`, or an error string.
+ */
+class SchemaUpgrade {
+    // Models whose tables have gained columns since they were first released
+    static #columnUpgrades = ["RequestAnalytics"];
+    // Models whose tables have gained indexes the system relies on for correctness
+    static #indexUpgrades = ["Reservation"];
+
+    static async addMissingColumns(model) {
+        const queryInterface = db.sequelize.getQueryInterface()
+        const tableName = model.getTableName()
+        const existingColumns = await queryInterface.describeTable(tableName)
+
+        const added = []
+        for (const [attributeName, attribute] of Object.entries(model.rawAttributes)) {
+            const columnName = attribute.field || attributeName
+            if (existingColumns[columnName] !== undefined) {
+                continue
+            }
+
+            await queryInterface.addColumn(tableName, columnName, {
+                type: attribute.type,
+                allowNull: attribute.allowNull !== false,
+                defaultValue: attribute.defaultValue
+            })
+            added.push(columnName)
+        }
+        return added
+    }
+
+    static async addMissingIndexes(model) {
+        const queryInterface = db.sequelize.getQueryInterface()
+        const tableName = model.getTableName()
+        const existingIndexes = (await queryInterface.showIndex(tableName)).map(index => index.name)
+
+        const added = []
+        for (const index of model.options.indexes || []) {
+            if (!index.name || existingIndexes.includes(index.name)) {
+                continue
+            }
+
+            try {
+                await queryInterface.addIndex(tableName, { name: index.name, unique: index.unique === true, fields: index.fields })
+            } catch (err) {
+                if (index.unique === true) {
+                    throw new Error(`Unique index ${index.name} could not be added to ${tableName}; remove duplicate ${index.fields.join(", ")} values first. Error: ${err}`)
+                }
+                throw err
+            }
+            added.push(index.name)
+        }
+        return added
+    }
+
+    static async run() {
+        try {
+            for (const modelName of this.#columnUpgrades) {
+                const added = await this.addMissingColumns(db[modelName])
+                if (added.length > 0) {
+                    console.log(`SCHEMAUPGRADE: Added column(s) ${added.join(", ")} to ${db[modelName].getTableName()}.`)
+                }
+            }
+            for (const modelName of this.#indexUpgrades) {
+                const added = await this.addMissingIndexes(db[modelName])
+                if (added.length > 0) {
+                    console.log(`SCHEMAUPGRADE: Added index(es) ${added.join(", ")} to ${db[modelName].getTableName()}.`)
+                }
+            }
+            return true
+        } catch (err) {
+            return `ERROR: Failed to upgrade database schema; error: ${err}`
+        }
+    }
+}
+
+module.exports = SchemaUpgrade;
@@ -0,0 +1,166 @@
+const { Op } = require('sequelize');
+const { UserRecord } = require('../models');
+
+/**
+ * UserRecordCache service to serve the `UserRecord` lookups made on every authenticated request, and the banned host list used by `/cdn/listings`, from memory.
+ *
+ * Records are kept for `USERRECORD_CACHE_TTL` milliseconds (default 60000), up to `USERRECORD_CACHE_SIZE` entries (default 10000), with the least recently used evicted first. Concurrent lookups of the same user share one query, and users without a record are never cached, so new accounts are seen straight away.
+ * Changes made through the system (bans, account deletions, resets) invalidate the affected entries immediately; the TTL bounds how long anything else (e.g. another server process) can be served stale.
+ *
+ * @method getRecord: Get the plain `UserRecord` for a host, guest or admin ID, or `null` if there is none
+ * @method getBannedHostIDs: Get the IDs of all banned hosts
+ * @method invalidate: Drop a user's cached record (and the banned host list) after it changes
+ * @method flush: Drop everything cached. Returns the number of records dropped.
+ * @method getStats: Get hit, miss, eviction and invalidation counts since boot, with the cache's size and settings
+ */
+class UserRecordCache {
+    static #records = new Map();
+    static #pending = new Map();
+    static #bannedHosts = null;
+    static #bannedHostsPending = null;
+    static #generation = 0;
+    static #stats = { hits: 0, misses: 0, evictions: 0, expirations: 0, invalidations: 0, flushes: 0, bannedHostsHits: 0, bannedHostsMisses: 0 };
+
+    static #ttl() {
+        const value = parseInt(process.env.USERRECORD_CACHE_TTL);
+        return isNaN(value) || value < 0 ? 60000 : value
+    }
+
+    static #maxEntries() {
+        const value = parseInt(process.env.USERRECORD_CACHE_SIZE);
+        return isNaN(value) || value < 0 ? 10000 : value
+    }
+
+    static #store(userID, record) {
+        const maxEntries = this.#maxEntries()
+        if (maxEntries == 0) {
+            return
+        }
+        this.#records.delete(userID)
+        while (this.#records.size >= maxEntries) {
+            // Maps iterate in insertion order, and hits re-insert, so the first key is the least recently used
+            this.#records.delete(this.#records.keys().next().value)
+            this.#stats.evictions += 1
+        }
+        this.#records.set(userID, { record, expiresAt: Date.now() + this.#ttl() })
+    }
+
+    static async getRecord(userID) {
+        const entry = this.#records.get(userID)
+        if (entry) {
+            if (entry.expiresAt > Date.now()) {
+                this.#stats.hits += 1
+                this.#records.delete(userID)
+                this.#records.set(userID, entry)
+                return entry.record
+            }
+            this.#records.delete(userID)
+            this.#stats.expirations += 1
+        }
+
+        this.#stats.misses += 1
+        if (this.#pending.has(userID)) {
+            return this.#pending.get(userID)
+        }
+
+        // A lookup that was under way when its entry was invalidated must not put the old record back, and is not shared with later lookups
+        const generation = this.#generation
+        const lookup = UserRecord.findOne({
+            where: {
+                [Op.or]: [
+                    { gID: userID },
+                    { hID: userID },
+                    { aID: userID }
+                ]
+            }
+        })
+            .then(found => {
+                // Plain copies of model instances keep parsed attributes; raw SQLite rows would have `banned` as 1 or 0
+                const record = found ? found.get({ plain: true }) : null
+                if (record && generation == this.#generation) {
+                    this.#store(userID, record)
+                }
+                return record
+            })
+            .finally(() => {
+                if (this.#pending.get(userID) === lookup) {
+                    this.#pending.delete(userID)
+                }
+            })
+        this.#pending.set(userID, lookup)
+        return lookup
+    }
+
+    static async getBannedHostIDs() {
+        if (this.#bannedHosts && this.#bannedHosts.expiresAt > Date.now()) {
+            this.#stats.bannedHostsHits += 1
+            return this.#bannedHosts.hostIDs
+        }
+
+        this.#stats.bannedHostsMisses += 1
+        if (this.#bannedHostsPending) {
+            return this.#bannedHostsPending
+        }
+
+        const generation = this.#generation
+        const lookup = UserRecord.findAll({
+            where: {
+                [Op.and]: [
+                    { banned: true },
+                    { hID: { [Op.not]: null } }
+                ]
+            },
+            attributes: ["hID"],
+            raw: true
+        })
+            .then(records => {
+                const hostIDs = records.map(record => record.hID)
+                if (generation == this.#generation) {
+                    this.#bannedHosts = { hostIDs, expiresAt: Date.now() + this.#ttl() }
+                }
+                return hostIDs
+            })
+            .finally(() => {
+                if (this.#bannedHostsPending === lookup) {
+                    this.#bannedHostsPending = null
+                }
+            })
+        this.#bannedHostsPending = lookup
+        return lookup
+    }
+
+    static invalidate(userID) {
+        this.#generation += 1
+        this.#records.delete(userID)
+        this.#pending.delete(userID)
+        this.#bannedHosts = null
+        this.#bannedHostsPending = null
+        this.#stats.invalidations += 1
+    }
+
+    static flush() {
+        const dropped = this.#records.size
+        this.#generation += 1
+        this.#records.clear()
+        this.#pending.clear()
+        this.#bannedHosts = null
+        this.#bannedHostsPending = null
+        this.#stats.flushes += 1
+        return dropped
+    }
+
+    static getStats() {
+        const lookups = this.#stats.hits + this.#stats.misses
+        return {
+            entries: this.#records.size,
+            maxEntries: this.#maxEntries(),
+            ttlMs: this.#ttl(),
+            hitRatio: lookups > 0 ? Math.round(this.#stats.hits / lookups * 10000) / 10000 : null,
+            ...this.#stats,
+            bannedHostsCached: this.#bannedHosts !== null && this.#bannedHosts.expiresAt > Date.now(),
+            bannedHosts: this.#bannedHosts ? this.#bannedHosts.hostIDs.length : null
+        }
+    }
+}
+
+module.exports = UserRecordCache;
@@ -2,6 +2,8 @@ const fs = require('fs');
 const path = require('path');
 const BootCheck = require('./BootCheck');
 const Cache = require('./Cache');
+const DatabaseReset = require('./DatabaseReset');
+const DatasetGenerator = require('./DatasetGenerator');
 const Emailer = require('./Emailer');
 const Encryption = require('./Encryption');
 const Extensions = require('./Extensions');
@@ -11,13 +13,18 @@ const HTMLRenderer = require('./HTMLRenderer');
 const Logger = require('./Logger');
 const TokenManager = require('./TokenManager');
 const Universal = require('./Universal');
+const UserRecordCache = require('./UserRecordCache');
 const FileManager = require('./FileManager');
 const Analytics = require('./Analytics');
+const RuntimeStats = require('./RuntimeStats');
+const SchemaUpgrade = require('./SchemaUpgrade');
 
 const services = {
     Analytics,
     BootCheck,
     Cache,
+    DatabaseReset,
+    DatasetGenerator,
     Emailer,
     Encryption,
     Extensions,
@@ -26,8 +33,11 @@ const services = {
     FireStorage,
     HTMLRenderer,
     Logger,
+    RuntimeStats,
+    SchemaUpgrade,
     TokenManager,
-    Universal
+    Universal,
+    UserRecordCache
 };
 
 fs.readdirSync(__dirname)
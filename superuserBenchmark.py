@@ -0,0 +1,466 @@
+import os, sys, json, datetime, requests, time, random, asyncio, argparse, base64
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from superuserScript import SuperuserClient, SuperuserAPIError
+
+class BenchmarkUser:
+    """
+    A logged in MakanMatch account used to issue authenticated benchmark requests.
+
+    Credentials are given as `username:password` (or `email:password`). The access token is replaced whenever the server hands back a refreshed one.
+    """
+
+    def __init__(self, session, baseURL, credentials):
+        self.session = session
+        self.baseURL = baseURL
+        self.identifier, _, self.password = credentials.partition(":")
+        if self.identifier == "" or self.password == "":
+            raise Exception("Invalid credentials '{}'. Use the format username:password.".format(credentials))
+        self.token = None
+        self.userID = None
+
+    def login(self):
+        response = self.session.post(self.baseURL + "/loginAccount", json={ "usernameOrEmail": self.identifier, "password": self.password }, timeout=30)
+        if response.status_code != 200:
+            raise Exception("Failed to log in as '{}'. Server response: {}".format(self.identifier, response.text))
+        loginData = response.json()
+        self.token = loginData["accessToken"]
+        self.userID = loginData["user"]["userID"]
+        return self
+
+    def headers(self):
+        return { "Authorization": "Bearer " + self.token }
+
+    def track(self, response):
+        if response.headers.get("refreshedtoken"):
+            self.token = response.headers["refreshedtoken"]
+        return response
+
+class Workload:
+    """
+    Benchmark operations and the weighted mixes they are drawn from.
+
+    Each operation issues one request through the shared session and returns the response. Operations that need an account are only available when the matching login was provided; `createReservation` draws from a pool of (guest, listing) pairs prepared before the run, since a guest can reserve a listing only once. Pairs are claimed through `argumentsFor` on the event loop, so no two virtual users can claim the same one.
+    """
+
+    # 1x1 transparent PNG, used as the image of benchmark listings
+    listingImage = base64.b64decode("iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII=")
+
+    mixes = {
+        "browse": { "listings": 40, "getListing": 35, "getReviews": 20, "fetchAllUsers": 5 },
+        "write": { "addListing": 50, "createReservation": 50 },
+        "mixed": { "listings": 30, "getListing": 25, "getReviews": 15, "fetchAllUsers": 5, "addListing": 10, "createReservation": 15 }
+    }
+
+    requirements = {
+        "fetchAllUsers": "admin",
+        "addListing": "host",
+        "createReservation": "guest"
+    }
+
+    def __init__(self, session, baseURL, hosts=None, guests=None, admin=None):
+        self.session = session
+        self.baseURL = baseURL
+        self.hosts = hosts or []
+        self.guests = guests or []
+        self.admin = admin
+        self.listingIDs = []
+        self.hostIDs = []
+        self.reservable = []
+        self.operations = {
+            "listings": self.listings,
+            "getListing": self.getListing,
+            "getReviews": self.getReviews,
+            "fetchAllUsers": self.fetchAllUsers,
+            "addListing": self.addListing,
+            "createReservation": self.createReservation
+        }
+
+    @staticmethod
+    def parseMix(text):
+        """Parses a mix name (browse/write/mixed) or `operation=weight,...`."""
+        if text in Workload.mixes:
+            return dict(Workload.mixes[text])
+
+        mix = {}
+        for part in text.split(","):
+            operation, _, weight = part.partition("=")
+            operation = operation.strip()
+            if operation not in Workload.mixes["mixed"]:
+                raise Exception("Unknown operation '{}'. Available operations: {}".format(operation, ", ".join(Workload.mixes["mixed"].keys())))
+            mix[operation] = float(weight) if weight else 1
+        return mix
+
+    def missingLogin(self, operation):
+        """Returns the login an operation is missing, or None if it can run."""
+        requirement = Workload.requirements.get(operation)
+        if requirement == "admin" and self.admin is None:
+            return "an admin login (--admin)"
+        elif requirement == "host" and len(self.hosts) == 0:
+            return "a host login (--host)"
+        elif requirement == "guest" and (len(self.guests) == 0 or len(self.hosts) == 0):
+            return "guest (--guest) and host (--host) logins"
+        return None
+
+    def checkMix(self, mix, strict=True):
+        """Raises if an operation in a custom mix cannot run. Named mixes (`strict=False`) drop such operations instead."""
+        for operation in list(mix.keys()):
+            missing = self.missingLogin(operation)
+            if missing is None:
+                continue
+            elif strict:
+                raise Exception("Operation '{}' needs {}.".format(operation, missing))
+            print("Skipping operation '{}': it needs {}.".format(operation, missing))
+            del mix[operation]
+
+        if len(mix) == 0:
+            raise Exception("No operations in the mix can run with the given logins.")
+        return mix
+
+    def discover(self):
+        """Collects existing listing and host IDs for the read operations."""
+        response = self.session.get(self.baseURL + "/cdn/listings", timeout=60)
+        if response.status_code != 200:
+            raise Exception("Failed to retrieve listings for the workload. Server response: {}".format(response.text))
+        listings = response.json()
+        self.listingIDs = [listing["listingID"] for listing in listings]
+        self.hostIDs = sorted(set(listing["hostID"] for listing in listings)) or [host.userID for host in self.hosts]
+
+    def createListing(self, host, title):
+        response = host.track(self.session.post(
+            self.baseURL + "/listings/addListing",
+            headers=host.headers(),
+            data={
+                "title": title,
+                "shortDescription": "Benchmark listing",
+                "longDescription": "Listing created by the MakanMatch benchmark harness.",
+                "portionPrice": 5,
+                "totalSlots": 10,
+                "datetime": (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=7)).isoformat()
+            },
+            files=[("images", ("benchmark.png", Workload.listingImage, "image/png"))],
+            timeout=60
+        ))
+        return response
+
+    def prepareReservations(self, count):
+        """Creates and publishes listings until `count` (guest, listing) reservation pairs are available."""
+        listingsNeeded = -(-count // len(self.guests))
+        for index in range(listingsNeeded):
+            host = self.hosts[index % len(self.hosts)]
+            response = self.createListing(host, "Benchmark reservation listing {}".format(index + 1))
+            if response.status_code != 200:
+                raise Exception("Failed to create listing for reservations. Server response: {}".format(response.text))
+            listingID = response.json()["listingDetails"]["listingID"]
+
+            response = host.track(self.session.post(self.baseURL + "/updateListing", headers=host.headers(), json={ "listingID": listingID, "published": True }, timeout=60))
+            if response.status_code != 200:
+                raise Exception("Failed to publish listing for reservations (the host needs a payment image). Server response: {}".format(response.text))
+
+            self.listingIDs.append(listingID)
+            self.reservable.extend((guest, listingID) for guest in self.guests)
+        random.shuffle(self.reservable)
+
+    def available(self, operation):
+        if operation == "createReservation":
+            return len(self.reservable) > 0
+        elif operation in ["getListing"]:
+            return len(self.listingIDs) > 0
+        elif operation in ["getReviews"]:
+            return len(self.hostIDs) > 0
+        return True
+
+    def argumentsFor(self, operation):
+        if operation == "createReservation":
+            return self.reservable.pop()
+        return ()
+
+    def listings(self):
+        return self.session.get(self.baseURL + "/cdn/listings", params={ "includeReservations": "true" }, timeout=60)
+
+    def getListing(self):
+        return self.session.get(self.baseURL + "/cdn/getListing", params={ "id": random.choice(self.listingIDs), "includeReservations": "true", "includeHost": "true" }, timeout=60)
+
+    def getReviews(self):
+        return self.session.get(self.baseURL + "/cdn/getReviews", params={ "hostID": random.choice(self.hostIDs), "order": "mostRecent" }, timeout=60)
+
+    def fetchAllUsers(self):
+        return self.admin.track(self.session.get(self.baseURL + "/cdn/fetchAllUsers", headers=self.admin.headers(), timeout=60))
+
+    def addListing(self):
+        return self.createListing(random.choice(self.hosts), "Benchmark listing")
+
+    def createReservation(self, guest, listingID):
+        return guest.track(self.session.post(self.baseURL + "/createReservation", headers=guest.headers(), json={ "listingID": listingID, "portions": 1 }, timeout=60))
+
+class BenchmarkRun:
+    """
+    Closed-loop load generator: `concurrency` virtual users issue requests back to back for `duration` seconds (or until `maxRequests`), drawing operations from the weighted mix.
+
+    Virtual users are asyncio tasks dispatching onto a thread pool of the same size that shares one pooled session. Requests issued during the warm-up period are not recorded.
+    """
+
+    def __init__(self, workload, mix, concurrency=10, duration=30, maxRequests=None, warmup=0):
+        self.workload = workload
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.maxRequests = maxRequests
+        self.warmup = warmup
+        self.samples = { operation: [] for operation in mix }
+        self.issued = 0
+
+    def chooseOperation(self):
+        operations = [operation for operation in self.mix if self.workload.available(operation)]
+        if len(operations) == 0:
+            return None
+        return random.choices(operations, weights=[self.mix[operation] for operation in operations])[0]
+
+    def timedCall(self, operation, arguments):
+        startTime = time.perf_counter()
+        try:
+            status = self.workload.operations[operation](*arguments).status_code
+        except requests.RequestException:
+            status = None
+        return status, time.perf_counter() - startTime
+
+    async def virtualUser(self, executor, recordFrom, endTime):
+        loop = asyncio.get_running_loop()
+        while time.perf_counter() < endTime and (self.maxRequests is None or self.issued < self.maxRequests):
+            operation = self.chooseOperation()
+            if operation is None:
+                return
+            self.issued += 1
+            startedAt = time.perf_counter()
+            status, latency = await loop.run_in_executor(executor, self.timedCall, operation, self.workload.argumentsFor(operation))
+            if startedAt >= recordFrom:
+                self.samples[operation].append((status, latency))
+
+    async def runAsync(self):
+        startTime = time.perf_counter()
+        recordFrom = startTime + self.warmup
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            await asyncio.gather(*(self.virtualUser(executor, recordFrom, recordFrom + self.duration) for _ in range(self.concurrency)))
+        return time.perf_counter() - recordFrom
+
+    def run(self):
+        """Runs the benchmark and returns per-operation results."""
+        elapsed = asyncio.run(self.runAsync())
+        return { operation: BenchmarkRun.summarise(samples, elapsed) for operation, samples in self.samples.items() if len(samples) > 0 }, elapsed
+
+    @staticmethod
+    def summarise(samples, elapsed):
+        latencies = sorted(latency for _, latency in samples)
+        statuses = {}
+        for status, _ in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        percentile = lambda p: round(latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)] * 1000, 2)
+        return {
+            "requests": len(samples),
+            "throughputPerSecond": round(len(samples) / elapsed, 2) if elapsed > 0 else 0,
+            "p50Ms": percentile(50),
+            "p95Ms": percentile(95),
+            "p99Ms": percentile(99),
+            "successRate": round(sum(1 for status, _ in samples if status is not None and 200 <= status < 300) / len(samples), 4),
+            "rateLimitedRate": round(statuses.get("429", 0) / len(samples), 4),
+            "statuses": statuses
+        }
+
+class BenchmarkAnalytics:
+    """Server-side view of a run: the change in request analytics between snapshots pulled before and after the run."""
+
+    @staticmethod
+    def snapshot(client):
+        if client is None:
+            return None
+        try:
+            return client.getAnalytics()
+        except (SuperuserAPIError, requests.RequestException) as e:
+            print("Could not retrieve analytics; server-side metrics will be omitted. Error: {}".format(e), file=sys.stderr)
+            return None
+
+    @staticmethod
+    def diff(before, after):
+        if before is None or after is None:
+            return None
+
+        previous = { (row["method"], row["requestURL"]): row for row in before["requestMetrics"] }
+        routes = {}
+        for row in after["requestMetrics"]:
+            old = previous.get((row["method"], row["requestURL"]), {})
+            requestsCount = row["requestsCount"] - old.get("requestsCount", 0)
+            if requestsCount <= 0:
+                continue
+            route = { "requests": requestsCount, "successResponses": row["successResponses"] - old.get("successResponses", 0) }
+            if row.get("totalLatencyMs") is not None:
+                route["serverMeanMs"] = round((row["totalLatencyMs"] - (old.get("totalLatencyMs") or 0)) / requestsCount, 2)
+            routes["{} {}".format(row["method"], row["requestURL"])] = route
+
+        systemMetrics = {}
+        for metric, value in after["systemMetrics"].items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and isinstance(before["systemMetrics"].get(metric), (int, float)):
+                systemMetrics[metric] = value - before["systemMetrics"][metric]
+
+        return { "routes": routes, "systemMetrics": systemMetrics }
+
+class Baselines:
+    """Saved benchmark reports under `MakanMatchBenchmarks/`, compared per operation to surface regressions."""
+
+    directory = "MakanMatchBenchmarks"
+
+    @staticmethod
+    def path(name):
+        return os.path.join(Baselines.directory, name + ".json")
+
+    @staticmethod
+    def save(name, report):
+        os.makedirs(Baselines.directory, exist_ok=True)
+        with open(Baselines.path(name), "w") as f:
+            json.dump(report, f, indent=4)
+
+    @staticmethod
+    def load(name):
+        if not os.path.exists(Baselines.path(name)):
+            raise Exception("Baseline '{}' not found in {}.".format(name, Baselines.directory))
+        with open(Baselines.path(name), "r") as f:
+            return json.load(f)
+
+    @staticmethod
+    def compare(baseline, report, maxRegression):
+        """Returns a list of regressions: p95 latency up, or throughput or success rate down, by more than `maxRegression` percent."""
+        regressions = []
+        for operation, result in report["operations"].items():
+            previous = baseline["operations"].get(operation)
+            if previous is None:
+                continue
+            checks = [
+                ("p95Ms", result["p95Ms"], previous["p95Ms"], 1),
+                ("throughputPerSecond", result["throughputPerSecond"], previous["throughputPerSecond"], -1),
+                ("successRate", result["successRate"], previous["successRate"], -1)
+            ]
+            for metric, current, old, direction in checks:
+                if old == 0:
+                    continue
+                change = (current - old) / old * 100
+                if change * direction > maxRegression:
+                    regressions.append({ "operation": operation, "metric": metric, "baseline": old, "current": current, "changePercent": round(change, 1) })
+        return regressions
+
+def printReport(report, regressions=None):
+    columns = ["operation", "requests", "throughputPerSecond", "p50Ms", "p95Ms", "p99Ms", "successRate", "rateLimitedRate"]
+    rows = [dict(result, operation=operation) for operation, result in report["operations"].items()]
+    widths = [max(len(column), *(len(str(row[column])) for row in rows)) if rows else len(column) for column in columns]
+    print("Benchmark '{}' against {}: mix {}, {} virtual users, {}s.".format(report["name"], report["baseURL"], report["mix"], report["concurrency"], report["elapsedSeconds"]))
+    print()
+    print("\t" + "  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("\t" + "  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+    if report["server"] is not None:
+        print()
+        print("Server-side request analytics during the run:")
+        for route, metrics in sorted(report["server"]["routes"].items(), key=lambda item: -item[1]["requests"]):
+            print("\t{}: {}".format(route, metrics))
+
+    if regressions is not None:
+        print()
+        if len(regressions) == 0:
+            print("No regressions against baseline '{}'.".format(report["comparedTo"]))
+        else:
+            print("Regressions against baseline '{}':".format(report["comparedTo"]))
+            for regression in regressions:
+                print("\t{} {}: {} -> {} ({:+}%)".format(regression["operation"], regression["metric"], regression["baseline"], regression["current"], regression["changePercent"]))
+
+def buildParser():
+    parser = argparse.ArgumentParser(
+        prog="superuserBenchmark.py",
+        description="HTTP benchmark harness for a locally booted MakanMatch backend (e.g. DB_MODE=sqlite after `node dbTools.js reset`, FILEMANAGER_MODE=local)."
+    )
+    parser.add_argument("--url", default=os.environ.get("MM_SUPERUSER_URL", "http://localhost:8000"), help="Backend location (default: $MM_SUPERUSER_URL or http://localhost:8000)")
+    parser.add_argument("--key", default=os.environ.get("MM_SUPERUSER_KEY"), help="Superuser access key, to pull analytics before and after the run (default: $MM_SUPERUSER_KEY)")
+    parser.add_argument("--mix", default="browse", help="Workload mix: browse, write, mixed, or operation=weight,... (default: browse)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Number of virtual users (default: 10)")
+    parser.add_argument("--duration", type=float, default=30, help="Measured run time in seconds (default: 30)")
+    parser.add_argument("--warmup", type=float, default=0, help="Seconds of unrecorded warm-up before measuring (default: 0)")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--host", action="append", default=[], metavar="USER:PASSWORD", help="Host login for addListing and reservation listings (repeatable; default: $MM_BENCH_HOST)")
+    parser.add_argument("--guest", action="append", default=[], metavar="USER:PASSWORD", help="Guest login for createReservation (repeatable; default: $MM_BENCH_GUEST, comma-separated)")
+    parser.add_argument("--admin", default=os.environ.get("MM_BENCH_ADMIN"), metavar="USER:PASSWORD", help="Admin login for fetchAllUsers (default: $MM_BENCH_ADMIN)")
+    parser.add_argument("--reservations", type=int, default=100, help="Reservation pairs to prepare when the mix includes createReservation (default: 100)")
+    parser.add_argument("--name", default=None, help="Name of this run (default: the mix name and a timestamp)")
+    parser.add_argument("--out", help="Write the full JSON report to this file")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Save this run as a baseline in {}/".format(Baselines.directory))
+    parser.add_argument("--baseline", metavar="NAME", help="Compare this run with a saved baseline; exits with status 1 on regression")
+    parser.add_argument("--max-regression", type=float, default=20, help="Allowed regression in percent before a baseline comparison fails (default: 20)")
+    return parser
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    baseURL = args.url.rstrip("/")
+    hostLogins = args.host or [login for login in os.environ.get("MM_BENCH_HOST", "").split(",") if login]
+    guestLogins = args.guest or [login for login in os.environ.get("MM_BENCH_GUEST", "").split(",") if login]
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    superuserClient = SuperuserClient(baseURL, accessKey=args.key) if args.key else None
+
+    try:
+        mix = Workload.parseMix(args.mix)
+        workload = Workload(
+            session,
+            baseURL,
+            hosts=[BenchmarkUser(session, baseURL, login).login() for login in hostLogins],
+            guests=[BenchmarkUser(session, baseURL, login).login() for login in guestLogins],
+            admin=BenchmarkUser(session, baseURL, args.admin).login() if args.admin else None
+        )
+        workload.checkMix(mix, strict=args.mix not in Workload.mixes)
+        if "createReservation" in mix:
+            print("Preparing {} reservation slots...".format(args.reservations))
+            workload.prepareReservations(args.reservations)
+        workload.discover()
+
+        before = BenchmarkAnalytics.snapshot(superuserClient)
+        print("Running benchmark...")
+        results, elapsed = BenchmarkRun(workload, mix, args.concurrency, args.duration, args.requests, args.warmup).run()
+        after = BenchmarkAnalytics.snapshot(superuserClient)
+
+        report = {
+            "name": args.name or "{}-{}".format(args.mix if args.mix in Workload.mixes else "custom", datetime.datetime.now().strftime("%Y%m%d%H%M%S")),
+            "baseURL": baseURL,
+            "mix": mix,
+            "concurrency": args.concurrency,
+            "startedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "elapsedSeconds": round(elapsed, 2),
+            "operations": results,
+            "server": BenchmarkAnalytics.diff(before, after)
+        }
+
+        regressions = None
+        if args.baseline:
+            regressions = Baselines.compare(Baselines.load(args.baseline), report, args.max_regression)
+            report["comparedTo"] = args.baseline
+            report["regressions"] = regressions
+
+        print()
+        printReport(report, regressions)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=4)
+        if args.save_baseline:
+            Baselines.save(args.save_baseline, report)
+            print()
+            print("Baseline '{}' saved.".format(args.save_baseline))
+
+        return 1 if regressions else 0
+    except Exception as e:
+        print("ERROR: " + str(e), file=sys.stderr)
+        return 1
+    finally:
+        session.close()
+        if superuserClient is not None:
+            superuserClient.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
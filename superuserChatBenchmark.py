@@ -0,0 +1,320 @@
+import os, sys, json, datetime, requests, time, asyncio, argparse, uuid, itertools
+from superuserScript import AnalyticsWarehouse
+from superuserBenchmark import BenchmarkUser
+
+def websocketsModule():
+    try:
+        import websockets
+        return websockets
+    except ImportError:
+        raise Exception("The chat load tester requires the websockets package. Install it with `pip install websockets`.")
+
+def percentiles(latencies):
+    if len(latencies) == 0:
+        return { "count": 0, "p50Ms": None, "p95Ms": None, "p99Ms": None }
+    latencies = sorted(latencies)
+    percentile = lambda p: round(latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)] * 1000, 2)
+    return { "count": len(latencies), "p50Ms": percentile(50), "p95Ms": percentile(95), "p99Ms": percentile(99) }
+
+class ChatLoadConnection:
+    """
+    One authenticated chat WebSocket connection.
+
+    A reader task dispatches incoming events: `chat_id` events build the connection's chat list, history responses resolve pending waiters, and `send` broadcasts carrying a load-test token are timed against the moment the token was sent.
+    """
+
+    def __init__(self, test, user):
+        self.test = test
+        self.user = user
+        self.ws = None
+        self.chatIDs = []
+        self.waiters = {}
+        self.reader = None
+        self.errors = 0
+
+    async def open(self):
+        websockets = websocketsModule()
+        startTime = time.perf_counter()
+        self.ws = await websockets.connect(self.test.wsURL, max_size=None, open_timeout=self.test.timeout)
+        connected = self.waitFor(("connected",))
+        self.reader = asyncio.ensure_future(self.read())
+        await self.ws.send(json.dumps({ "action": "connect", "authToken": self.user.token }))
+        await asyncio.wait_for(connected, self.test.timeout)
+        connectTime = time.perf_counter() - startTime
+
+        # Chat IDs follow the connected event one by one; wait until they stop arriving
+        await asyncio.sleep(self.test.settle)
+        return connectTime
+
+    def waitFor(self, key):
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(key, []).append(future)
+        return future
+
+    def resolve(self, key, value):
+        for future in self.waiters.pop(key, []):
+            if not future.done():
+                future.set_result(value)
+
+    async def read(self):
+        try:
+            async for raw in self.ws:
+                receivedAt = time.perf_counter()
+                event = json.loads(raw)
+                action = event.get("action") or event.get("event")
+                if action == "connected":
+                    self.resolve(("connected",), event)
+                elif action == "chat_id":
+                    self.chatIDs.append(event["chatID"])
+                elif action == "chat_history":
+                    self.resolve(("chat_history", event["chatID"]), event)
+                elif action == "older_messages":
+                    self.resolve(("older_messages", event["chatID"], event["before"]), event)
+                elif action == "send":
+                    self.test.messageReceived(self, event["message"], receivedAt)
+                elif action == "refreshToken":
+                    self.user.token = event["token"]
+                elif action == "error":
+                    self.errors += 1
+        except Exception:
+            pass
+
+    async def loadHistory(self, chatID, limit=None):
+        """Returns the time taken to load the latest page of a chat and the page."""
+        request = { "action": "chat_history", "chatID": chatID }
+        if limit is not None:
+            request["limit"] = limit
+        response = self.waitFor(("chat_history", chatID))
+        startTime = time.perf_counter()
+        await self.ws.send(json.dumps(request))
+        page = await asyncio.wait_for(response, self.test.timeout)
+        return time.perf_counter() - startTime, page
+
+    async def walkHistory(self, chatID, limit=None):
+        """Returns the time taken to load a chat's full history page by page, and the number of messages loaded."""
+        startTime = time.perf_counter()
+        _, page = await self.loadHistory(chatID, limit)
+        messageCount = len(page["previousMessages"])
+        cursor = page.get("nextCursor")
+        while cursor:
+            request = { "action": "chat_history", "chatID": chatID, "before": cursor }
+            if limit is not None:
+                request["limit"] = limit
+            response = self.waitFor(("older_messages", chatID, cursor))
+            await self.ws.send(json.dumps(request))
+            page = await asyncio.wait_for(response, self.test.timeout)
+            messageCount += len(page["previousMessages"])
+            cursor = page.get("nextCursor")
+        return time.perf_counter() - startTime, messageCount
+
+    async def sendMessage(self, chatID, text):
+        await self.ws.send(json.dumps({ "action": "send", "chatID": chatID, "message": text }))
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+
+class ChatLoadTest:
+    """
+    Opens many concurrent authenticated chat connections against a local WebSocket server, then runs rounds that each grow every conversation by `messagesPerRound` messages and measure history loading and message fan-out.
+
+    Connections are spread round-robin over the given accounts; an account with several connections receives every broadcast on each of them, as a user with several open tabs would.
+    """
+
+    def __init__(self, wsURL, users, connections, rampConcurrency=100, timeout=30, settle=1):
+        self.wsURL = wsURL
+        self.users = users
+        self.connectionCount = connections
+        self.rampConcurrency = rampConcurrency
+        self.timeout = timeout
+        self.settle = settle
+        self.connections = []
+        self.connectFailures = 0
+        self.sentAt = {}
+        self.fanOutLatencies = []
+        self.ownEchoLatencies = []
+
+    def messageReceived(self, connection, message, receivedAt):
+        text = message.get("message", "")
+        if not text.startswith("load:"):
+            return
+        sent = self.sentAt.get(text)
+        if sent is None:
+            return
+        sender, sentAt = sent
+        if connection is sender:
+            self.ownEchoLatencies.append(receivedAt - sentAt)
+        else:
+            self.fanOutLatencies.append(receivedAt - sentAt)
+
+    async def openConnections(self):
+        semaphore = asyncio.Semaphore(self.rampConcurrency)
+        users = itertools.cycle(self.users)
+
+        async def openOne(user):
+            async with semaphore:
+                connection = ChatLoadConnection(self, user)
+                try:
+                    connectTime = await connection.open()
+                    self.connections.append(connection)
+                    return connectTime
+                except Exception:
+                    self.connectFailures += 1
+                    await connection.close()
+                    return None
+
+        results = await asyncio.gather(*(openOne(next(users)) for _ in range(self.connectionCount)))
+        return [result for result in results if result is not None]
+
+    def senders(self):
+        """One sending connection per chat, so each chat grows by exactly the round's message count."""
+        senders = {}
+        for connection in self.connections:
+            for chatID in connection.chatIDs:
+                senders.setdefault(chatID, connection)
+        return senders
+
+    async def runRound(self, messagesPerRound, historyLimit, walkHistory):
+        senders = self.senders()
+        self.fanOutLatencies = []
+        self.ownEchoLatencies = []
+
+        async def sendAll(chatID, connection):
+            for _ in range(messagesPerRound):
+                text = "load:" + uuid.uuid4().hex
+                self.sentAt[text] = (connection, time.perf_counter())
+                await connection.sendMessage(chatID, text)
+
+        await asyncio.gather(*(sendAll(chatID, connection) for chatID, connection in senders.items()))
+        # Give broadcasts time to arrive before measuring history
+        await asyncio.sleep(self.settle)
+
+        async def timedHistory(chatID, connection):
+            try:
+                if walkHistory:
+                    latency, messageCount = await connection.walkHistory(chatID, historyLimit)
+                else:
+                    latency, page = await connection.loadHistory(chatID, historyLimit)
+                    messageCount = len(page["previousMessages"])
+                return latency, messageCount
+            except Exception:
+                return None
+
+        results = await asyncio.gather(*(timedHistory(chatID, connection) for chatID, connection in senders.items()))
+        historyLatencies = [result[0] for result in results if result is not None]
+        messageCounts = [result[1] for result in results if result is not None]
+        self.sentAt = {}
+
+        return {
+            "chats": len(senders),
+            "meanMessagesLoaded": round(sum(messageCounts) / len(messageCounts), 1) if messageCounts else 0,
+            "history": percentiles(historyLatencies),
+            "historyTimeouts": len(results) - len(historyLatencies),
+            "fanOut": percentiles(self.fanOutLatencies),
+            "ownEcho": percentiles(self.ownEchoLatencies)
+        }
+
+    async def run(self, rounds, messagesPerRound, historyLimit=None, walkHistory=False):
+        startTime = time.perf_counter()
+        connectTimes = await self.openConnections()
+        openSeconds = time.perf_counter() - startTime
+        report = {
+            "connections": {
+                "requested": self.connectionCount,
+                "opened": len(self.connections),
+                "failed": self.connectFailures,
+                "openSeconds": round(openSeconds, 2),
+                "connect": percentiles(connectTimes)
+            },
+            "rounds": []
+        }
+
+        try:
+            if len(self.senders()) == 0:
+                raise Exception("None of the connections have any chats. The accounts need reservations between them.")
+            for roundNumber in range(1, rounds + 1):
+                result = await self.runRound(messagesPerRound, historyLimit, walkHistory)
+                result["round"] = roundNumber
+                result["messagesSentPerChat"] = roundNumber * messagesPerRound
+                report["rounds"].append(result)
+                print("Round {}: {} chats, history p95 {}ms, fan-out p95 {}ms.".format(roundNumber, result["chats"], result["history"]["p95Ms"], result["fanOut"]["p95Ms"]))
+        finally:
+            report["serverErrors"] = sum(connection.errors for connection in self.connections)
+            await asyncio.gather(*(connection.close() for connection in self.connections))
+
+        return report
+
+def printReport(report):
+    connections = report["connections"]
+    print("Connections: {} of {} opened in {}s ({} failed).".format(connections["opened"], connections["requested"], connections["openSeconds"], connections["failed"]))
+    print("Connect time: p50 {}ms, p95 {}ms, p99 {}ms.".format(connections["connect"]["p50Ms"], connections["connect"]["p95Ms"], connections["connect"]["p99Ms"]))
+    print("Server error events: {}".format(report["serverErrors"]))
+    print()
+
+    rows = [{
+        "round": result["round"],
+        "sentPerChat": result["messagesSentPerChat"],
+        "loaded": result["meanMessagesLoaded"],
+        "historyP50Ms": result["history"]["p50Ms"],
+        "historyP95Ms": result["history"]["p95Ms"],
+        "historyP99Ms": result["history"]["p99Ms"],
+        "timeouts": result["historyTimeouts"],
+        "fanOutP50Ms": result["fanOut"]["p50Ms"],
+        "fanOutP95Ms": result["fanOut"]["p95Ms"],
+        "fanOutP99Ms": result["fanOut"]["p99Ms"]
+    } for result in report["rounds"]]
+    AnalyticsWarehouse.printTable(rows, ["round", "sentPerChat", "loaded", "historyP50Ms", "historyP95Ms", "historyP99Ms", "timeouts", "fanOutP50Ms", "fanOutP95Ms", "fanOutP99Ms"])
+
+def buildParser():
+    parser = argparse.ArgumentParser(
+        prog="superuserChatBenchmark.py",
+        description="Chat WebSocket load tester for a locally booted MakanMatch backend. The given accounts need reservations between them for chats to exist."
+    )
+    parser.add_argument("--url", default=os.environ.get("MM_SUPERUSER_URL", "http://localhost:8000"), help="Backend location used to log in (default: $MM_SUPERUSER_URL or http://localhost:8000)")
+    parser.add_argument("--ws-url", default=os.environ.get("MM_WS_URL", "ws://localhost:8080"), help="Chat WebSocket server (default: $MM_WS_URL or ws://localhost:8080)")
+    parser.add_argument("--login", action="append", default=[], metavar="USER:PASSWORD", help="Account to connect as (repeatable; default: $MM_BENCH_HOST and $MM_BENCH_GUEST, comma-separated)")
+    parser.add_argument("--connections", type=int, default=100, help="Concurrent connections to open (default: 100)")
+    parser.add_argument("--ramp", type=int, default=100, help="Connections opened at the same time while ramping up (default: 100)")
+    parser.add_argument("--rounds", type=int, default=5, help="Measurement rounds; each one grows every chat (default: 5)")
+    parser.add_argument("--messages", type=int, default=20, help="Messages added to each chat per round (default: 20)")
+    parser.add_argument("--limit", type=int, help="History page size to request (default: the server's)")
+    parser.add_argument("--walk", action="store_true", help="Load each chat's full history page by page instead of only the latest page")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for a response (default: 30)")
+    parser.add_argument("--settle", type=float, default=1, help="Seconds to wait for chat IDs after connecting and for broadcasts after sending (default: 1)")
+    parser.add_argument("--out", help="Write the full JSON report to this file")
+    return parser
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    baseURL = args.url.rstrip("/")
+    logins = args.login or [login for variable in ["MM_BENCH_HOST", "MM_BENCH_GUEST"] for login in os.environ.get(variable, "").split(",") if login]
+
+    session = requests.Session()
+    try:
+        websocketsModule()
+        if len(logins) == 0:
+            raise Exception("Provide at least one account with --login.")
+        users = [BenchmarkUser(session, baseURL, login).login() for login in logins]
+
+        print("Opening {} connections...".format(args.connections))
+        test = ChatLoadTest(args.ws_url, users, args.connections, args.ramp, args.timeout, args.settle)
+        report = asyncio.run(test.run(args.rounds, args.messages, args.limit, args.walk))
+        report["wsURL"] = args.ws_url
+        report["startedAt"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+        print()
+        printReport(report)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=4)
+        return 0
+    except Exception as e:
+        print("ERROR: " + str(e), file=sys.stderr)
+        return 1
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
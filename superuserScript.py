@@ -1,76 +1,631 @@
-import os, sys, json, datetime, requests, time
+import os, sys, json, datetime, requests, time, collections, mmap, re, shutil, bisect, csv, argparse, asyncio, sqlite3, random, threading, codecs
+from array import array
 from pprint import pprint
 from getpass import getpass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
-print("Welcome to the MakanMatch System Superuser Console.")
-print("With this script, easily manage admin accounts and operational settings of a MakanMatch Backend system.")
-print()
+class SuperuserAPIError(Exception):
+    """Raised when the superuser API rejects a call or returns an unexpected response. `response` holds the server's response, if one was received."""
 
-# Define the base URL of the Key Server
-baseURL = input("Enter MakanMatch system location (e.g. http://localhost:5000): ")
-if baseURL == "":
-    baseURL = "https://makanmatchb.prakhar.app"
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
 
-serverPath = lambda path: baseURL + path
+class RateLimitPacer:
+    """
+    Token buckets that pace requests to stay just under the server's rate limits, safe to share between threads.
 
-headers = {
-    "Content-Type": "application/json"
-}
-serverKey = None
+    The server applies separate limits to `/cdn`, `/makanBot` and all other routes, and reports the limit that applied to each response in its `RateLimit-Policy`, `RateLimit-Limit`, `RateLimit-Remaining` and `RateLimit-Reset` headers.
+    Each limit gets a bucket refilled at `headroom` of the advertised rate, created from the first response that reports it; until then requests are not paced.
+    When the server reports the window's quota used up, or rejects a request with 429 and `Retry-After`, the bucket is held empty until the window resets.
+    """
 
-# Check connection to the MakanMatch System
-print()
-print("Checking connection to server...")
-try:
-    healthCheck = requests.get(serverPath("/admin/super"))
+    headroom = 0.95
+    burstFraction = 0.05
 
-    healthCheck.raise_for_status()
-    if not healthCheck.text.startswith("SUCCESS"):
-        print("ERROR: MakanMatch Superuser API is not healthy.")
-        sys.exit(1)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
 
-    print("Connection successful!")
-except Exception as e:
-    print("ERROR: Could not connect to MakanMatch system. Error: " + str(e))
-    sys.exit(1)
+    @staticmethod
+    def limiterFor(path):
+        # Mirrors the conditional rate limiter in index.js
+        if path.startswith("/cdn"):
+            return "cdn"
+        elif path.startswith("/makanBot"):
+            return "gpt"
+        return "standard"
 
-# Authenticate using server admin credentials
-print()
-serverKey = input("Enter superuser access key: ")
-while True:
-    print()
-    print("Authorising...")
-    headers["AccessKey"] = serverKey
-    authResponse = None
-    try:
-        authResponse = requests.post(
-            url=serverPath("/admin/super/authenticate"),
-            headers=headers
+    @staticmethod
+    def headerNumber(response, name):
+        try:
+            return float(response.headers.get(name))
+        except (TypeError, ValueError):
+            return None
+
+    def acquire(self, limiter):
+        """Blocks until a request may be sent under the given limiter."""
+        while True:
+            with self.lock:
+                bucket = self.buckets.get(limiter)
+                if bucket is None:
+                    return
+                now = time.monotonic()
+                if now < bucket["blockedUntil"]:
+                    wait = bucket["blockedUntil"] - now
+                else:
+                    bucket["tokens"] = min(bucket["capacity"], bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+                    bucket["updated"] = now
+                    if bucket["tokens"] >= 1:
+                        bucket["tokens"] -= 1
+                        return
+                    wait = (1 - bucket["tokens"]) / bucket["rate"]
+            time.sleep(wait)
+
+    def observe(self, limiter, response):
+        """Updates the limiter's bucket from the rate limit headers of a response."""
+        limit = RateLimitPacer.headerNumber(response, "RateLimit-Limit")
+        remaining = RateLimitPacer.headerNumber(response, "RateLimit-Remaining")
+        reset = RateLimitPacer.headerNumber(response, "RateLimit-Reset")
+        retryAfter = RateLimitPacer.headerNumber(response, "Retry-After")
+
+        window = None
+        policy = re.search(r"w=(\d+)", response.headers.get("RateLimit-Policy") or "")
+        if policy:
+            window = float(policy.group(1))
+
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.buckets.get(limiter)
+            if bucket is None:
+                if limit is None or not window:
+                    return
+                # Starts full; capped to the burst capacity and the server's remaining quota below
+                bucket = { "blockedUntil": 0.0, "updated": now, "tokens": float("inf") }
+                self.buckets[limiter] = bucket
+            if limit is not None and window:
+                bucket["rate"] = limit * RateLimitPacer.headroom / window
+                bucket["capacity"] = max(1.0, limit * RateLimitPacer.burstFraction)
+                bucket["tokens"] = min(bucket["tokens"], bucket["capacity"])
+
+            # Other clients may be drawing on the same quota, so never hold more tokens than the server has left
+            if remaining is not None:
+                bucket["tokens"] = min(bucket["tokens"], remaining)
+                if remaining < 1 and reset is not None:
+                    bucket["blockedUntil"] = max(bucket["blockedUntil"], now + reset)
+            if response.status_code == 429:
+                bucket["tokens"] = 0.0
+                bucket["blockedUntil"] = max(bucket["blockedUntil"], now + (retryAfter if retryAfter is not None else (reset or 1)))
+
+class StreamingJSON:
+    """
+    Incremental parser for large JSON bodies, fed with chunks of bytes as they arrive (e.g. `response.iter_content()`, which also undoes gzip or Brotli compression on the fly).
+
+    Iterating yields `(path, value)` events instead of building the whole document. Values at the paths listed in `streamPaths` are not built: an array there yields one event per element under its own path, and an object yields one event per member under the path extended with the member's key. Everything else is decoded whole.
+    Only the unconsumed part of the body is kept, so memory use is bounded by the largest single item rather than the size of the body.
+    """
+
+    chunkSize = 65536
+    whitespace = " \t\n\r"
+    delimiters = ",]}" + whitespace
+
+    def __init__(self, chunks, streamPaths=[()]):
+        self.chunks = iter(chunks)
+        self.streamPaths = set(tuple(path) for path in streamPaths)
+        self.textDecoder = codecs.getincrementaldecoder("utf-8")()
+        self.jsonDecoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.exhausted = False
+
+    def fill(self):
+        """Appends the next chunk to the buffer, dropping what has been consumed. Returns False once the body is exhausted."""
+        if self.exhausted:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            text = self.textDecoder.decode(b"", final=True)
+        else:
+            text = self.textDecoder.decode(chunk)
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character without consuming it, or None at the end of the body."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in StreamingJSON.whitespace:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return None
+
+    def expect(self, characters):
+        character = self.peek()
+        if character is None or character not in characters:
+            raise ValueError("Invalid JSON body: expected one of '{}' but found {}.".format(characters, repr(character) if character else "the end of the body"))
+        self.position += 1
+        return character
+
+    def decodeValue(self):
+        if self.peek() is None:
+            raise ValueError("Invalid JSON body: unexpected end of the body.")
+        while True:
+            try:
+                value, end = self.jsonDecoder.raw_decode(self.buffer, self.position)
+                # A number may continue in the next chunk (e.g. "2." then "5"), so it is only complete once a delimiter follows it
+                isNumber = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if self.exhausted or (end < len(self.buffer) and (not isNumber or self.buffer[end] in StreamingJSON.delimiters)):
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            pending = len(self.buffer) - self.position
+            # Read ahead at least as much again as is buffered, so a large value is not re-scanned once per chunk
+            while len(self.buffer) - self.position < 2 * pending and self.fill():
+                pass
+
+    def events(self, path=()):
+        if path not in self.streamPaths or self.peek() not in ["[", "{"]:
+            yield path, self.decodeValue()
+            return
+
+        if self.expect("[{") == "[":
+            if self.peek() == "]":
+                self.position += 1
+                return
+            while True:
+                yield path, self.decodeValue()
+                if self.expect(",]") == "]":
+                    return
+        else:
+            if self.peek() == "}":
+                self.position += 1
+                return
+            while True:
+                key = self.decodeValue()
+                if not isinstance(key, str):
+                    raise ValueError("Invalid JSON body: object key expected.")
+                self.expect(":")
+                yield from self.events(path + (key,))
+                if self.expect(",}") == "}":
+                    return
+
+    def __iter__(self):
+        yield from self.events()
+        if self.peek() is not None:
+            raise ValueError("Invalid JSON body: unexpected data after the end of the document.")
+
+class SuperuserClient:
+    """
+    Reusable client for the MakanMatch superuser API.
+
+    Holds one `requests.Session` (keep-alive, connection pooling) together with the auth headers and connect/read timeouts, so repeated calls re-use the same TCP/TLS connection instead of handshaking every time.
+    No network calls are made until an API method is called. API methods raise `SuperuserAPIError` on failure.
+
+    Every request goes through `request`, which paces itself with a `RateLimitPacer` and retries transient failures with jittered exponential backoff, up to `maxRetries` times:
+    - 429 responses are retried for every call except the destructive ones in `destructivePaths`, since the server rejects them before doing any work.
+    - 5xx responses and connection errors are only retried for idempotent calls (GET requests, or calls made with `idempotent=True`).
+    Calls to `destructivePaths` are never retried automatically.
+
+    Responses are requested compressed (gzip, or Brotli when the `brotli` package is installed). Large exports are read with `stream=True` and decompressed and parsed as they arrive (see `StreamingJSON` and `download`) rather than held in memory whole.
+    """
+
+    defaultBaseURL = "https://makanmatchb.prakhar.app"
+    defaultConnectTimeout = 5
+    defaultReadTimeout = 60
+    defaultPoolSize = 10
+    defaultMaxRetries = 4
+    backoffBase = 0.5
+    backoffCap = 30
+    retryStatuses = [500, 502, 503, 504]
+    destructivePaths = ["/admin/super/clearFM", "/admin/super/softReset", "/admin/super/presentationTransform"]
+
+    def __init__(self, baseURL, accessKey=None, connectTimeout=None, readTimeout=None, poolSize=None, maxRetries=None):
+        self.baseURL = baseURL.rstrip("/")
+        self.timeout = (
+            connectTimeout if connectTimeout is not None else SuperuserClient.defaultConnectTimeout,
+            readTimeout if readTimeout is not None else SuperuserClient.defaultReadTimeout
         )
 
-        authResponse.raise_for_status()
-        if authResponse.text.startswith("ERROR"):
-            raise Exception(authResponse.text[len("ERROR: "):])
-        if not authResponse.text.startswith("SUCCESS"):
-            raise Exception("Unknown response received: " + authResponse.text)
-        
-        print("Authorised successfully!")
-        break
-    except Exception as e:
-        del headers["AccessKey"]
-        print("Error occurred in authenticating with server. Error: " + str(e))
+        self.maxRetries = maxRetries if maxRetries is not None else SuperuserClient.defaultMaxRetries
+        self.pacer = RateLimitPacer()
+
+        poolSize = poolSize or SuperuserClient.defaultPoolSize
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json"
+        })
+
+        if accessKey:
+            self.setAccessKey(accessKey)
+
+    @staticmethod
+    def fromEnvironment(baseURL=None, accessKey=None, connectTimeout=None, readTimeout=None):
+        """Builds a client from explicit values, falling back to MM_SUPERUSER_URL, MM_SUPERUSER_KEY, MM_CONNECT_TIMEOUT, MM_READ_TIMEOUT and MM_MAX_RETRIES."""
+        return SuperuserClient(
+            baseURL or os.environ.get("MM_SUPERUSER_URL") or SuperuserClient.defaultBaseURL,
+            accessKey=accessKey or os.environ.get("MM_SUPERUSER_KEY"),
+            connectTimeout=connectTimeout if connectTimeout is not None else float(os.environ.get("MM_CONNECT_TIMEOUT", SuperuserClient.defaultConnectTimeout)),
+            readTimeout=readTimeout if readTimeout is not None else float(os.environ.get("MM_READ_TIMEOUT", SuperuserClient.defaultReadTimeout)),
+            maxRetries=int(os.environ.get("MM_MAX_RETRIES", SuperuserClient.defaultMaxRetries))
+        )
+
+    def serverPath(self, path):
+        return self.baseURL + path
+
+    def setAccessKey(self, accessKey):
+        self.session.headers["AccessKey"] = accessKey
+
+    def clearAccessKey(self):
+        self.session.headers.pop("AccessKey", None)
+
+    def backoff(self, attempt):
+        # Full jitter: a random delay up to the exponential backoff, so concurrent callers do not retry in lockstep
+        return random.uniform(0, min(SuperuserClient.backoffCap, SuperuserClient.backoffBase * (2 ** attempt)))
+
+    def request(self, method, path, idempotent=None, **kwargs):
+        """Sends a request, paced under the server's rate limits and retried as described in the class documentation. Returns the final response."""
+        kwargs.setdefault("timeout", self.timeout)
+        if idempotent is None:
+            idempotent = method in ["GET", "HEAD", "OPTIONS"]
+        retryable = path not in SuperuserClient.destructivePaths
+        limiter = RateLimitPacer.limiterFor(path)
+
+        attempt = 0
+        while True:
+            self.pacer.acquire(limiter)
+            try:
+                response = self.session.request(method, self.serverPath(path), **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not (retryable and idempotent) or attempt >= self.maxRetries:
+                    raise
+            else:
+                self.pacer.observe(limiter, response)
+                if response.status_code == 429:
+                    shouldRetry = retryable
+                elif response.status_code in SuperuserClient.retryStatuses:
+                    shouldRetry = retryable and idempotent
+                else:
+                    return response
+                if not shouldRetry or attempt >= self.maxRetries:
+                    return response
+                response.close()
+
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def streamJSON(self, response, streamPaths=[()]):
+        """Returns an iterator parsing the JSON body of a response requested with `stream=True` incrementally into `StreamingJSON` events. Error responses raise straight away."""
+        if not response.ok:
+            with response:
+                self.checkResponse(response, expectSuccess=False)
+        return self.jsonEvents(response, streamPaths)
+
+    def jsonEvents(self, response, streamPaths):
+        with response:
+            try:
+                yield from StreamingJSON(response.iter_content(StreamingJSON.chunkSize), streamPaths)
+            except ValueError as e:
+                raise SuperuserAPIError("Invalid response received: {}".format(e), response)
+
+    def download(self, response, outPath):
+        """Writes the body of a response requested with `stream=True` to `outPath` as it arrives. Returns the number of bytes written."""
+        with response:
+            if not response.ok:
+                self.checkResponse(response, expectSuccess=False)
+            written = 0
+            try:
+                with open(outPath, "wb") as f:
+                    for chunk in response.iter_content(StreamingJSON.chunkSize):
+                        f.write(chunk)
+                        written += len(chunk)
+            except Exception:
+                if os.path.exists(outPath):
+                    os.remove(outPath)
+                raise
+        return written
+
+    @staticmethod
+    def checkResponse(response, expectSuccess=True):
+        """Raises `SuperuserAPIError` for error responses. Returns the response text."""
+        text = response.text
+        if text.startswith("ERROR"):
+            raise SuperuserAPIError(text[len("ERROR: "):], response)
+        elif text.startswith("UERROR"):
+            raise SuperuserAPIError(text[len("UERROR: "):], response)
+        if not response.ok:
+            raise SuperuserAPIError("{} {}. Server response: {}".format(response.status_code, response.reason, text or "<No response>"), response)
+        if expectSuccess and not text.startswith("SUCCESS"):
+            raise SuperuserAPIError("Unknown response received: " + text, response)
+        return text
+
+    def healthCheck(self):
+        response = self.get("/admin/super")
+        return self.checkResponse(response)
+
+    def authenticate(self):
+        response = self.post("/admin/super/authenticate", idempotent=True)
+        return self.checkResponse(response)
+
+    def accountInfo(self, userID=None, username=None, email=None):
+        data = {}
+        if userID:
+            data["userID"] = userID
+        elif username:
+            data["username"] = username
+        elif email:
+            data["email"] = email
+
+        response = self.post("/admin/super/accountInfo", json=data, idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def bulkAccountInfo(self, identifiers):
+        response = self.post("/admin/super/bulkAccountInfo", json={ "identifiers": identifiers }, idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def createAdmin(self, username, fname, lname, email, password, role):
+        response = self.post(
+            "/admin/super/createAdmin",
+            json={
+                "username": username,
+                "fname": fname,
+                "lname": lname,
+                "email": email,
+                "password": password,
+                "role": role
+            }
+        )
+        return self.checkResponse(response)
+
+    def deleteAdmin(self, userID=None, username=None, email=None):
+        data = {}
+        if userID:
+            data["userID"] = userID
+        elif username:
+            data["username"] = username
+        elif email:
+            data["email"] = email
+
+        response = self.post("/admin/super/deleteAdmin", json=data)
+        return self.checkResponse(response)
+
+    def getAnalytics(self):
+        response = self.post("/admin/super/getAnalytics", idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def streamAnalyticsChanges(self, since=None, until=None, limit=None, cursor=None):
+        """
+        Requests one page of listing and request metrics updated since the `since` watermark (all rows if None). Pass the `until` and `nextCursor` of the first page to fetch the following pages.
+
+        Returns a `StreamingJSON` event iterator over the page: `(("listingMetrics",), row)` and `(("requestMetrics",), row)` for every row as it arrives, and `((key,), value)` for the other members of the page.
+        """
+        data = { "since": since }
+        if until is not None:
+            data["until"] = until
+        if limit is not None:
+            data["limit"] = limit
+        if cursor is not None:
+            data["cursor"] = cursor
+
+        response = self.post("/admin/super/getAnalytics", json=data, stream=True, idempotent=True)
+        return self.streamJSON(response, [(), ("listingMetrics",), ("requestMetrics",)])
+
+    def downloadAnalytics(self, outPath):
+        """Saves all collected analytics to `outPath` as they arrive. Returns the number of bytes written."""
+        response = self.post("/admin/super/getAnalytics", stream=True, idempotent=True)
+        return self.download(response, outPath)
+
+    def analyticsHealth(self):
+        response = self.post("/admin/super/analyticsHealth", idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def emailQueueStats(self):
+        """Returns the server's email queue stats: queue depth, emails sent in the last minute, and sent, failed, retried and refused emails since boot."""
+        response = self.post("/admin/super/emailQueue", idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def userRecordCacheStats(self):
+        """Returns the server's user record cache stats: hits, misses, evictions and invalidations since boot, with its size and settings."""
+        response = self.post("/admin/super/userRecordCache", idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def flushUserRecordCache(self):
+        """Drops everything in the server's user record cache. Returns the number of records dropped."""
+        response = self.post("/admin/super/flushUserRecordCache", idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()["dropped"]
+
+    def runtimeStats(self):
+        """Returns the server process's runtime stats. Windowed readings (event-loop delay, CPU, GC) cover the time since the previous call."""
+        response = self.post("/admin/super/runtimeStats", idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def getFileManagerContext(self):
+        response = self.get("/admin/super/getFileManagerContext")
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def streamFileManagerContextChanges(self, since=None):
+        """
+        Requests the FileManager context entries changed after the `since` version, or the full context when `since` is None or can no longer be served. Returns None if nothing changed.
+
+        Otherwise returns an iterator of `(kind, value)` events as the response arrives: `("version", version)` and `("full", isFull)` first, then `("changed", (name, entry))` for every changed entry (every entry for a full context) and `("deleted", name)` for every removed one.
+        """
+        headers = {}
+        params = {}
+        if since is not None:
+            headers["If-None-Match"] = '"{}"'.format(since)
+            params["since"] = since
+
+        response = self.get("/admin/super/getFileManagerContext", params=params, headers=headers, stream=True)
+        if response.status_code == 304:
+            response.close()
+            return None
+        if since is None:
+            # Full context responses are the bare context, versioned by the ETag
+            return self.fileManagerContextEvents(self.streamJSON(response), bare=True, version=response.headers.get("ETag", "").strip('"') or None)
+        return self.fileManagerContextEvents(self.streamJSON(response, [(), ("context",), ("changed",), ("deleted",)]), bare=False)
+
+    @staticmethod
+    def fileManagerContextEvents(events, bare, version=None):
+        if bare:
+            yield "version", version
+            yield "full", True
+            for path, entry in events:
+                yield "changed", (path[0], entry)
+            return
+
+        for path, value in events:
+            if path[0] in ["context", "changed"]:
+                yield "changed", (path[1], value)
+            else:
+                yield path[0], value
+
+    def toggleAnalytics(self, newStatus=None):
+        response = self.post("/admin/super/toggleAnalytics", json={ "newStatus": newStatus }, idempotent=newStatus is not None)
+        return self.checkResponse(response)
+
+    def toggleMakanBot(self, newStatus=None):
+        response = self.post("/admin/super/toggleMakanBot", json={ "newStatus": newStatus }, idempotent=newStatus is not None)
+        return self.checkResponse(response)
+
+    def toggleUsageLock(self, newStatus=None):
+        response = self.post("/admin/super/toggleUsageLock", json={ "newStatus": newStatus }, idempotent=newStatus is not None)
+        return self.checkResponse(response)
+
+    def toggleSuperuserSensitive(self):
+        response = self.post("/admin/super/toggleSuperuserSensitive")
+        return self.checkResponse(response)
+
+    def cacheState(self):
+        """Returns the whole runtime cache as `{version, persistedVersion, flushPending, data}`."""
+        response = self.post("/admin/super/cacheState", idempotent=True)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def updateToggles(self, toggles, expectedVersion=None):
+        """Sets several runtime toggles (cache keys to booleans) in one change. If `expectedVersion` is given, the update is rejected when the cache has changed since. Returns the new cache state."""
+        data = { "toggles": toggles }
+        if expectedVersion is not None:
+            data["expectedVersion"] = expectedVersion
+        # Setting explicit values is idempotent, but a repeat of a versioned update would be rejected as a conflict
+        response = self.post("/admin/super/updateToggles", json=data, idempotent=expectedVersion is None)
+        self.checkResponse(response, expectSuccess=False)
+        return response.json()
+
+    def clearFM(self):
+        response = self.post("/admin/super/clearFM")
+        return self.checkResponse(response)
+
+    def resetProgress(self, path, onProgress=None, body=None):
+        """
+        Calls a database reset (or dataset generation) endpoint in streamed mode, passing each NDJSON progress event to `onProgress` as it arrives. Returns the list of events received.
+
+        Raises `SuperuserAPIError` if the server reports an error; a failed reset is rolled back as a whole.
+        """
+        response = self.post(path, json=dict(body or {}, stream=True), stream=True)
+        events = []
+        with response:
+            if not response.ok:
+                self.checkResponse(response, expectSuccess=False)
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                events.append(event)
+                if onProgress:
+                    onProgress(event)
+                if event.get("event") == "error":
+                    raise SuperuserAPIError(event["error"], response)
+        return events
+
+    @staticmethod
+    def resetSummary(events):
+        summary = next((event for event in events if event.get("event") == "reset"), None)
+        if summary is None:
+            raise SuperuserAPIError("Connection ended before the database reset was confirmed. Please run checks.")
+        return {
+            "rows": summary["rows"],
+            "durationMs": summary["durationMs"],
+            "tables": [{ "table": event["table"], "rows": event["rows"], "durationMs": event["durationMs"] } for event in events if event.get("event") == "table"]
+        }
+
+    def softReset(self, onProgress=None):
+        """Clears every table of the system database in one transaction. Returns the rows cleared and timings per table."""
+        return self.resetSummary(self.resetProgress("/admin/super/softReset", onProgress))
+
+    def presentationTransform(self, onProgress=None):
+        """Soft resets the system database and fills it with presentation data. Returns the server's messages describing the data created."""
+        events = self.resetProgress("/admin/super/presentationTransform", onProgress)
+        self.resetSummary(events)
+        presentation = next((event for event in events if event.get("event") == "presentation"), None)
+        if presentation is None:
+            raise SuperuserAPIError("Connection ended before the presentation data was confirmed. Please run checks.")
+        return presentation["messages"]
+
+    def generateDataset(self, parameters=None, onProgress=None):
+        """
+        Fills the system database with a reproducible synthetic dataset. `parameters` (seed, row counts, skew, batchSize, password, reset) default on the server when left out.
+
+        Returns the server's load summary (rows, duration, throughput and sample logins) with the rows loaded per table.
+        """
+        events = self.resetProgress("/admin/super/generateDataset", onProgress, { "parameters": parameters or {} })
+        if (parameters or {}).get("reset"):
+            self.resetSummary(events)
+        generated = next((event for event in events if event.get("event") == "generated"), None)
+        if generated is None:
+            raise SuperuserAPIError("Connection ended before the generated dataset was confirmed. Please run checks.")
+
+        summary = { key: value for key, value in generated.items() if key not in ("event", "success") }
+        summary["tables"] = [{ "table": event["table"], "rows": event["rows"], "durationMs": event["durationMs"], "rowsPerSecond": event["rowsPerSecond"] } for event in events if event.get("event") == "table" and "rowsPerSecond" in event]
+        return summary
+
+# Set by runConsole (interactive) or SuperuserCLI.main (non-interactive) before any function below is called
+client = None
+
+def consoleCall(progressMessage, errorDescription, abortMessage, call):
+    """
+    Runs `call()` for an interactive console action and returns its result, or None if the user gave up.
+
+    The client already paces requests and retries transient failures on its own; an error reaching this point is shown and the user may try again.
+    """
+    print(progressMessage)
+    while True:
         try:
-            print("Server response: " + authResponse.text)
-        except:
-            print("Server response: <No response>")
-        retry = input("Retry? (y/n): ").lower()
-        if retry != "y":
-            sys.exit(1)
-        print()
-        serverKey = input("Enter superuser access key: ")
-        continue
+            return call()
+        except Exception as e:
+            print("Error occurred in {}. Error: {}".format(errorDescription, e))
+            retry = input("Retry? (y/n): ").lower()
+            print()
+            if retry != "y":
+                print(abortMessage)
+                return None
+            print(progressMessage)
 
-# Start main functions
 def retrieveAccountInfo():
     print()
     identifierType = input("Enter identifier type (ID/username/email): ").strip().lower()
@@ -92,43 +647,180 @@ def retrieveAccountInfo():
             data["email"] = input("Email cannot be empty. Please enter an email: ").strip()
     
     print()
-    print("Retrieving account information...")
-    retrieveResponse = None
-    while True:
-        try:
-            retrieveResponse = requests.post(
-                url=serverPath("/admin/super/accountInfo"),
-                headers=headers,
-                json=data
-            )
+    responseJSON = consoleCall("Retrieving account information...", "retrieving account information", "Retrieve account information aborted.", lambda: client.accountInfo(**data))
+    if responseJSON is None:
+        return
 
-            retrieveResponse.raise_for_status()
-            if retrieveResponse.text.startswith("ERROR"):
-                raise Exception(retrieveResponse.text[len("ERROR: "):])
-            elif retrieveResponse.text.startswith("UERROR"):
-                raise Exception(retrieveResponse.text[len("UERROR: "):])
-            
-            print("Account information retrieved successfully!")
-            print()
-            
-            responseJSON = json.loads(retrieveResponse.text)
-            print("Retrieved information:")
-            for key in responseJSON:
-                print("\t{}: {}".format(key, responseJSON[key]))
-            break
-        except Exception as e:
-            print("Error occurred in retrieving account information. Error: " + str(e))
-            try:
-                print("Server response: " + retrieveResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Retrieve account information aborted.")
-                break
-            print("Retrieving account information...")
+    print("Account information retrieved successfully!")
+    print()
+    print("Retrieved information:")
+    for key in responseJSON:
+        print("\t{}: {}".format(key, responseJSON[key]))
+
+
+class BatchAccountLookup:
+    """
+    Non-interactive account lookups for identifiers read from a file.
+
+    Identifiers are sent in chunks to `/admin/super/bulkAccountInfo` (three `IN (...)` queries per chunk on the server) by a bounded pool of worker threads sharing the pooled client.
+    Results are streamed to a `.jsonl` or `.csv` file as each chunk completes.
+    """
+
+    defaultWorkers = 8
+    chunkSize = 100
+    identifierTypes = {
+        "id": "userID",
+        "userid": "userID",
+        "username": "username",
+        "email": "email"
+    }
+    uuidPattern = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+    csvColumns = ["identifierType", "identifier", "found", "userID", "username", "email", "fname", "lname", "latencyMs"]
+
+    @staticmethod
+    def inferType(identifier):
+        if "@" in identifier:
+            return "email"
+        elif BatchAccountLookup.uuidPattern.match(identifier):
+            return "userID"
+        return "username"
+
+    @staticmethod
+    def readIdentifiers(filePath):
+        """Reads `identifier[,type]` rows. The type (ID/username/email) is inferred when the second column is absent; a header row is skipped."""
+        identifiers = []
+        with open(filePath, "r", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) == 0 or row[0].strip() == "":
+                    continue
+
+                value = row[0].strip()
+                identifierType = row[1].strip().lower() if len(row) > 1 and row[1].strip() != "" else None
+                if identifierType in ["type", "identifiertype"] or (identifierType is None and value.lower() == "identifier"):
+                    continue
+                if identifierType is None:
+                    identifierType = BatchAccountLookup.inferType(value)
+                elif identifierType in BatchAccountLookup.identifierTypes:
+                    identifierType = BatchAccountLookup.identifierTypes[identifierType]
+                else:
+                    raise Exception("Invalid identifier type '{}' for identifier '{}'.".format(row[1], value))
+
+                identifiers.append({ "type": identifierType, "value": value })
+        return identifiers
+
+    @staticmethod
+    def lookupChunk(client, chunk):
+        startTime = time.perf_counter()
+        results = client.bulkAccountInfo(chunk)
+        return results, time.perf_counter() - startTime
+
+    @staticmethod
+    def writeResult(f, writer, result, latency):
+        account = result["account"] or {}
+        if writer is None:
+            f.write(json.dumps({
+                "identifierType": result["identifierType"],
+                "identifier": result["identifier"],
+                "found": result["account"] is not None,
+                "account": result["account"],
+                "latencyMs": round(latency * 1000, 2)
+            }) + "\n")
+        else:
+            writer.writerow({
+                "identifierType": result["identifierType"],
+                "identifier": result["identifier"],
+                "found": result["account"] is not None,
+                "userID": account.get("userID", ""),
+                "username": account.get("username", ""),
+                "email": account.get("email", ""),
+                "fname": account.get("fname", ""),
+                "lname": account.get("lname", ""),
+                "latencyMs": round(latency * 1000, 2)
+            })
+
+    @staticmethod
+    def run(client, identifiers, outputPath, workers=None):
+        """Looks up all identifiers concurrently, streaming results to `outputPath`. Returns a summary dictionary."""
+        workers = workers or BatchAccountLookup.defaultWorkers
+        chunks = [identifiers[i:i + BatchAccountLookup.chunkSize] for i in range(0, len(identifiers), BatchAccountLookup.chunkSize)]
+
+        latencies = []
+        found = 0
+        failedChunks = 0
+        startTime = time.perf_counter()
+        with open(outputPath, "w", newline="") as f, ThreadPoolExecutor(max_workers=workers) as executor:
+            writer = None
+            if outputPath.lower().endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=BatchAccountLookup.csvColumns)
+                writer.writeheader()
+
+            futures = { executor.submit(BatchAccountLookup.lookupChunk, client, chunk): chunk for chunk in chunks }
+            for future in as_completed(futures):
+                try:
+                    results, latency = future.result()
+                except Exception as e:
+                    failedChunks += 1
+                    print("Failed to look up {} identifiers (first: '{}'). Error: {}".format(len(futures[future]), futures[future][0]["value"], e))
+                    continue
+
+                latencies.append(latency)
+                for result in results:
+                    if result["account"] is not None:
+                        found += 1
+                    BatchAccountLookup.writeResult(f, writer, result, latency)
+                f.flush()
+
+        elapsed = time.perf_counter() - startTime
+        latencies.sort()
+        percentile = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0
+        return {
+            "identifiers": len(identifiers),
+            "found": found,
+            "requests": len(chunks),
+            "failedRequests": failedChunks,
+            "elapsedSeconds": round(elapsed, 3),
+            "throughputPerSecond": round(len(identifiers) / elapsed, 2) if elapsed > 0 else 0,
+            "latencyMs": {
+                "p50": round(percentile(0.5), 2),
+                "p95": round(percentile(0.95), 2),
+                "max": round(latencies[-1] * 1000, 2) if latencies else 0
+            }
+        }
+
+def batchAccountLookup():
+    print()
+    inputPath = input("Enter path to identifiers file (one identifier per row; optional second column ID/username/email): ").strip()
+    while not os.path.isfile(inputPath):
+        inputPath = input("File not found. Please re-enter path to identifiers file: ").strip()
+
+    outputPath = input("Enter output file path (.jsonl or .csv, default MakanMatchAccounts.jsonl): ").strip()
+    if outputPath == "":
+        outputPath = "MakanMatchAccounts.jsonl"
+
+    workers = input("Enter number of concurrent workers (default {}): ".format(BatchAccountLookup.defaultWorkers)).strip()
+    while workers != "" and (not workers.isdigit() or int(workers) <= 0):
+        workers = input("Invalid number. Enter number of concurrent workers: ").strip()
+    workers = int(workers) if workers != "" else None
+
+    try:
+        identifiers = BatchAccountLookup.readIdentifiers(inputPath)
+    except Exception as e:
+        print("Failed to read identifiers. Error: " + str(e))
+        return
+    if len(identifiers) == 0:
+        print("No identifiers found in file.")
+        return
+
+    print()
+    print("Looking up {} identifiers...".format(len(identifiers)))
+    summary = BatchAccountLookup.run(client, identifiers, outputPath, workers)
 
+    print()
+    print("Batch lookup complete! Results saved to {}.".format(outputPath))
+    print("\tAccounts found: {}/{}".format(summary["found"], summary["identifiers"]))
+    print("\tRequests: {} ({} failed)".format(summary["requests"], summary["failedRequests"]))
+    print("\tElapsed: {}s, throughput: {} lookups/s".format(summary["elapsedSeconds"], summary["throughputPerSecond"]))
+    print("\tRequest latency: p50 {}ms, p95 {}ms, max {}ms".format(summary["latencyMs"]["p50"], summary["latencyMs"]["p95"], summary["latencyMs"]["max"]))
 
 def createAdmin():
     print()
@@ -161,45 +853,8 @@ def createAdmin():
         role = input("Role cannot be empty. Please enter a role: ").strip()
 
     print()
-    print("Creating admin account...")
-    createResponse = None
-    while True:
-        try:
-            createResponse = requests.post(
-                url=serverPath("/admin/super/createAdmin"),
-                headers=headers,
-                json={
-                    "username": username,
-                    "fname": fname,
-                    "lname": lname,
-                    "email": email,
-                    "password": password,
-                    "role": role
-                }
-            )
-
-            createResponse.raise_for_status()
-            if createResponse.text.startswith("ERROR"):
-                raise Exception(createResponse.text[len("ERROR: "):])
-            elif createResponse.text.startswith("UERROR"):
-                raise Exception(createResponse.text[len("UERROR: "):])
-            if not createResponse.text.startswith("SUCCESS"):
-                raise Exception("Unknown response received: " + createResponse.text)
-            
-            print("Admin account created successfully! Username: '{}', Password: '{}'.".format(username, password))
-            break
-        except Exception as e:
-            print("Error occurred in creating admin account. Error: " + str(e))
-            try:
-                print("Server response: " + createResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Create account aborted.")
-                break
-            print("Creating admin account...")
+    if consoleCall("Creating admin account...", "creating admin account", "Create account aborted.", lambda: client.createAdmin(username, fname, lname, email, password, role)) is not None:
+        print("Admin account created successfully! Username: '{}', Password: '{}'.".format(username, password))
 
 def deleteAdmin():
     print()
@@ -222,187 +877,447 @@ def deleteAdmin():
             data["email"] = input("Email cannot be empty. Please enter an email: ").strip()
     
     print()
-    print("Deleting admin account...")
-    deleteResponse = None
-    while True:
+    if consoleCall("Deleting admin account...", "deleting admin account", "Delete account aborted.", lambda: client.deleteAdmin(**data)) is not None:
+        print("Admin account deleted successfully!")
+            
+class AnalyticsStore:
+    """
+    Local SQLite store of analytics pulled incrementally from `/admin/super/getAnalytics`.
+
+    Each pull sends the `until` watermark of the previous pull as `since`, so only listing and request metrics rows updated since then are transferred (paged by the server).
+    Changed rows are written in batches as each page streams in, upserted into `listingMetrics`/`requestMetrics`, which hold the latest value of every row, and appended to `listingMetricsHistory`/`requestMetricsHistory` together with the pull they arrived in. `systemMetricsHistory` gets one row per pull.
+    Columns are added as new metrics appear. If the row counts reported by the server disagree with the local tables (e.g. metrics were reset), the latest tables are rebuilt from a full pull.
+    """
+
+    defaultPath = "MakanMatchAnalytics.db"
+    pageSize = 1000
+    batchSize = 500
+    tables = {
+        "listingMetrics": ["listingID"],
+        "requestMetrics": ["requestURL", "method"]
+    }
+    identifierPattern = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+    @staticmethod
+    def connect(path=None):
+        connection = sqlite3.connect(path or AnalyticsStore.defaultPath)
+        connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS pulls (pullID INTEGER PRIMARY KEY AUTOINCREMENT, pulledAt TEXT, since TEXT, until TEXT, listingRows INTEGER, requestRows INTEGER, resynced INTEGER)")
+        for table, keyColumns in AnalyticsStore.tables.items():
+            connection.execute("CREATE TABLE IF NOT EXISTS {} ({}, updatedAt TEXT, PRIMARY KEY ({}))".format(table, ", ".join(column + " TEXT" for column in keyColumns), ", ".join(keyColumns)))
+            connection.execute("CREATE TABLE IF NOT EXISTS {}History (pullID INTEGER, {}, updatedAt TEXT)".format(table, ", ".join(column + " TEXT" for column in keyColumns)))
+        connection.execute("CREATE TABLE IF NOT EXISTS systemMetricsHistory (pullID INTEGER, instanceID TEXT, updatedAt TEXT)")
+        return connection
+
+    @staticmethod
+    def getMeta(connection, key):
+        row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def setMeta(connection, key, value):
+        connection.execute("INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    @staticmethod
+    def ensureColumns(connection, table, row):
+        existing = set(info[1] for info in connection.execute("PRAGMA table_info({})".format(table)))
+        for column, value in row.items():
+            if column in existing:
+                continue
+            if not AnalyticsStore.identifierPattern.match(column):
+                raise Exception("Invalid metric name '{}' received.".format(column))
+            columnType = "INTEGER" if isinstance(value, int) and not isinstance(value, bool) else ("REAL" if isinstance(value, float) else "TEXT")
+            connection.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, column, columnType))
+
+    @staticmethod
+    def insertRows(connection, table, rows, upsertKeys=None, pullID=None):
+        if len(rows) == 0:
+            return
+        columns = sorted(set(column for row in rows for column in row))
+        sample = { column: next((row[column] for row in rows if row.get(column) is not None), None) for column in columns }
+        AnalyticsStore.ensureColumns(connection, table, sample)
+
+        if pullID is not None:
+            columns = ["pullID"] + columns
+        statement = "INSERT INTO {} ({}) VALUES ({})".format(table, ", ".join(columns), ", ".join("?" for _ in columns))
+        if upsertKeys:
+            updates = [column for column in columns if column not in upsertKeys]
+            statement += " ON CONFLICT({}) DO UPDATE SET {}".format(", ".join(upsertKeys), ", ".join("{0} = excluded.{0}".format(column) for column in updates))
+        connection.executemany(statement, [[pullID if column == "pullID" else row.get(column) for column in columns] for row in rows])
+
+    @staticmethod
+    def storeRows(connection, table, rows, pullID):
+        AnalyticsStore.insertRows(connection, table, rows, upsertKeys=AnalyticsStore.tables[table])
+        AnalyticsStore.insertRows(connection, table + "History", rows, pullID=pullID)
+
+    @staticmethod
+    def pull(client, path=None, fullResync=False):
+        """Pulls analytics changed since the last pull into the store. Returns a summary of the pull."""
+        connection = AnalyticsStore.connect(path)
         try:
-            deleteResponse = requests.post(
-                url=serverPath("/admin/super/deleteAdmin"),
-                headers=headers,
-                json=data
-            )
+            # Watermarks are only meaningful against the server they were issued by
+            if AnalyticsStore.getMeta(connection, "baseURL") != client.baseURL:
+                fullResync = True
+            since = None if fullResync else AnalyticsStore.getMeta(connection, "watermark")
+
+            with connection:
+                pullID = connection.execute("INSERT INTO pulls (pulledAt, since) VALUES (?, ?)", (datetime.datetime.now(datetime.timezone.utc).isoformat(), since)).lastrowid
+                counts = { "listingMetrics": 0, "requestMetrics": 0 }
+                resynced = False
+                pages = 0
+                while True:
+                    if since is None:
+                        for table in AnalyticsStore.tables:
+                            connection.execute("DELETE FROM {}".format(table))
+
+                    until = None
+                    cursor = None
+                    while True:
+                        # Rows are written in batches as the page streams in; the other members of the page are small and kept whole
+                        page = {}
+                        batches = { table: [] for table in AnalyticsStore.tables }
+                        for path, value in client.streamAnalyticsChanges(since=since, until=until, limit=AnalyticsStore.pageSize, cursor=cursor):
+                            if path[0] not in batches:
+                                page[path[0]] = value
+                                continue
+                            batches[path[0]].append(value)
+                            if len(batches[path[0]]) >= AnalyticsStore.batchSize:
+                                AnalyticsStore.storeRows(connection, path[0], batches[path[0]], pullID)
+                                counts[path[0]] += len(batches[path[0]])
+                                batches[path[0]] = []
+                        for table, rows in batches.items():
+                            AnalyticsStore.storeRows(connection, table, rows, pullID)
+                            counts[table] += len(rows)
+
+                        if "until" not in page:
+                            raise Exception("Server does not support incremental analytics retrieval.")
+                        pages += 1
+                        until = page["until"]
+                        cursor = page["nextCursor"]
+                        if cursor is None:
+                            break
+
+                    # Deleted or reset rows never show up as changes; a count mismatch means the local copy has drifted
+                    drifted = any(connection.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0] != page["totals"][table] for table in AnalyticsStore.tables)
+                    if not drifted or since is None:
+                        break
+                    since = None
+                    resynced = True
+
+                AnalyticsStore.insertRows(connection, "systemMetricsHistory", [page["systemMetrics"]], pullID=pullID)
+                connection.execute("UPDATE pulls SET until = ?, listingRows = ?, requestRows = ?, resynced = ? WHERE pullID = ?", (until, counts["listingMetrics"], counts["requestMetrics"], int(resynced or fullResync), pullID))
+                AnalyticsStore.setMeta(connection, "baseURL", client.baseURL)
+                AnalyticsStore.setMeta(connection, "watermark", until)
+
+            return {
+                "pullID": pullID,
+                "since": since,
+                "until": until,
+                "pages": pages,
+                "changedListingMetrics": counts["listingMetrics"],
+                "changedRequestMetrics": counts["requestMetrics"],
+                "resynced": resynced,
+                "systemMetrics": page["systemMetrics"]
+            }
+        finally:
+            connection.close()
+
+    @staticmethod
+    def export(path=None):
+        """Returns the latest stored analytics in the same shape as a full `getAnalytics` response."""
+        connection = AnalyticsStore.connect(path)
+        connection.row_factory = sqlite3.Row
+        try:
+            data = {}
+            for table in AnalyticsStore.tables:
+                data[table] = [dict(row) for row in connection.execute("SELECT * FROM {}".format(table))]
+            systemRow = connection.execute("SELECT * FROM systemMetricsHistory ORDER BY pullID DESC LIMIT 1").fetchone()
+            data["systemMetrics"] = { key: systemRow[key] for key in systemRow.keys() if key != "pullID" } if systemRow else {}
+            return data
+        finally:
+            connection.close()
 
-            deleteResponse.raise_for_status()
-            if deleteResponse.text.startswith("ERROR"):
-                raise Exception(deleteResponse.text[len("ERROR: "):])
-            elif deleteResponse.text.startswith("UERROR"):
-                raise Exception(deleteResponse.text[len("UERROR: "):])
-            if not deleteResponse.text.startswith("SUCCESS"):
-                raise Exception("Unknown response received: " + deleteResponse.text)
-            
-            print("Admin account deleted successfully!")
-            break
-        except Exception as e:
-            print("Error occurred in deleting admin account. Error: " + str(e))
-            try:
-                print("Server response: " + deleteResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Delete account aborted.")
-                break
-            print("Deleting admin account...")
-            
 def retrieveAnalytics():
     print()
-    print("Retrieving analytics...")
-    analyticsResponse = None
-    responseJSON = None
-    while True:
-        try:
-            analyticsResponse = requests.post(
-                url=serverPath("/admin/super/getAnalytics"),
-                headers=headers
-            )
+    summary = consoleCall("Retrieving analytics...", "retrieving analytics", "Retrieve analytics aborted.", lambda: AnalyticsStore.pull(client))
+    if summary is None:
+        return
 
-            analyticsResponse.raise_for_status()
-            if analyticsResponse.text.startswith("ERROR"):
-                raise Exception(analyticsResponse.text[len("ERROR: "):])
-            
-            print("Analytics retrieved successfully!")
-            print()
-            
-            responseJSON = json.loads(analyticsResponse.text)
-            print("Retrieved analytics:")
-            print()
-            pprint(responseJSON)
-            print()
-            break
-        except Exception as e:
-            print("Error occurred in retrieving analytics. Error: " + str(e))
-            try:
-                print("Server response: " + analyticsResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Retrieve analytics aborted.")
-                break
-            print("Retrieving analytics...")
+    print("Analytics retrieved successfully! {} listing and {} request metrics rows changed since {}.".format(summary["changedListingMetrics"], summary["changedRequestMetrics"], summary["since"] or "the first retrieval"))
+    if summary["resynced"]:
+        print("Local analytics store was out of sync with the server and has been rebuilt.")
+    print("Analytics stored in {}.".format(AnalyticsStore.defaultPath))
+    print()
+
+    print("Retrieved system metrics:")
+    print()
+    pprint(summary["systemMetrics"])
+    print()
     
     print()
-    saveAnalyticsToFile = input("Save analytics data to file? (y/n) ").strip().lower()
+    saveAnalyticsToFile = input("Export all stored analytics data to file? (y/n) ").strip().lower()
     while saveAnalyticsToFile not in ["y", "n"]:
-        saveAnalyticsToFile = input("Invalid choice. Save analytics data to file? (y/n) ").strip().lower()
+        saveAnalyticsToFile = input("Invalid choice. Export all stored analytics data to file? (y/n) ").strip().lower()
     
     if saveAnalyticsToFile == "y":
         print()
         print("Saving analytics data to file...")
         with open("MakanMatchAnalytics.json", "w") as f:
-            json.dump(responseJSON, f)
+            json.dump(AnalyticsStore.export(), f)
         print("Analytics data saved to MakanMatchAnalytics.json.")
         
-def retrieveFileManagerContext():
-    print()
-    print("Retrieving file manager context...")
-    contextResponse = None
-    while True:
-        try:
-            contextResponse = requests.get(
-                url=serverPath("/admin/super/getFileManagerContext"),
-                headers=headers
-            )
+class FileManagerMirror:
+    """
+    Local SQLite mirror of the server's FileManager context, kept current with versioned diffs from `/admin/super/getFileManagerContext`.
 
-            contextResponse.raise_for_status()
-            if contextResponse.text.startswith("ERROR"):
-                raise Exception(contextResponse.text[len("ERROR: "):])
-            
-            print("File manager context retrieved successfully!")
-            print()
-            
-            responseJSON = json.loads(contextResponse.text)
-            print("Retrieved file manager context:")
-            print()
-            pprint(responseJSON)
-            print()
-            break
-        except Exception as e:
-            print("Error occurred in retrieving file manager context. Error: " + str(e))
-            try:
-                print("Server response: " + contextResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Retrieve file manager context aborted.")
-                return
-            print("Retrieving file manager context...")
-            
-    saveToFile = input("Save file manager context to file? (y/n) ").strip().lower()
-    if saveToFile == "y":
-        print()
-        print("Saving file manager context to file...")
-        with open("MakanMatchFileManagerContext.json", "w") as f:
-            json.dump(responseJSON, f)
-        print("File manager context saved to MakanMatchFileManagerContext.json.")
+    Each sync sends the version of the last sync; the server answers 304 if nothing changed, or only the entries changed and removed since. A full download only happens on the first sync, against a different server, or when the server can no longer serve the diff (e.g. after a restart).
+    Entries are indexed by content type, update time, `forceExistence` and cloud ID so filtered queries are answered locally.
+    """
 
-def accessMakanMatchLogs():
-    print()
-    print("Accessing MakanMatch system logs...")
-    logsResponse = None
-    while True:
+    defaultPath = "MakanMatchFileManager.db"
+    batchSize = 1000
+    columns = ["id", "contentType", "updated", "updateMetadata", "forceExistence"]
+
+    @staticmethod
+    def connect(path=None):
+        connection = sqlite3.connect(path or FileManagerMirror.defaultPath)
+        connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, id TEXT, contentType TEXT, updated TEXT, updateMetadata INTEGER, forceExistence INTEGER)")
+        for column in ["id", "contentType", "updated", "forceExistence"]:
+            connection.execute("CREATE INDEX IF NOT EXISTS files_{0} ON files ({0})".format(column))
+        return connection
+
+    @staticmethod
+    def upsertEntries(connection, entries):
+        rows = []
+        for name, entry in entries.items():
+            if name == "mode":
+                AnalyticsStore.setMeta(connection, "mode", entry)
+                continue
+            rows.append((name, entry.get("id"), entry.get("contentType"), entry.get("updated"), entry.get("updateMetadata"), entry.get("forceExistence")))
+        connection.executemany(
+            "INSERT INTO files (name, id, contentType, updated, updateMetadata, forceExistence) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET {}".format(", ".join("{0} = excluded.{0}".format(column) for column in FileManagerMirror.columns)),
+            rows
+        )
+
+    @staticmethod
+    def sync(client, path=None, fullResync=False):
+        """Brings the mirror up to date. Returns a summary of what changed."""
+        connection = FileManagerMirror.connect(path)
         try:
-            logsResponse = requests.post(
-                url=serverPath("/admin/super/getLogs"),
-                headers=headers
-            )
+            if AnalyticsStore.getMeta(connection, "baseURL") != client.baseURL:
+                fullResync = True
+            since = None if fullResync else AnalyticsStore.getMeta(connection, "version")
 
-            logsResponse.raise_for_status()
-            if logsResponse.text.startswith("ERROR"):
-                raise Exception(logsResponse.text[len("ERROR: "):])
-            
-            print("Logs retrieved successfully!")
-            print()
-            break
-        except Exception as e:
-            print("Error occurred in accessing MakanMatch system logs. Error: " + str(e))
-            try:
-                print("Server response: " + logsResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Access logs aborted.")
-                return
-            print("Accessing MakanMatch system logs...")
-    
+            events = client.streamFileManagerContextChanges(since)
+            if events is None:
+                return { "version": since, "full": False, "notModified": True, "changed": 0, "deleted": 0, "files": FileManagerMirror.count(connection) }
+
+            # Entries are written in batches as the response streams in, so a full download never sits in memory whole
+            changes = { "version": None, "full": None }
+            changedCount = 0
+            deletedCount = 0
+            batch = {}
+            with connection:
+                for kind, value in events:
+                    if kind == "changed":
+                        if changes["full"] is None:
+                            raise Exception("Unexpected file manager context response received.")
+                        name, entry = value
+                        batch[name] = entry
+                        changedCount += 0 if name == "mode" else 1
+                        if len(batch) >= FileManagerMirror.batchSize:
+                            FileManagerMirror.upsertEntries(connection, batch)
+                            batch = {}
+                    elif kind == "deleted":
+                        FileManagerMirror.upsertEntries(connection, batch)
+                        batch = {}
+                        connection.execute("DELETE FROM files WHERE name = ?", (value,))
+                        deletedCount += 1
+                    elif kind in changes:
+                        changes[kind] = value
+                        if kind == "full" and value:
+                            connection.execute("DELETE FROM files")
+                FileManagerMirror.upsertEntries(connection, batch)
+
+                AnalyticsStore.setMeta(connection, "baseURL", client.baseURL)
+                AnalyticsStore.setMeta(connection, "version", changes["version"])
+                AnalyticsStore.setMeta(connection, "syncedAt", datetime.datetime.now(datetime.timezone.utc).isoformat())
+
+            return { "version": changes["version"], "full": changes["full"], "notModified": False, "changed": changedCount, "deleted": deletedCount, "files": FileManagerMirror.count(connection) }
+        finally:
+            connection.close()
+
+    @staticmethod
+    def entryOf(row):
+        entry = dict(zip(["name"] + FileManagerMirror.columns, row))
+        for flag in ["updateMetadata", "forceExistence"]:
+            if entry[flag] is not None:
+                entry[flag] = bool(entry[flag])
+        return entry
+
+    @staticmethod
+    def count(connection):
+        return connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    @staticmethod
+    def query(path=None, contentType=None, updatedFrom=None, updatedTo=None, forceExistence=None, missingID=False, limit=None):
+        """Returns mirrored entries matching all given filters, most recently updated first. `updatedFrom`/`updatedTo` are ISO datetime strings; `missingID` selects entries without a cloud ID."""
+        conditions = []
+        parameters = []
+        if contentType is not None:
+            conditions.append("contentType = ?")
+            parameters.append(contentType)
+        if updatedFrom is not None:
+            conditions.append("updated >= ?")
+            parameters.append(updatedFrom)
+        if updatedTo is not None:
+            conditions.append("updated <= ?")
+            parameters.append(updatedTo)
+        if forceExistence is not None:
+            conditions.append("forceExistence = ?")
+            parameters.append(int(forceExistence))
+        if missingID:
+            conditions.append("(id IS NULL OR id = '')")
+
+        statement = "SELECT name, {} FROM files".format(", ".join(FileManagerMirror.columns))
+        if conditions:
+            statement += " WHERE " + " AND ".join(conditions)
+        statement += " ORDER BY updated DESC, name"
+        if limit is not None:
+            statement += " LIMIT ?"
+            parameters.append(int(limit))
+
+        connection = FileManagerMirror.connect(path)
+        try:
+            return [FileManagerMirror.entryOf(row) for row in connection.execute(statement, parameters)]
+        finally:
+            connection.close()
+
+    @staticmethod
+    def contentTypes(path=None):
+        connection = FileManagerMirror.connect(path)
+        try:
+            return [{ "contentType": row[0], "files": row[1] } for row in connection.execute("SELECT contentType, COUNT(*) FROM files GROUP BY contentType ORDER BY COUNT(*) DESC")]
+        finally:
+            connection.close()
+
+    @staticmethod
+    def export(path=None):
+        """Returns the mirrored context in the shape served by the server."""
+        connection = FileManagerMirror.connect(path)
+        try:
+            context = {}
+            mode = AnalyticsStore.getMeta(connection, "mode")
+            if mode is not None:
+                context["mode"] = mode
+            for row in connection.execute("SELECT name, {} FROM files ORDER BY name".format(", ".join(FileManagerMirror.columns))):
+                context[row[0]] = FileManagerMirror.entryOf(row)
+            return context
+        finally:
+            connection.close()
+
+    @staticmethod
+    def parseQuery(arguments):
+        """Parses console query arguments (`contentType=<type> from=<datetime> to=<datetime> forceExistence=<true/false> missingID limit=<n>`) into `query` keyword arguments."""
+        filters = { "limit": 50 }
+        for argument in arguments:
+            key, _, value = argument.partition("=")
+            if key == "contentType":
+                filters["contentType"] = value
+            elif key == "from":
+                filters["updatedFrom"] = value
+            elif key == "to":
+                filters["updatedTo"] = value
+            elif key == "forceExistence":
+                filters["forceExistence"] = value.lower() == "true"
+            elif key == "missingID":
+                filters["missingID"] = True
+            elif key == "limit":
+                filters["limit"] = int(value) if int(value) > 0 else None
+            else:
+                raise Exception("Unknown filter '{}'.".format(argument))
+        return filters
+
+def retrieveFileManagerContext():
+    print()
+    print("Syncing file manager context mirror...")
     try:
-        logs = logsResponse.json()
-        print("Logs:")
-        for log in logs:
-            print("\t" + log)
-    except Exception as e:
-        print("Failed to parse logs. Error: " + str(e))
-        print("Raw logs:")
-        print(logsResponse.text)
+        summary = FileManagerMirror.sync(client)
+    except (SuperuserAPIError, requests.RequestException) as e:
+        print("Error occurred in syncing file manager context; queries will use the existing mirror. Error: " + str(e))
+    else:
+        if summary["notModified"]:
+            print("File manager context unchanged since the last sync. {} files mirrored.".format(summary["files"]))
+        elif summary["full"]:
+            print("Full file manager context downloaded. {} files mirrored.".format(summary["files"]))
+        else:
+            print("Applied {} changed and {} removed entries. {} files mirrored.".format(summary["changed"], summary["deleted"], summary["files"]))
+
+    while True:
+        print("""
+Commands:
+    types: File counts by content type.
+    query <filters (optional)>: Mirrored entries, most recently updated first. Filters: contentType=<type> from=<datetime> to=<datetime> forceExistence=<true/false> missingID limit=<n, 0 for all, default 50>
+    sync: Pull changes from the server again.
+    save: Save the mirrored context to MakanMatchFileManagerContext.json.
+    exit: Return to the main menu.
+""")
+
+        userChoice = input("Enter command: ").strip().split()
+        if len(userChoice) == 0:
+            continue
+
+        try:
+            command = userChoice[0].lower()
+            if command == "types":
+                AnalyticsWarehouse.printTable(FileManagerMirror.contentTypes(), ["contentType", "files"])
+            elif command == "query":
+                AnalyticsWarehouse.printTable(FileManagerMirror.query(**FileManagerMirror.parseQuery(userChoice[1:])), ["name"] + FileManagerMirror.columns)
+            elif command == "sync":
+                summary = FileManagerMirror.sync(client)
+                print("{} changed and {} removed entries applied{}. {} files mirrored.".format(summary["changed"], summary["deleted"], " (full download)" if summary["full"] else "", summary["files"]))
+            elif command == "save":
+                with open("MakanMatchFileManagerContext.json", "w") as f:
+                    json.dump(FileManagerMirror.export(), f)
+                print("File manager context saved to MakanMatchFileManagerContext.json.")
+            elif command == "exit":
+                return
+            else:
+                print("Invalid command.")
+        except Exception as e:
+            print("Command failed. Error: {}".format(e))
+
+def accessMakanMatchLogs():
+    print()
+    fromStart = True
+    if Logger.readCursor(client) is not None:
+        resume = input("Fetch only logs added since the last retrieval? (y/n) ").strip().lower()
+        while resume not in ["y", "n"]:
+            resume = input("Invalid choice. Fetch only logs added since the last retrieval? (y/n) ").strip().lower()
+        fromStart = resume == "n"
+
+    print()
+    def fetchLogs():
+        fetched = Logger.fetchNewLogs(client, fromStart=fromStart)
+        LogIndex.update()
+        return fetched
+
+    fetched = consoleCall("Accessing MakanMatch system logs...", "accessing MakanMatch system logs", "Access logs aborted.", fetchLogs)
+    if fetched is None:
         return
-        
+    savedCount, tail = fetched
+
+    print("Logs retrieved successfully! {} new log entries saved to {}.".format(savedCount, Logger.logsFile))
     print()
-    saveLogsToFile = input("Save logs to file? (y/n) ").lower()
-    while saveLogsToFile not in ["y", "n"]:
-        saveLogsToFile = input("Invalid choice. Save logs to file? (y/n) ").lower()
-    
-    if saveLogsToFile == "y":
-        print()
-        print("Saving logs to file...")
-        with open("MakanMatchLogs.txt", "w") as f:
-            f.write("\n".join(logs))
-        print("Logs saved to MakanMatchLogs.txt.")
+
+    if len(tail) == 0:
+        print("No new logs.")
+        return
+
+    print("Latest {} new log entries:".format(len(tail)))
+    for log in tail:
+        print("\t" + log)
         
 def toggleAnalytics():
     print()
@@ -412,40 +1327,9 @@ def toggleAnalytics():
     toggleStatus = toggleStatus == "y"
     
     print()
-    print("Toggling analytics...")
-    toggleResponse = None
-    while True:
-        try:
-            toggleResponse = requests.post(
-                url=serverPath("/admin/super/toggleAnalytics"),
-                headers=headers,
-                json={
-                    "newStatus": toggleStatus
-                }
-            )
-
-            toggleResponse.raise_for_status()
-            if toggleResponse.text.startswith("ERROR"):
-                raise Exception(toggleResponse.text[len("ERROR: "):])
-            elif toggleResponse.text.startswith("UERROR"):
-                raise Exception(toggleResponse.text[len("UERROR: "):])
-            if not toggleResponse.text.startswith("SUCCESS"):
-                raise Exception("Unknown response received: " + toggleResponse.text)
-            
-            print("Analytics toggled successfully! Server: {}".format(toggleResponse.text))
-            break
-        except Exception as e:
-            print("Error occurred in toggling analytics. Error: " + str(e))
-            try:
-                print("Server response: " + toggleResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Toggle analytics aborted.")
-                break
-            print("Toggling analytics...")
+    serverMessage = consoleCall("Toggling analytics...", "toggling analytics", "Toggle analytics aborted.", lambda: client.toggleAnalytics(toggleStatus))
+    if serverMessage is not None:
+        print("Analytics toggled successfully! Server: {}".format(serverMessage))
             
 def toggleOpenAIChat():
     print()
@@ -455,40 +1339,9 @@ def toggleOpenAIChat():
     toggleStatus = toggleStatus == "y"
     
     print()
-    print("Toggling MakanBot (OpenAI Chat)...")
-    toggleResponse = None
-    while True:
-        try:
-            toggleResponse = requests.post(
-                url=serverPath("/admin/super/toggleMakanBot"),
-                headers=headers,
-                json={
-                    "newStatus": toggleStatus
-                }
-            )
-
-            toggleResponse.raise_for_status()
-            if toggleResponse.text.startswith("ERROR"):
-                raise Exception(toggleResponse.text[len("ERROR: "):])
-            elif toggleResponse.text.startswith("UERROR"):
-                raise Exception(toggleResponse.text[len("UERROR: "):])
-            if not toggleResponse.text.startswith("SUCCESS"):
-                raise Exception("Unknown response received: " + toggleResponse.text)
-            
-            print("MakanBot (OpenAI Chat) toggled successfully! Server: {}".format(toggleResponse.text))
-            break
-        except Exception as e:
-            print("Error occurred in toggling MakanBot (OpenAI Chat). Error: " + str(e))
-            try:
-                print("Server response: " + toggleResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Toggle MakanBot (OpenAI Chat) aborted.")
-                break
-            print("Toggling MakanBot (OpenAI Chat)...")
+    serverMessage = consoleCall("Toggling MakanBot (OpenAI Chat)...", "toggling MakanBot (OpenAI Chat)", "Toggle MakanBot (OpenAI Chat) aborted.", lambda: client.toggleMakanBot(toggleStatus))
+    if serverMessage is not None:
+        print("MakanBot (OpenAI Chat) toggled successfully! Server: {}".format(serverMessage))
             
 def toggleUsageLock():
     print()
@@ -498,149 +1351,145 @@ def toggleUsageLock():
     lockStatus = lockStatus == "y"
     
     print()
-    print("Toggling usage lock...")
-    toggleResponse = None
-    while True:
-        try:
-            toggleResponse = requests.post(
-                url=serverPath("/admin/super/toggleUsageLock"),
-                headers=headers,
-                json={
-                    "newStatus": lockStatus
-                }
-            )
-
-            toggleResponse.raise_for_status()
-            if toggleResponse.text.startswith("ERROR"):
-                raise Exception(toggleResponse.text[len("ERROR: "):])
-            elif toggleResponse.text.startswith("UERROR"):
-                raise Exception(toggleResponse.text[len("UERROR: "):])
-            if not toggleResponse.text.startswith("SUCCESS"):
-                raise Exception("Unknown response received: " + toggleResponse.text)
-            
-            print("Usage lock toggled successfully! Server: {}".format(toggleResponse.text))
-            break
-        except Exception as e:
-            print("Error occurred in toggling usage lock. Error: " + str(e))
-            try:
-                print("Server response: " + toggleResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Toggle usage lock aborted.")
-                break
-            print("Toggling usage lock...")
+    serverMessage = consoleCall("Toggling usage lock...", "toggling usage lock", "Toggle usage lock aborted.", lambda: client.toggleUsageLock(lockStatus))
+    if serverMessage is not None:
+        print("Usage lock toggled successfully! Server: {}".format(serverMessage))
             
 def toggleSuperuserSensitive():
     print()
-    print("Toggling superuser sensitive mode...")
-    toggleResponse = None
+    serverMessage = consoleCall("Toggling superuser sensitive mode...", "toggling superuser sensitive mode", "Toggle superuser sensitive mode aborted.", client.toggleSuperuserSensitive)
+    if serverMessage is not None:
+        print("Superuser sensitive mode toggled successfully! Server: {}".format(serverMessage))
+            
+class RuntimeToggles:
+    """
+    Runtime toggles held in the server's cache, read together with the cache version and changed in batches.
+    """
+
+    toggles = {
+        "analytics": "analyticsEnabled",
+        "makanbot": "openaiChatEnabled",
+        "usagelock": "usageLock",
+        "sensitive": "superuserSensitiveActive"
+    }
+
+    @staticmethod
+    def rows(state, staged=None):
+        staged = staged or {}
+        rows = []
+        for name, key in RuntimeToggles.toggles.items():
+            current = state["data"].get(key)
+            rows.append({
+                "toggle": name,
+                "cacheKey": key,
+                "current": "unset" if current is None else ("on" if current else "off"),
+                "staged": "" if key not in staged else ("on" if staged[key] else "off")
+            })
+        return rows
+
+    @staticmethod
+    def parseChanges(arguments):
+        """Parses `<toggle>=<on/off>` arguments into a dictionary of cache keys to booleans."""
+        changes = {}
+        for argument in arguments:
+            name, _, state = argument.partition("=")
+            if name.lower() not in RuntimeToggles.toggles or state.lower() not in ["on", "off"]:
+                raise Exception("Invalid change '{}'. Use <toggle>=<on/off> with one of: {}.".format(argument, ", ".join(RuntimeToggles.toggles.keys())))
+            changes[RuntimeToggles.toggles[name.lower()]] = state.lower() == "on"
+        return changes
+
+def runtimeToggles():
+    print()
+    print("Retrieving runtime toggles...")
+    try:
+        state = client.cacheState()
+    except (SuperuserAPIError, requests.RequestException) as e:
+        print("Error occurred in retrieving runtime toggles. Error: " + str(e))
+        return
+
+    staged = {}
     while True:
-        try:
-            toggleResponse = requests.post(
-                url=serverPath("/admin/super/toggleSuperuserSensitive"),
-                headers=headers
-            )
+        print()
+        print("Cache version {}{}.".format(state["version"], " (snapshot write pending)" if state["flushPending"] else ""))
+        AnalyticsWarehouse.printTable(RuntimeToggles.rows(state, staged), ["toggle", "cacheKey", "current", "staged"])
+        print("""
+Commands:
+    set <toggle>=<on/off> ...: Stage one or more changes.
+    apply: Apply all staged changes in one update.
+    discard: Discard staged changes.
+    reload: Retrieve the current toggles again.
+    exit: Return to the main menu.
+""")
 
-            toggleResponse.raise_for_status()
-            if toggleResponse.text.startswith("ERROR"):
-                raise Exception(toggleResponse.text[len("ERROR: "):])
-            elif toggleResponse.text.startswith("UERROR"):
-                raise Exception(toggleResponse.text[len("UERROR: "):])
-            if not toggleResponse.text.startswith("SUCCESS"):
-                raise Exception("Unknown response received: " + toggleResponse.text)
-            
-            print("Superuser sensitive mode toggled successfully! Server: {}".format(toggleResponse.text))
-            break
+        userChoice = input("Enter command: ").strip().split()
+        if len(userChoice) == 0:
+            continue
+
+        try:
+            command = userChoice[0].lower()
+            if command == "set":
+                staged.update(RuntimeToggles.parseChanges(userChoice[1:]))
+            elif command == "apply":
+                if len(staged) == 0:
+                    print("No changes staged.")
+                    continue
+                state = client.updateToggles(staged, expectedVersion=state["version"])
+                staged = {}
+                print("Runtime toggles updated.")
+            elif command == "discard":
+                staged = {}
+            elif command == "reload":
+                state = client.cacheState()
+            elif command == "exit":
+                return
+            else:
+                print("Invalid command.")
         except Exception as e:
-            print("Error occurred in toggling superuser sensitive mode. Error: " + str(e))
-            try:
-                print("Server response: " + toggleResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Toggle superuser sensitive mode aborted.")
-                break
-            print("Toggling superuser sensitive mode...")
-            
+            print("Command failed. Error: {}".format(e))
+
 def clearFM():
     print()
     if input("This is a sensitive action and could cripple system operation? Continue? (y/n) ").lower() != "y":
         print("Clear FileManager aborted.")
         return
     
-    print("Clearing file manager...")
-    clearResponse = None
-    while True:
-        try:
-            clearResponse = requests.post(
-                url=serverPath("/admin/super/clearFM"),
-                headers=headers
-            )
-
-            clearResponse.raise_for_status()
-            if clearResponse.text.startswith("ERROR"):
-                raise Exception(clearResponse.text[len("ERROR: "):])
-            elif clearResponse.text.startswith("UERROR"):
-                raise Exception(clearResponse.text[len("UERROR: "):])
-            if not clearResponse.text.startswith("SUCCESS"):
-                raise Exception("Unknown response received: " + clearResponse.text)
-            
-            print("File manager cleared successfully! Server: {}".format(clearResponse.text))
-            break
-        except Exception as e:
-            print("Error occurred in clearing file manager. Error: " + str(e))
-            try:
-                print("Server response: " + clearResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Clear file manager aborted.")
-                break
-            print("Clearing file manager...")
+    serverMessage = consoleCall("Clearing file manager...", "clearing file manager", "Clear file manager aborted.", client.clearFM)
+    if serverMessage is not None:
+        print("File manager cleared successfully! Server: {}".format(serverMessage))
             
+def printResetProgress(event, stream=None):
+    """Renders a database reset or dataset generation progress event from the server as soon as it arrives."""
+    stream = stream or sys.stdout
+    kind = event.get("event")
+    if kind == "start":
+        print("Clearing {} tables ({}) in one transaction...".format(len(event["tables"]), event["dialect"]), file=stream)
+    elif kind == "table" and "rowsPerSecond" in event:
+        print("  [{:>2}/{}] {:<20} {:>10,} rows {:>10.2f} ms {:>10,} rows/s".format(event["step"], event["steps"], event["table"], event["rows"], event["durationMs"], event["rowsPerSecond"]), file=stream)
+    elif kind == "table":
+        print("  [{:>2}/{}] {:<20} {:>10,} rows {:>10.2f} ms".format(event["step"], event["steps"], event["table"], event["rows"], event["durationMs"]), file=stream)
+    elif kind == "generate":
+        print("Generating dataset (seed {}, skew {}) in one transaction: {}...".format(event["seed"], event["skew"], ", ".join("{:,} {}".format(count, name) for name, count in event["counts"].items())), file=stream)
+    elif kind == "progress":
+        print("        {:<20} {:>10,} / {:,} rows".format(event["table"], event["rows"], event["total"]), file=stream)
+    elif kind == "generated":
+        print("Committed: {:,} rows loaded in {:.2f} ms ({:,} rows/s).".format(event["rows"], event["durationMs"], event["rowsPerSecond"]), file=stream)
+    elif kind == "analytics":
+        print("  New system analytics record {} created.".format(event["instanceID"]), file=stream)
+    elif kind == "reset":
+        print("Committed: {:,} rows cleared in {:.2f} ms.".format(event["rows"], event["durationMs"]), file=stream)
+    elif kind == "error":
+        print("{}{}".format(event["error"], " (at table {})".format(event["table"]) if event.get("table") else ""), file=stream)
+    stream.flush()
+
 def softReset():
     print()
     if input("This is a sensitive action and could cripple system operation? Continue? (y/n) ").lower() != "y":
         print("Soft reset aborted.")
         return
     
-    print("Soft resetting system database...")
-    while True:
-        try:
-            resetResponse = requests.post(
-                url=serverPath("/admin/super/softReset"),
-                headers=headers
-            )
-
-            resetResponse.raise_for_status()
-            if resetResponse.text.startswith("ERROR"):
-                raise Exception(resetResponse.text[len("ERROR: "):])
-            elif resetResponse.text.startswith("UERROR"):
-                raise Exception(resetResponse.text[len("UERROR: "):])
-            if not resetResponse.text.startswith("SUCCESS"):
-                raise Exception("Unknown response received: " + resetResponse.text)
-            
-            print("System database soft reset successfully! Server: {}".format(resetResponse.text))
-            break
-        except Exception as e:
-            print("Error occurred in soft resetting system database. Error: " + str(e))
-            try:
-                print("Server response: " + resetResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Soft reset aborted.")
-                break
-            print("Soft resetting system database...")
+    summary = consoleCall("Soft resetting system database...", "soft resetting system database", "Soft reset aborted.", lambda: client.softReset(printResetProgress))
+    if summary is not None:
+        print("System database soft reset successfully!")
             
 def presentationTransform():
     print()
@@ -648,141 +1497,1521 @@ def presentationTransform():
         print("Presentation transform aborted.")
         return
     
-    print("Transforming system database for presentation...")
-    while True:
-        try:
-            transformResponse = requests.post(
-                url=serverPath("/admin/super/presentationTransform"),
-                headers=headers
-            )
+    messages = consoleCall("Transforming system database for presentation...", "transforming system database for presentation", "Transformation aborted.", lambda: client.presentationTransform(printResetProgress))
+    if messages is None:
+        return
 
-            transformResponse.raise_for_status()
-            if transformResponse.text.startswith("ERROR"):
-                raise Exception(transformResponse.text[len("ERROR: "):])
-            elif transformResponse.text.startswith("UERROR"):
-                raise Exception(transformResponse.text[len("UERROR: "):])
-            
-            
-            responseJSON = json.loads(transformResponse.text)
-            print("Transformation messages:")
-            print()
-            if responseJSON["messages"]:
-                for message in responseJSON["messages"]:
-                    print(message)
-            else:
-                print("Could not parse messages.")
-            print()
-            
-            print("System database transformation for presentation successfully!")
-            break
-        except Exception as e:
-            print("Error occurred in transforming system database for presentation. Error: " + str(e))
+    print()
+    print("Transformation messages:")
+    print()
+    if messages:
+        for message in messages:
+            print(message)
+    else:
+        print("Could not parse messages.")
+    print()
+
+    print("System database transformation for presentation successfully!")
+
+def generateDataset():
+    print()
+    print("Generates a reproducible synthetic dataset (the same seed gives the same data). Leave any parameter blank for the server's default.")
+    parameters = {}
+    for name, parse in [("seed", int), ("hosts", int), ("guests", int), ("listings", int), ("reservations", int), ("reviews", int), ("likes", int), ("chats", int), ("messages", int), ("skew", float), ("batchSize", int)]:
+        value = input("{}: ".format(name)).strip()
+        while value != "":
             try:
-                print("Server response: " + transformResponse.text)
-            except:
-                print("Server response: <No response>")
-            retry = input("Retry? (y/n): ").lower()
-            print()
-            if retry != "y":
-                print("Transformation aborted.")
+                parameters[name] = parse(value)
                 break
-            print("Transforming system database for presentation...")
+            except ValueError:
+                value = input("Invalid value. {}: ".format(name)).strip()
+    password = input("Password for all generated accounts: ").strip()
+    if password:
+        parameters["password"] = password
+    parameters["reset"] = input("Soft reset the system database first? (y/n) ").lower() == "y"
+
+    if input("This is a sensitive action and could cripple system operation? Continue? (y/n) ").lower() != "y":
+        print("Dataset generation aborted.")
+        return
+
+    summary = consoleCall("Generating dataset...", "generating dataset", "Dataset generation aborted.", lambda: client.generateDataset(parameters, printResetProgress))
+    if summary is None:
+        return
+
+    print()
+    for login in summary["logins"]:
+        print("Sample {} login: {} / {}".format(login["userType"].lower(), login["username"], summary["password"]))
+    print("Dataset generated successfully!")
+
+class LogIndex:
+    """
+    Persistent on-disk index over `MakanMatchLogs.txt` for the Logs Console.
+
+    Stored in `MakanMatchLogs.index/`:
+    - `time.bin`: (epoch minute, byte offset) pairs, one per minute in which logs were written, for time-range lookups
+    - `tags/<TAG>.bin`: posting list of byte offsets of the lines carrying that log tag
+    - `meta.json`: how far the logs file has been indexed and the length of every posting list
+
+    All lists are append-only and read back through `mmap`, so `update` only has to scan lines appended since the last run. The index is rebuilt from scratch if the logs file was re-written.
+    """
+
+    indexDir = "MakanMatchLogs.index"
+    tagPattern = re.compile(r"[A-Z0-9_.\-]{1,64}")
 
-class Logger:
     @staticmethod
-    def readAll():
+    def path(*parts):
+        return os.path.join(LogIndex.indexDir, *parts)
+
+    @staticmethod
+    def minuteOf(line):
+        # Logs are prefixed with an ISO timestamp (e.g. 2024-07-01T00:00:00.000Z); only minute precision is indexed
         try:
-            if os.path.exists(os.path.join(os.getcwd(), "MakanMatchLogs.txt")):
-                with open("MakanMatchLogs.txt", "r") as f:
-                    logs = f.readlines()
-                    for logIndex in range(len(logs)):
-                        logs[logIndex] = logs[logIndex].replace("\n", "")
-                    return logs
-            else:
-                return []
-        except Exception as e:
-            print("LOGGER READALL ERROR: Failed to check and read MakanMatchLogs.txt file. Error: {}".format(e))
-            return "ERROR: Failed to check and read MakanMatchLogs.txt file. Error: {}".format(e)
-      
+            return int(datetime.datetime.strptime(line[:16].decode("ascii"), "%Y-%m-%dT%H:%M").replace(tzinfo=datetime.timezone.utc).timestamp()) // 60
+        except Exception:
+            return None
+
     @staticmethod
-    def manageLogs():
-        print("LOGGER: Welcome to the Logging Management Console.")
-        while True:
-            print("""
-Commands:
-    read <number of lines, e.g 50 (optional)>: Reads the last <number of lines> of logs. If no number is specified, all logs will be displayed.
-    exit: Exit the Logging Management Console.
-""")
-    
-            userChoice = input("Enter command: ")
-            userChoice = userChoice.lower()
-            while not userChoice.startswith("read") and (userChoice != "destroy") and (userChoice != "exit"):
-                userChoice = input("Invalid command. Enter command: ")
-                userChoice = userChoice.lower()
-    
-            if userChoice.startswith("read"):
-                allLogs = Logger.readAll()
-                targetLogs = []
+    def parseMinute(text):
+        parsed = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return int(parsed.timestamp()) // 60
 
-                userChoice = userChoice.split(" ")
+    @staticmethod
+    def tagsOf(line):
+        # Tag block sits between the timestamp and the first colon, e.g. `ORDERS CONFIRMRESERVATION ERROR: ...`
+        colonIndex = line.find(b":", 24)
+        if colonIndex == -1:
+            return []
+        tags = line[24:colonIndex].decode("utf-8", errors="replace").upper().split()
+        return [tag for tag in set(tags) if LogIndex.tagPattern.fullmatch(tag)]
 
-                # Log filtering feature
-                if len(userChoice) == 1:
-                    targetLogs = allLogs
-                elif userChoice[1] == ".filter":
-                    if len(userChoice) < 3:
-                        print("Invalid log filter. Format: read .filter <keywords>")
-                        continue
-                    else:
-                        try:
-                            keywords = userChoice[2:]
-                            for log in allLogs:
-                                logTags = log[23::]
-                                logTags = logTags[:logTags.find(":")].upper().split(" ")
-
-                                ## Check if log contains all keywords
-                                containsAllKeywords = True
-                                for keyword in keywords:
-                                    if keyword.upper() not in logTags:
-                                        containsAllKeywords = False
-                                        break
-                                
-                                if containsAllKeywords:
-                                    targetLogs.append(log)
-                                
-                            print("Filtered logs with keywords: {}".format(keywords))
-                            print()
-                        except Exception as e:
-                            print("LOGGER: Failed to parse and filter logs. Error: {}".format(e))
-                            continue
-                else:
-                    logCount = 0
-                    try:
-                        logCount = int(userChoice[1])
-                        if logCount > len(allLogs):
-                            logCount = len(allLogs)
-                        elif logCount <= 0:
-                            raise Exception("Invalid log count. Must be a positive integer above 0 lower than or equal to the total number of logs.")
-                        
-                        targetLogs = allLogs[-logCount::]
-                    except Exception as e:
-                        print("LOGGER: Failed to read logs. Error: {}".format(e))
-                        continue
+    @staticmethod
+    def readHead():
+        with open(Logger.logsFile, "rb") as f:
+            return f.readline(256).decode("utf-8", errors="replace")
 
-                logCount = len(targetLogs)
-                print()
-                print("Displaying {} log entries:".format(logCount))
-                print()
-                for log in targetLogs:
-                    print("\t{}".format(log))
-            elif userChoice == "exit":
-                print("LOGGER: Exiting Logging Management Console...")
-                break
-    
-        return
+    @staticmethod
+    def loadMeta():
+        try:
+            with open(LogIndex.path("meta.json"), "r") as f:
+                return json.load(f)
+        except Exception:
+            return None
 
-while True:
-    print("""
+    @staticmethod
+    def saveMeta(meta):
+        tempPath = LogIndex.path("meta.json.tmp")
+        with open(tempPath, "w") as f:
+            json.dump(meta, f)
+        os.replace(tempPath, LogIndex.path("meta.json"))
+
+    @staticmethod
+    def reset():
+        if os.path.exists(LogIndex.indexDir):
+            shutil.rmtree(LogIndex.indexDir)
+        os.makedirs(LogIndex.path("tags"))
+        meta = {
+            "head": None,
+            "indexedBytes": 0,
+            "lastMinute": None,
+            "lines": 0,
+            "time": 0,
+            "tags": {}
+        }
+        LogIndex.saveMeta(meta)
+        return meta
+
+    @staticmethod
+    def appendTo(fileName, values, expectedCount):
+        # Truncate to the length recorded in meta first, discarding anything written by an interrupted update
+        with open(LogIndex.path(fileName), "ab") as f:
+            f.truncate(expectedCount * values.itemsize)
+            values.tofile(f)
+
+    @staticmethod
+    def update():
+        """Brings the index up to date with `MakanMatchLogs.txt`, scanning only newly appended lines. Returns the index metadata."""
+        if not os.path.exists(Logger.logsFile):
+            return LogIndex.reset()
+
+        meta = LogIndex.loadMeta()
+        logsSize = os.path.getsize(Logger.logsFile)
+        head = LogIndex.readHead()
+        if meta is None or logsSize < meta["indexedBytes"] or (meta["head"] is not None and meta["head"] != head):
+            meta = LogIndex.reset()
+        if logsSize == meta["indexedBytes"]:
+            return meta
+
+        lineCount = 0
+        timeEntries = array("Q")
+        tagPostings = collections.defaultdict(lambda: array("Q"))
+        lastMinute = meta["lastMinute"]
+        offset = meta["indexedBytes"]
+        with open(Logger.logsFile, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Partially written line; picked up on the next update
+                    break
+
+                if line.strip():
+                    lineCount += 1
+
+                    minute = LogIndex.minuteOf(line)
+                    if minute is not None and (lastMinute is None or minute > lastMinute):
+                        timeEntries.extend((minute, offset))
+                        lastMinute = minute
+
+                    for tag in LogIndex.tagsOf(line):
+                        tagPostings[tag].append(offset)
+
+                offset += len(line)
+
+        LogIndex.appendTo("time.bin", timeEntries, meta["time"] * 2)
+        for tag, postings in tagPostings.items():
+            LogIndex.appendTo(os.path.join("tags", tag + ".bin"), postings, meta["tags"].get(tag, 0))
+            meta["tags"][tag] = meta["tags"].get(tag, 0) + len(postings)
+
+        meta["head"] = head
+        meta["indexedBytes"] = offset
+        meta["lastMinute"] = lastMinute
+        meta["lines"] += lineCount
+        meta["time"] += len(timeEntries) // 2
+        LogIndex.saveMeta(meta)
+        return meta
+
+    @staticmethod
+    def openList(fileName, count):
+        """Memory-maps an index list and returns a uint64 view of its first `count` values. The map is closed once the view is garbage collected."""
+        if count == 0 or not os.path.exists(LogIndex.path(fileName)):
+            return memoryview(b"").cast("Q")
+        with open(LogIndex.path(fileName), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast("Q")[:count]
+
+    @staticmethod
+    def readLinesAt(offsets):
+        with open(Logger.logsFile, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                yield f.readline().rstrip(b"\r\n").decode("utf-8", errors="replace")
+
+    @staticmethod
+    def readRange(startOffset, endOffset=None):
+        with open(Logger.logsFile, "rb") as f:
+            f.seek(startOffset)
+            offset = startOffset
+            for line in f:
+                if endOffset is not None and offset >= endOffset:
+                    break
+                offset += len(line)
+                line = line.rstrip(b"\r\n")
+                if line:
+                    yield line.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def offsetsForTags(meta, keywords):
+        """Returns the offsets of log lines carrying all of the given tags by intersecting their posting lists, smallest first."""
+        tags = set(keyword.upper() for keyword in keywords)
+        if any(tag not in meta["tags"] for tag in tags):
+            return []
+
+        postings = sorted((LogIndex.openList(os.path.join("tags", tag + ".bin"), meta["tags"][tag]) for tag in tags), key=len)
+        matches = []
+        for offset in postings[0]:
+            found = True
+            for other in postings[1:]:
+                position = bisect.bisect_left(other, offset)
+                if position == len(other) or other[position] != offset:
+                    found = False
+                    break
+            if found:
+                matches.append(offset)
+        return matches
+
+    @staticmethod
+    def filterByTags(meta, keywords):
+        """Returns log lines carrying all of the given tags."""
+        return list(LogIndex.readLinesAt(LogIndex.offsetsForTags(meta, keywords)))
+
+    @staticmethod
+    def offsetForMinute(meta, minute):
+        """Byte offset of the first line logged at or after `minute`, or None if there is none."""
+        entries = LogIndex.openList("time.bin", meta["time"] * 2)
+        minutes = entries[0::2]
+        position = bisect.bisect_left(minutes, minute)
+        if position == len(minutes):
+            return None
+        return entries[position * 2 + 1]
+
+    @staticmethod
+    def offsetRange(meta, sinceMinute, untilMinute=None):
+        """Returns the (start, end) byte offsets of lines logged from `sinceMinute` up to and including `untilMinute`, or None if there are none."""
+        startOffset = LogIndex.offsetForMinute(meta, sinceMinute)
+        if startOffset is None:
+            return None
+        endOffset = meta["indexedBytes"]
+        if untilMinute is not None:
+            untilOffset = LogIndex.offsetForMinute(meta, untilMinute + 1)
+            if untilOffset is not None:
+                endOffset = untilOffset
+        return startOffset, endOffset
+
+    @staticmethod
+    def readBetween(meta, sinceMinute, untilMinute=None):
+        offsets = LogIndex.offsetRange(meta, sinceMinute, untilMinute)
+        if offsets is None:
+            return []
+        return list(LogIndex.readRange(*offsets))
+
+class LogAnalysis:
+    """
+    Streaming triage of `MakanMatchLogs.txt`: per-minute line and ERROR counts, the most frequent log tag combinations, and bursts of unusual log volume.
+
+    The logs file is read in fixed-size chunks through a generator pipeline and each line is reduced to its raw (minute prefix, tag block) pair, counted as-is.
+    Timestamps and tag blocks are then parsed once per distinct pair rather than once per line, so memory grows with the number of distinct minutes and tag combinations, never with the size of the file.
+    Timelines, combination rankings and burst detection are computed with NumPy over the per-minute counts.
+    """
+
+    chunkSize = 8 * 1024 * 1024
+    untagged = "(untagged)"
+    burstWindow = 30
+    burstMinimumHistory = 5
+    burstThreshold = 5.0
+    burstMinimumLines = 20
+    maxTimelineRows = 60
+
+    @staticmethod
+    def chunks(startOffset=0, endOffset=None):
+        """Yields lists of complete raw lines, one list per chunk read."""
+        with open(Logger.logsFile, "rb") as f:
+            f.seek(startOffset)
+            remaining = None if endOffset is None else endOffset - startOffset
+            # A trailing line without a newline is still being written and is left out, as in `LogIndex.update`
+            carry = b""
+            while remaining is None or remaining > 0:
+                data = f.read(LogAnalysis.chunkSize if remaining is None else min(LogAnalysis.chunkSize, remaining))
+                if not data:
+                    break
+                if remaining is not None:
+                    remaining -= len(data)
+                lines = (carry + data).split(b"\n")
+                # The last piece is either empty or a line continued in the next chunk
+                carry = lines.pop()
+                yield lines
+
+    @staticmethod
+    def keysOf(lines):
+        """Reduces raw lines to (minute prefix, tag block) pairs. The tag block sits between the timestamp and the first colon, as in `LogIndex.tagsOf`."""
+        for line in lines:
+            if len(line) < 25:
+                continue
+            colonIndex = line.find(b":", 24)
+            yield (line[:16], line[24:colonIndex] if colonIndex != -1 else b"")
+
+    @staticmethod
+    def countKeys(startOffset=0, endOffset=None):
+        counts = collections.Counter()
+        for lines in LogAnalysis.chunks(startOffset, endOffset):
+            counts.update(LogAnalysis.keysOf(lines))
+        return counts
+
+    @staticmethod
+    def comboOf(block):
+        tags = [tag for tag in block.decode("utf-8", errors="replace").upper().split() if LogIndex.tagPattern.fullmatch(tag)]
+        return " ".join(tags) if len(tags) > 0 else LogAnalysis.untagged
+
+    @staticmethod
+    def analyse(startOffset=0, endOffset=None):
+        """
+        Scans the logs file (or the given byte range of it) and returns the aggregated counts used by the reports:
+        `minutes` (epoch minute of each distinct key), `combos` (index into `comboNames` of each key), `counts` (lines per key), `comboNames`, `comboErrors` (whether each combination carries the ERROR tag), `lines` and `unparsed` (lines without a readable timestamp).
+        """
+        np = AnalyticsWarehouse.numpy()
+        counts = LogAnalysis.countKeys(startOffset, endOffset)
+
+        minuteCache = {}
+        comboIDs = {}
+        comboNames = []
+        minutes = []
+        combos = []
+        keyCounts = []
+        unparsed = 0
+        for (prefix, block), count in counts.items():
+            if prefix not in minuteCache:
+                minuteCache[prefix] = LogIndex.minuteOf(prefix)
+            minute = minuteCache[prefix]
+            if minute is None:
+                unparsed += count
+                continue
+
+            combo = LogAnalysis.comboOf(block)
+            if combo not in comboIDs:
+                comboIDs[combo] = len(comboNames)
+                comboNames.append(combo)
+            minutes.append(minute)
+            combos.append(comboIDs[combo])
+            keyCounts.append(count)
+
+        return {
+            "minutes": np.array(minutes, dtype=np.int64),
+            "combos": np.array(combos, dtype=np.int64),
+            "counts": np.array(keyCounts, dtype=np.int64),
+            "comboNames": comboNames,
+            "comboErrors": np.array(["ERROR" in combo.split() for combo in comboNames], dtype=bool),
+            "lines": int(sum(keyCounts)) + unparsed,
+            "unparsed": unparsed
+        }
+
+    @staticmethod
+    def perMinute(result, errorsOnly=False):
+        """Returns (first minute, lines per minute from the first to the last minute, zero-filled)."""
+        np = AnalyticsWarehouse.numpy()
+        if len(result["minutes"]) == 0:
+            return None, np.zeros(0, dtype=np.int64)
+        firstMinute = int(result["minutes"].min())
+        weights = result["counts"]
+        if errorsOnly:
+            weights = np.where(result["comboErrors"][result["combos"]], weights, 0)
+        series = np.bincount(result["minutes"] - firstMinute, weights=weights, minlength=int(result["minutes"].max()) - firstMinute + 1)
+        return firstMinute, series.astype(np.int64)
+
+    @staticmethod
+    def minuteLabel(minute):
+        return datetime.datetime.fromtimestamp(int(minute) * 60, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M")
+
+    @staticmethod
+    def timeline(result, bucketMinutes=None):
+        """Lines, ERROR lines and ERROR rate per bucket of minutes. Buckets are widened automatically to keep the timeline to `maxTimelineRows` rows unless given."""
+        np = AnalyticsWarehouse.numpy()
+        firstMinute, lines = LogAnalysis.perMinute(result)
+        if firstMinute is None:
+            return []
+        _, errors = LogAnalysis.perMinute(result, errorsOnly=True)
+
+        if bucketMinutes is None:
+            bucketMinutes = 1
+            for candidate in [1, 5, 15, 30, 60, 180, 360, 720, 1440, 10080]:
+                bucketMinutes = candidate
+                if -(-len(lines) // candidate) <= LogAnalysis.maxTimelineRows:
+                    break
+        buckets = np.arange(len(lines)) // bucketMinutes
+        bucketLines = np.bincount(buckets, weights=lines).astype(np.int64)
+        bucketErrors = np.bincount(buckets, weights=errors).astype(np.int64)
+        peakRate = max(float((bucketErrors / np.maximum(bucketLines, 1)).max()), 1e-9)
+
+        rows = []
+        for bucket in range(len(bucketLines)):
+            rate = bucketErrors[bucket] / bucketLines[bucket] if bucketLines[bucket] > 0 else 0.0
+            rows.append({
+                "from": LogAnalysis.minuteLabel(firstMinute + bucket * bucketMinutes),
+                "lines": int(bucketLines[bucket]),
+                "errors": int(bucketErrors[bucket]),
+                "errorRate": "{:.1f}%".format(rate * 100),
+                "bar": "#" * int(round(rate / peakRate * 20))
+            })
+        return rows
+
+    @staticmethod
+    def topCombos(result, top=10):
+        np = AnalyticsWarehouse.numpy()
+        if len(result["counts"]) == 0:
+            return []
+        totals = np.bincount(result["combos"], weights=result["counts"], minlength=len(result["comboNames"])).astype(np.int64)
+        counted = max(int(totals.sum()), 1)
+        rows = []
+        for comboID in np.argsort(-totals, kind="stable")[:top]:
+            rows.append({
+                "combo": result["comboNames"][comboID],
+                "lines": int(totals[comboID]),
+                "share": "{:.1f}%".format(totals[comboID] / counted * 100),
+                "error": "yes" if result["comboErrors"][comboID] else ""
+            })
+        return rows
+
+    @staticmethod
+    def topCombosBetween(result, startMinute, endMinute, top=3, errorsOnly=False):
+        np = AnalyticsWarehouse.numpy()
+        mask = (result["minutes"] >= startMinute) & (result["minutes"] <= endMinute)
+        if errorsOnly:
+            mask &= result["comboErrors"][result["combos"]]
+        totals = np.bincount(result["combos"][mask], weights=result["counts"][mask], minlength=len(result["comboNames"])).astype(np.int64)
+        return ["{} ({})".format(result["comboNames"][comboID], int(totals[comboID])) for comboID in np.argsort(-totals, kind="stable")[:top] if totals[comboID] > 0]
+
+    @staticmethod
+    def bursts(result, errorsOnly=False, window=None, threshold=None, minimumLines=None):
+        """
+        Minutes whose line count exceeds the mean of the preceding `window` minutes (fewer at the start of the logs, but at least `burstMinimumHistory`) by `threshold` standard deviations and is at least `minimumLines` lines, merged into runs of consecutive minutes.
+        Returns each burst's time range, total and peak lines per minute, the baseline it was measured against and the tag combinations behind it.
+        """
+        np = AnalyticsWarehouse.numpy()
+        window = window or LogAnalysis.burstWindow
+        threshold = threshold or LogAnalysis.burstThreshold
+        minimumLines = minimumLines or LogAnalysis.burstMinimumLines
+
+        firstMinute, series = LogAnalysis.perMinute(result, errorsOnly)
+        history = LogAnalysis.burstMinimumHistory
+        if firstMinute is None or len(series) <= history:
+            return []
+
+        # Trailing mean and standard deviation of the minutes before each minute t, from cumulative sums
+        values = series.astype(np.float64)
+        sums = np.concatenate(([0.0], np.cumsum(values)))
+        squares = np.concatenate(([0.0], np.cumsum(values * values)))
+        positions = np.arange(history, len(values))
+        windowStarts = np.maximum(positions - window, 0)
+        lengths = positions - windowStarts
+        means = (sums[positions] - sums[windowStarts]) / lengths
+        deviations = np.sqrt(np.maximum((squares[positions] - squares[windowStarts]) / lengths - means * means, 0))
+        # A floor of one line per minute stops a perfectly flat baseline from flagging every small rise
+        candidates = values[history:]
+        flagged = (candidates >= minimumLines) & (candidates > means + threshold * np.maximum(deviations, 1.0))
+
+        bursts = []
+        flaggedMinutes = np.flatnonzero(flagged) + history
+        if len(flaggedMinutes) == 0:
+            return bursts
+        runs = np.split(flaggedMinutes, np.flatnonzero(np.diff(flaggedMinutes) != 1) + 1)
+        for run in runs:
+            startMinute = firstMinute + int(run[0])
+            endMinute = firstMinute + int(run[-1])
+            bursts.append({
+                "from": LogAnalysis.minuteLabel(startMinute),
+                "to": LogAnalysis.minuteLabel(endMinute),
+                "lines": int(series[run].sum()),
+                "peakPerMinute": int(series[run].max()),
+                "baselinePerMinute": round(float(means[run[0] - history]), 1),
+                "topCombos": ", ".join(LogAnalysis.topCombosBetween(result, startMinute, endMinute, errorsOnly=errorsOnly))
+            })
+        return bursts
+
+    @staticmethod
+    def report(result, top=10, bucketMinutes=None):
+        return {
+            "lines": result["lines"],
+            "unparsed": result["unparsed"],
+            "errors": int(result["counts"][result["comboErrors"][result["combos"]]].sum()) if len(result["counts"]) > 0 else 0,
+            "timeline": LogAnalysis.timeline(result, bucketMinutes),
+            "topCombos": LogAnalysis.topCombos(result, top),
+            "bursts": LogAnalysis.bursts(result),
+            "errorBursts": LogAnalysis.bursts(result, errorsOnly=True)
+        }
+
+    @staticmethod
+    def printReport(report):
+        print()
+        print("Analysed {} log lines ({} ERROR, {} without a timestamp).".format(report["lines"], report["errors"], report["unparsed"]))
+        print()
+        print("ERROR rate timeline (UTC):")
+        AnalyticsWarehouse.printTable(report["timeline"], ["from", "lines", "errors", "errorRate", "bar"])
+        print()
+        print("Top log tag combinations:")
+        AnalyticsWarehouse.printTable(report["topCombos"], ["combo", "lines", "share", "error"])
+        print()
+        print("Log volume bursts:")
+        AnalyticsWarehouse.printTable(report["bursts"], ["from", "to", "lines", "peakPerMinute", "baselinePerMinute", "topCombos"])
+        print()
+        print("ERROR bursts:")
+        AnalyticsWarehouse.printTable(report["errorBursts"], ["from", "to", "lines", "peakPerMinute", "baselinePerMinute", "topCombos"])
+
+class Logger:
+    logsFile = "MakanMatchLogs.txt"
+    cursorFile = "MakanMatchLogs.cursor.json"
+    tailSize = 50
+
+    @staticmethod
+    def filesFor(nodeName=None):
+        """Returns the (logs file, cursor file) pair for a fleet node, or the default pair when no node name is given."""
+        if nodeName is None:
+            return Logger.logsFile, Logger.cursorFile
+        return "MakanMatchLogs.{}.txt".format(nodeName), "MakanMatchLogs.{}.cursor.json".format(nodeName)
+
+    @staticmethod
+    def readCursor(client, nodeName=None):
+        """Returns the byte offset up to which the server's logs have been saved locally, or None if there is no usable cursor for this server."""
+        logsFile, cursorFile = Logger.filesFor(nodeName)
+        if not os.path.exists(logsFile) or not os.path.exists(cursorFile):
+            return None
+        try:
+            with open(cursorFile, "r") as f:
+                cursorData = json.load(f)
+            if cursorData.get("baseURL") != client.baseURL:
+                return None
+            return int(cursorData["cursor"])
+        except Exception:
+            return None
+
+    @staticmethod
+    def saveCursor(client, cursor, nodeName=None):
+        with open(Logger.filesFor(nodeName)[1], "w") as f:
+            json.dump({ "baseURL": client.baseURL, "cursor": cursor }, f)
+
+    @staticmethod
+    def fetchNewLogs(client, fromStart=False, tailSize=None, nodeName=None):
+        """
+        Streams logs from the server, starting at the saved cursor, straight into `MakanMatchLogs.txt` (or `MakanMatchLogs.<nodeName>.txt` for a fleet node).
+
+        Only the newest `tailSize` entries are kept in memory. If the stream fails midway, the local file is truncated back so the next fetch resumes cleanly.
+        Returns a tuple of (number of entries saved, tail of new entries).
+        """
+        tailSize = tailSize or Logger.tailSize
+        cursor = None if fromStart else Logger.readCursor(client, nodeName)
+
+        logsResponse = client.post(
+            "/admin/super/getLogs",
+            json={
+                "stream": True,
+                "cursor": cursor or 0
+            },
+            stream=True,
+            idempotent=True
+        )
+        with logsResponse:
+            if not logsResponse.ok:
+                client.checkResponse(logsResponse, expectSuccess=False)
+            if "LogCursor" not in logsResponse.headers:
+                raise Exception("Server does not support streamed log retrieval.")
+
+            if cursor is not None and logsResponse.headers.get("LogCursorReset") == "True":
+                print("Server logs were reset since the last retrieval. Re-downloading from the start.", file=sys.stderr)
+                cursor = None
+            elif int(logsResponse.headers.get("LogCursorStart", cursor or 0)) > (cursor or 0):
+                print("{} bytes of older server logs were rotated out before they could be retrieved.".format(int(logsResponse.headers["LogCursorStart"]) - (cursor or 0)), file=sys.stderr)
+
+            mode = "wb" if cursor is None else "ab"
+            tail = collections.deque(maxlen=tailSize)
+            savedCount = 0
+            with open(Logger.filesFor(nodeName)[0], mode) as f:
+                startSize = f.tell()
+                try:
+                    for line in logsResponse.iter_lines(chunk_size=65536):
+                        if not line:
+                            continue
+                        f.write(line + b"\n")
+                        tail.append(line.decode("utf-8", errors="replace"))
+                        savedCount += 1
+                except Exception:
+                    f.truncate(startSize)
+                    raise
+
+        Logger.saveCursor(client, int(logsResponse.headers["LogCursor"]), nodeName)
+        return savedCount, list(tail)
+
+    @staticmethod
+    def tail(count):
+        """
+        Returns the last `count` non-empty lines of `MakanMatchLogs.txt`.
+
+        Scans backwards from the end of a memory-mapped view of the file, so only the pages holding those lines are read, whatever the size of the file.
+        """
+        if not os.path.exists(Logger.logsFile) or os.path.getsize(Logger.logsFile) == 0:
+            return []
+
+        lines = []
+        with open(Logger.logsFile, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            position = len(mapped)
+            while position > 0 and len(lines) < count:
+                lineStart = mapped.rfind(b"\n", 0, position) + 1
+                line = mapped[lineStart:position].rstrip(b"\r")
+                if line:
+                    lines.append(line.decode("utf-8", errors="replace"))
+                position = lineStart - 1
+
+        lines.reverse()
+        return lines
+
+    @staticmethod
+    def follow(client, interval):
+        """Polls the server for new logs every `interval` seconds, appending them to `MakanMatchLogs.txt` and printing them until interrupted."""
+        print("LOGGER: Following server logs every {} seconds. Press Ctrl+C to stop.".format(interval))
+        print()
+        fromStart = Logger.readCursor(client) is None
+        try:
+            while True:
+                try:
+                    savedCount, tail = Logger.fetchNewLogs(client, fromStart=fromStart)
+                    fromStart = False
+                    if savedCount > len(tail):
+                        print("\t... ({} earlier entries saved to {})".format(savedCount - len(tail), Logger.logsFile))
+                    for log in tail:
+                        print("\t{}".format(log))
+                    if savedCount > 0:
+                        LogIndex.update()
+                except requests.RequestException as e:
+                    print("LOGGER: Failed to poll logs, will retry. Error: {}".format(e))
+
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print()
+            print("LOGGER: Stopped following logs.")
+
+    @staticmethod
+    def readAll():
+        """Returns a lazy iterator over all saved log lines."""
+        if not os.path.exists(Logger.logsFile):
+            return iter([])
+        return LogIndex.readRange(0)
+
+    @staticmethod
+    def fetchManifest(client):
+        """Returns the server's log segments and live logs file, with the cursor range and time span of each."""
+        response = client.post("/admin/super/getLogs", json={ "manifest": True }, idempotent=True)
+        client.checkResponse(response, expectSuccess=False)
+        return response.json()
+      
+    @staticmethod
+    def manageLogs():
+        print("LOGGER: Welcome to the Logging Management Console.")
+        while True:
+            print("""
+Commands:
+    read <number of lines, e.g 50 (optional)>: Reads the last <number of lines> of logs. If no number is specified, all logs will be displayed.
+    read .filter <keywords>: Reads logs carrying all of the given log tags, e.g. read .filter superuserapi error
+    read .since <start datetime, e.g. 2024-07-01T00:00> <end datetime (optional)>: Reads logs written in the given time range (UTC).
+    follow <poll interval in seconds (optional, default 5)>: Polls the server for new logs, saving and displaying them as they arrive.
+    segments: Lists the server's rotated log segments and how much of them has been saved locally.
+    analyse <number of top tag combinations (optional, default 10)>: ERROR rate timeline, most frequent log tag combinations and bursts of log volume.
+    analyse .since <start datetime> <end datetime (optional)>: The same analysis for logs written in the given time range (UTC).
+    exit: Exit the Logging Management Console.
+""")
+    
+            userChoice = input("Enter command: ")
+            userChoice = userChoice.lower()
+            while not userChoice.startswith("read") and not userChoice.startswith("follow") and not userChoice.startswith("analyse") and (userChoice != "segments") and (userChoice != "destroy") and (userChoice != "exit"):
+                userChoice = input("Invalid command. Enter command: ")
+                userChoice = userChoice.lower()
+    
+            if userChoice.startswith("read"):
+                targetLogs = []
+                userChoice = userChoice.split()
+
+                indexMeta = None
+                if len(userChoice) > 1 and userChoice[1] in [".filter", ".since"]:
+                    try:
+                        indexMeta = LogIndex.update()
+                    except Exception as e:
+                        print("LOGGER: Failed to update logs index. Error: {}".format(e))
+                        continue
+
+                # Log filtering feature
+                if len(userChoice) == 1:
+                    targetLogs = Logger.readAll()
+                elif userChoice[1] == ".filter":
+                    if len(userChoice) < 3:
+                        print("Invalid log filter. Format: read .filter <keywords>")
+                        continue
+                    else:
+                        try:
+                            keywords = userChoice[2:]
+                            targetLogs = LogIndex.filterByTags(indexMeta, keywords)
+                                
+                            print("Filtered logs with keywords: {}".format(keywords))
+                            print()
+                        except Exception as e:
+                            print("LOGGER: Failed to parse and filter logs. Error: {}".format(e))
+                            continue
+                elif userChoice[1] == ".since":
+                    if len(userChoice) < 3 or len(userChoice) > 4:
+                        print("Invalid time range. Format: read .since <start datetime> <end datetime (optional)>")
+                        continue
+                    try:
+                        sinceMinute = LogIndex.parseMinute(userChoice[2].upper())
+                        untilMinute = LogIndex.parseMinute(userChoice[3].upper()) if len(userChoice) == 4 else None
+                        targetLogs = LogIndex.readBetween(indexMeta, sinceMinute, untilMinute)
+                    except Exception as e:
+                        print("LOGGER: Failed to read logs in time range. Error: {}".format(e))
+                        continue
+                else:
+                    logCount = 0
+                    try:
+                        logCount = int(userChoice[1])
+                        if logCount <= 0:
+                            raise Exception("Invalid log count. Must be a positive integer above 0 lower than or equal to the total number of logs.")
+                        
+                        targetLogs = Logger.tail(logCount)
+                    except Exception as e:
+                        print("LOGGER: Failed to read logs. Error: {}".format(e))
+                        continue
+
+                print()
+                if isinstance(targetLogs, list):
+                    print("Displaying {} log entries:".format(len(targetLogs)))
+                else:
+                    print("Displaying all log entries:")
+                print()
+                for log in targetLogs:
+                    print("\t{}".format(log))
+            elif userChoice.startswith("follow"):
+                userChoice = userChoice.split()
+                interval = 5
+                if len(userChoice) > 1:
+                    try:
+                        interval = float(userChoice[1])
+                        if interval <= 0:
+                            raise Exception("Poll interval must be a positive number of seconds.")
+                    except Exception as e:
+                        print("LOGGER: Invalid poll interval. Error: {}".format(e))
+                        continue
+
+                Logger.follow(client, interval)
+            elif userChoice == "segments":
+                try:
+                    manifest = Logger.fetchManifest(client)
+                except Exception as e:
+                    print("LOGGER: Failed to retrieve log segments. Error: {}".format(e))
+                    continue
+
+                savedUpTo = Logger.readCursor(client) or 0
+                rows = []
+                for segment in manifest["segments"] + [dict(manifest["active"], segment="live", compressed=False)]:
+                    rows.append({
+                        "segment": segment["segment"],
+                        "file": segment["file"],
+                        "sizeKB": round((segment["end"] - segment["start"]) / 1024, 1),
+                        "from": segment["firstLog"] or "-",
+                        "to": segment["lastLog"] or "-",
+                        "saved": "yes" if savedUpTo >= segment["end"] else ("partly" if savedUpTo > segment["start"] else "no")
+                    })
+                print()
+                AnalyticsWarehouse.printTable(rows, ["segment", "file", "sizeKB", "from", "to", "saved"])
+            elif userChoice.startswith("analyse"):
+                userChoice = userChoice.split()
+                top = 10
+                offsets = (0, None)
+                try:
+                    if len(userChoice) > 1 and userChoice[1] == ".since":
+                        if len(userChoice) < 3 or len(userChoice) > 4:
+                            raise Exception("Invalid time range. Format: analyse .since <start datetime> <end datetime (optional)>")
+                        indexMeta = LogIndex.update()
+                        offsets = LogIndex.offsetRange(indexMeta, LogIndex.parseMinute(userChoice[2].upper()), LogIndex.parseMinute(userChoice[3].upper()) if len(userChoice) == 4 else None)
+                        if offsets is None:
+                            print("No logs were written in the given time range.")
+                            continue
+                    elif len(userChoice) > 1:
+                        top = int(userChoice[1])
+                        if top <= 0:
+                            raise Exception("Number of tag combinations must be a positive integer.")
+
+                    if not os.path.exists(Logger.logsFile):
+                        print("No logs saved locally yet. Use 'read' or 'follow' to retrieve logs first.")
+                        continue
+                    LogAnalysis.printReport(LogAnalysis.report(LogAnalysis.analyse(*offsets), top))
+                except Exception as e:
+                    print("LOGGER: Failed to analyse logs. Error: {}".format(e))
+                    continue
+            elif userChoice == "exit":
+                print("LOGGER: Exiting Logging Management Console...")
+                break
+    
+        return
+
+class AnalyticsWarehouse:
+    """
+    Local time-series warehouse of analytics snapshots, stored column-wise for vectorised rollups with NumPy.
+
+    Stored in `MakanMatchAnalytics.warehouse/`:
+    - `timestamps.bin`: epoch seconds of each snapshot
+    - `<table>.entities.txt`: listing IDs / `METHOD URL` routes, in the order they were first seen (append-only)
+    - `<table>.lengths.bin`: number of entities recorded in each snapshot; entities are append-only, so every snapshot is a prefix of the entity list
+    - `<table>.<metric>.bin`: the metric's values for each snapshot, concatenated
+    - `meta.json`: snapshot count and metrics per table
+
+    Snapshots are taken from the local `AnalyticsStore` after an incremental pull, so scheduling them often stays cheap. Counter deltas treat a decrease as a counter reset.
+    """
+
+    directory = "MakanMatchAnalytics.warehouse"
+    tables = {
+        "listing": ("listingMetrics", lambda row: row["listingID"]),
+        "request": ("requestMetrics", lambda row: "{} {}".format(row["method"], row["requestURL"])),
+        "system": ("systemMetrics", lambda row: "system")
+    }
+    ignoredColumns = ["listingID", "requestURL", "method", "instanceID", "createdAt", "updatedAt"]
+
+    @staticmethod
+    def numpy():
+        try:
+            import numpy
+            return numpy
+        except ImportError:
+            raise Exception("The analytics warehouse requires NumPy. Install it with `pip install numpy`.")
+
+    @staticmethod
+    def path(*parts):
+        return os.path.join(AnalyticsWarehouse.directory, *parts)
+
+    @staticmethod
+    def loadMeta():
+        try:
+            with open(AnalyticsWarehouse.path("meta.json"), "r") as f:
+                return json.load(f)
+        except Exception:
+            return { "snapshots": 0, "metrics": { table: [] for table in AnalyticsWarehouse.tables } }
+
+    @staticmethod
+    def saveMeta(meta):
+        tempPath = AnalyticsWarehouse.path("meta.json.tmp")
+        with open(tempPath, "w") as f:
+            json.dump(meta, f)
+        os.replace(tempPath, AnalyticsWarehouse.path("meta.json"))
+
+    @staticmethod
+    def readEntities(table):
+        if not os.path.exists(AnalyticsWarehouse.path(table + ".entities.txt")):
+            return []
+        with open(AnalyticsWarehouse.path(table + ".entities.txt"), "r") as f:
+            return f.read().splitlines()
+
+    @staticmethod
+    def appendValues(fileName, values, expectedCount):
+        # Truncate to the length recorded in meta first, discarding anything written by an interrupted snapshot
+        with open(AnalyticsWarehouse.path(fileName), "ab") as f:
+            f.truncate(expectedCount * 8)
+            values.tofile(f)
+
+    @staticmethod
+    def snapshot(data, timestamp=None):
+        """Appends one snapshot of analytics `data` (in the shape of a full `getAnalytics` response). Returns the number of snapshots stored."""
+        np = AnalyticsWarehouse.numpy()
+        os.makedirs(AnalyticsWarehouse.directory, exist_ok=True)
+        meta = AnalyticsWarehouse.loadMeta()
+        timestamp = int(timestamp if timestamp is not None else time.time())
+
+        for table, (dataKey, entityOf) in AnalyticsWarehouse.tables.items():
+            rows = data[dataKey] if isinstance(data[dataKey], list) else [data[dataKey]]
+            entities = AnalyticsWarehouse.readEntities(table)
+            lengths = AnalyticsWarehouse.load(table, "lengths", meta)
+            recorded = int(lengths.sum())
+
+            positions = { entity: position for position, entity in enumerate(entities) }
+            newEntities = []
+            for row in rows:
+                entity = entityOf(row)
+                if entity not in positions:
+                    positions[entity] = len(entities) + len(newEntities)
+                    newEntities.append(entity)
+            if newEntities:
+                with open(AnalyticsWarehouse.path(table + ".entities.txt"), "a") as f:
+                    f.write("".join(entity + "\n" for entity in newEntities))
+            entityCount = len(entities) + len(newEntities)
+
+            # Metrics first seen in this snapshot are back-filled with zeros for earlier snapshots
+            for row in rows:
+                for metric, value in row.items():
+                    if metric in meta["metrics"][table] or metric in AnalyticsWarehouse.ignoredColumns:
+                        continue
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        AnalyticsWarehouse.appendValues("{}.{}.bin".format(table, metric), np.zeros(recorded, dtype=np.int64), 0)
+                        meta["metrics"][table].append(metric)
+
+            for metric in meta["metrics"][table]:
+                values = np.zeros(entityCount, dtype=np.int64)
+                for row in rows:
+                    value = row.get(metric)
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        values[positions[entityOf(row)]] = value
+                AnalyticsWarehouse.appendValues("{}.{}.bin".format(table, metric), values, recorded)
+            AnalyticsWarehouse.appendValues(table + ".lengths.bin", np.array([entityCount], dtype=np.int64), meta["snapshots"])
+
+        AnalyticsWarehouse.appendValues("timestamps.bin", np.array([timestamp], dtype=np.int64), meta["snapshots"])
+        meta["snapshots"] += 1
+        AnalyticsWarehouse.saveMeta(meta)
+        return meta["snapshots"]
+
+    @staticmethod
+    def load(table, metric, meta):
+        """Reads a stored column. `lengths` and `timestamps` are returned as is; metrics are returned as a (snapshots x entities) matrix."""
+        np = AnalyticsWarehouse.numpy()
+        fileName = "timestamps.bin" if metric == "timestamps" else "{}.{}.bin".format(table, metric)
+        if not os.path.exists(AnalyticsWarehouse.path(fileName)):
+            values = np.zeros(0, dtype=np.int64)
+        else:
+            values = np.fromfile(AnalyticsWarehouse.path(fileName), dtype=np.int64)
+        if metric in ["lengths", "timestamps"]:
+            return values[:meta["snapshots"]]
+
+        lengths = AnalyticsWarehouse.load(table, "lengths", meta)
+        values = values[:int(lengths.sum())]
+        matrix = np.zeros((len(lengths), int(lengths.max()) if len(lengths) else 0), dtype=np.int64)
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        columns = np.arange(len(values)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        matrix[rows, columns] = values
+        return matrix
+
+    @staticmethod
+    def counterDeltas(matrix):
+        """Per-interval increases of a counter matrix. A decrease means the counter was reset, so the new value is the increase."""
+        np = AnalyticsWarehouse.numpy()
+        deltas = np.diff(matrix, axis=0)
+        return np.where(deltas < 0, matrix[1:], deltas)
+
+    @staticmethod
+    def windowStart(timestamps, windowSeconds):
+        np = AnalyticsWarehouse.numpy()
+        if windowSeconds is None:
+            return 0
+        return int(min(np.searchsorted(timestamps, timestamps[-1] - windowSeconds), len(timestamps) - 2))
+
+    @staticmethod
+    def routeRollup(windowSeconds=None, top=None):
+        """Per-route request rate (per minute) and success ratio over the window ending at the latest snapshot, busiest routes first."""
+        np = AnalyticsWarehouse.numpy()
+        meta = AnalyticsWarehouse.loadMeta()
+        if meta["snapshots"] < 2:
+            raise Exception("At least two snapshots are needed to compute rates.")
+
+        timestamps = AnalyticsWarehouse.load(None, "timestamps", meta)
+        start = AnalyticsWarehouse.windowStart(timestamps, windowSeconds)
+        requestCounts = AnalyticsWarehouse.counterDeltas(AnalyticsWarehouse.load("request", "requestsCount", meta)[start:]).sum(axis=0)
+        successes = AnalyticsWarehouse.counterDeltas(AnalyticsWarehouse.load("request", "successResponses", meta)[start:]).sum(axis=0)
+        minutes = max((timestamps[-1] - timestamps[start]) / 60, 1 / 60)
+
+        rates = requestCounts / minutes
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(requestCounts > 0, successes / requestCounts, np.nan)
+
+        order = np.argsort(-rates, kind="stable")[:top]
+        routes = AnalyticsWarehouse.readEntities("request")
+        return {
+            "from": int(timestamps[start]),
+            "to": int(timestamps[-1]),
+            "routes": [{
+                "route": routes[index],
+                "requests": int(requestCounts[index]),
+                "requestsPerMinute": round(float(rates[index]), 3),
+                "successRatio": None if np.isnan(ratios[index]) else round(float(ratios[index]), 4)
+            } for index in order]
+        }
+
+    @staticmethod
+    def topListings(k=10, by="ctr", windowSeconds=None, minImpressions=1):
+        """Top `k` listings by `ctr`, `impressions` or `clicks`, over the window ending at the latest snapshot (all-time totals if no window is given)."""
+        np = AnalyticsWarehouse.numpy()
+        meta = AnalyticsWarehouse.loadMeta()
+        if meta["snapshots"] == 0:
+            raise Exception("No snapshots have been taken yet.")
+
+        impressions = AnalyticsWarehouse.load("listing", "impressions", meta)
+        clicks = AnalyticsWarehouse.load("listing", "clicks", meta)
+        if windowSeconds is None or meta["snapshots"] < 2:
+            impressions, clicks = impressions[-1], clicks[-1]
+        else:
+            start = AnalyticsWarehouse.windowStart(AnalyticsWarehouse.load(None, "timestamps", meta), windowSeconds)
+            impressions = AnalyticsWarehouse.counterDeltas(impressions[start:]).sum(axis=0)
+            clicks = AnalyticsWarehouse.counterDeltas(clicks[start:]).sum(axis=0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ctr = np.where(impressions >= max(minImpressions, 1), clicks / impressions, -1.0)
+        scores = { "ctr": ctr, "impressions": impressions, "clicks": clicks }[by]
+
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        listings = AnalyticsWarehouse.readEntities("listing")
+        return [{
+            "listingID": listings[index],
+            "impressions": int(impressions[index]),
+            "clicks": int(clicks[index]),
+            "ctr": None if ctr[index] < 0 else round(float(ctr[index]), 4)
+        } for index in candidates if by != "ctr" or ctr[index] >= 0]
+
+    @staticmethod
+    def delta(fromIndex=-2, toIndex=-1, top=10):
+        """Changes between two snapshots (negative indexes count from the latest): system metric deltas and the routes and listings that grew the most."""
+        np = AnalyticsWarehouse.numpy()
+        meta = AnalyticsWarehouse.loadMeta()
+        if meta["snapshots"] < 2:
+            raise Exception("At least two snapshots are needed to compute deltas.")
+        timestamps = AnalyticsWarehouse.load(None, "timestamps", meta)
+        fromIndex, toIndex = range(meta["snapshots"])[fromIndex], range(meta["snapshots"])[toIndex]
+
+        result = { "from": int(timestamps[fromIndex]), "to": int(timestamps[toIndex]) }
+        for table, metric in [("system", None), ("request", "requestsCount"), ("listing", "impressions"), ("listing", "clicks")]:
+            if table == "system":
+                result["systemMetrics"] = {}
+                for systemMetric in meta["metrics"]["system"]:
+                    matrix = AnalyticsWarehouse.load("system", systemMetric, meta)
+                    result["systemMetrics"][systemMetric] = int(matrix[toIndex, 0] - matrix[fromIndex, 0])
+                continue
+            if metric not in meta["metrics"][table]:
+                continue
+
+            matrix = AnalyticsWarehouse.load(table, metric, meta)
+            change = matrix[toIndex] - matrix[fromIndex]
+            order = np.argsort(-change, kind="stable")[:top]
+            entities = AnalyticsWarehouse.readEntities(table)
+            result["{}.{}".format(table, metric)] = [{ "entity": entities[index], "change": int(change[index]) } for index in order if change[index] != 0]
+        return result
+
+    @staticmethod
+    def dailyTrends(days=None):
+        """Per-day totals of request, success and system counter increases, for capacity trends across many snapshots."""
+        np = AnalyticsWarehouse.numpy()
+        meta = AnalyticsWarehouse.loadMeta()
+        if meta["snapshots"] < 2:
+            raise Exception("At least two snapshots are needed to compute trends.")
+
+        timestamps = AnalyticsWarehouse.load(None, "timestamps", meta)
+        dayOf = timestamps[1:] // 86400
+        dayBoundaries = np.flatnonzero(np.diff(dayOf)) + 1
+        segmentStarts = np.concatenate(([0], dayBoundaries))
+
+        columns = {
+            "requests": AnalyticsWarehouse.counterDeltas(AnalyticsWarehouse.load("request", "requestsCount", meta)).sum(axis=1),
+            "successResponses": AnalyticsWarehouse.counterDeltas(AnalyticsWarehouse.load("request", "successResponses", meta)).sum(axis=1)
+        }
+        for systemMetric in meta["metrics"]["system"]:
+            columns[systemMetric] = AnalyticsWarehouse.counterDeltas(AnalyticsWarehouse.load("system", systemMetric, meta))[:, 0]
+
+        totals = { name: np.add.reduceat(values, segmentStarts) for name, values in columns.items() }
+        trends = []
+        for position, start in enumerate(segmentStarts):
+            day = { "day": datetime.datetime.fromtimestamp(int(dayOf[start]) * 86400, datetime.timezone.utc).strftime("%Y-%m-%d") }
+            day.update({ name: int(values[position]) for name, values in totals.items() })
+            trends.append(day)
+        return trends[-days:] if days else trends
+
+    @staticmethod
+    def pullSnapshot(client):
+        summary = AnalyticsStore.pull(client)
+        data = AnalyticsStore.export()
+        data["systemMetrics"] = summary["systemMetrics"]
+        return AnalyticsWarehouse.snapshot(data)
+
+    @staticmethod
+    def printTable(rows, columns):
+        if len(rows) == 0:
+            print("\tNo data.")
+            return
+        widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in columns]
+        print("\t" + "  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+        for row in rows:
+            print("\t" + "  ".join(str(row[column]).ljust(width) for column, width in zip(columns, widths)))
+
+    @staticmethod
+    def manageWarehouse():
+        print("WAREHOUSE: Welcome to the Analytics Warehouse Console.")
+        while True:
+            print("""
+Commands:
+    snapshot: Pulls changed analytics from the server and stores a snapshot.
+    watch <interval in minutes (optional, default 60)>: Takes a snapshot every <interval> minutes until interrupted.
+    routes <window in hours (optional)>: Per-route request rate and success ratio, busiest first.
+    listings <k (optional, default 10)> <ctr/impressions/clicks (optional, default ctr)>: Top listings.
+    delta <from snapshot (optional, default -2)> <to snapshot (optional, default -1)>: Changes between two snapshots.
+    trends <days (optional)>: Daily request and system metric totals.
+    exit: Exit the Analytics Warehouse Console.
+""")
+
+            userChoice = input("Enter command: ").strip().lower().split()
+            if len(userChoice) == 0:
+                continue
+
+            try:
+                if userChoice[0] == "snapshot":
+                    count = AnalyticsWarehouse.pullSnapshot(client)
+                    print("WAREHOUSE: Snapshot stored. {} snapshots in warehouse.".format(count))
+                elif userChoice[0] == "watch":
+                    interval = float(userChoice[1]) if len(userChoice) > 1 else 60
+                    print("WAREHOUSE: Taking a snapshot every {} minutes. Press Ctrl+C to stop.".format(interval))
+                    try:
+                        while True:
+                            try:
+                                count = AnalyticsWarehouse.pullSnapshot(client)
+                                print("WAREHOUSE: Snapshot {} stored at {}.".format(count, datetime.datetime.now().isoformat(timespec="seconds")))
+                            except requests.RequestException as e:
+                                print("WAREHOUSE: Failed to take snapshot, will retry. Error: {}".format(e))
+                            time.sleep(interval * 60)
+                    except KeyboardInterrupt:
+                        print()
+                        print("WAREHOUSE: Stopped taking snapshots.")
+                elif userChoice[0] == "routes":
+                    rollup = AnalyticsWarehouse.routeRollup(float(userChoice[1]) * 3600 if len(userChoice) > 1 else None)
+                    print("Routes from {} to {}:".format(datetime.datetime.fromtimestamp(rollup["from"]).isoformat(), datetime.datetime.fromtimestamp(rollup["to"]).isoformat()))
+                    AnalyticsWarehouse.printTable(rollup["routes"], ["route", "requests", "requestsPerMinute", "successRatio"])
+                elif userChoice[0] == "listings":
+                    by = userChoice[2] if len(userChoice) > 2 else "ctr"
+                    if by not in ["ctr", "impressions", "clicks"]:
+                        raise Exception("Rank must be one of ctr, impressions or clicks.")
+                    AnalyticsWarehouse.printTable(AnalyticsWarehouse.topListings(int(userChoice[1]) if len(userChoice) > 1 else 10, by), ["listingID", "impressions", "clicks", "ctr"])
+                elif userChoice[0] == "delta":
+                    pprint(AnalyticsWarehouse.delta(int(userChoice[1]) if len(userChoice) > 1 else -2, int(userChoice[2]) if len(userChoice) > 2 else -1))
+                elif userChoice[0] == "trends":
+                    trends = AnalyticsWarehouse.dailyTrends(int(userChoice[1]) if len(userChoice) > 1 else None)
+                    AnalyticsWarehouse.printTable(trends, list(trends[0].keys()) if trends else [])
+                elif userChoice[0] == "exit":
+                    print("WAREHOUSE: Exiting Analytics Warehouse Console...")
+                    break
+                else:
+                    print("Invalid command.")
+            except Exception as e:
+                print("WAREHOUSE: Command failed. Error: {}".format(e))
+
+        return
+
+class LatencyReport:
+    """
+    Per-route response time and error-rate report built from the latency histograms recorded in request analytics.
+
+    Each route's histogram counts responses per bucket (`latencyUnder<bound>ms`, with `latencyOver<last bound>ms` as the overflow bucket). Percentiles are interpolated linearly within the bucket they fall in.
+    """
+
+    bucketPattern = re.compile(r"^latency(Under|Over)(\d+)ms$")
+    percentiles = [50, 95, 99]
+
+    @staticmethod
+    def histogramOf(row):
+        """Returns the route's histogram as a sorted list of (lower bound, upper bound or None for overflow, count)."""
+        bounds = []
+        for column, value in row.items():
+            match = LatencyReport.bucketPattern.match(column)
+            if match:
+                bounds.append((int(match.group(2)), match.group(1) == "Over", value or 0))
+        bounds.sort(key=lambda bucket: (bucket[0], bucket[1]))
+
+        histogram = []
+        lower = 0
+        for bound, isOverflow, count in bounds:
+            histogram.append((bound, None, count) if isOverflow else (lower, bound, count))
+            lower = bound
+        return histogram
+
+    @staticmethod
+    def percentile(histogram, total, p):
+        target = total * p / 100
+        cumulative = 0
+        for lower, upper, count in histogram:
+            if count > 0 and cumulative + count >= target:
+                if upper is None:
+                    return lower
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+        return None
+
+    @staticmethod
+    def build(requestMetrics, minRequests=1):
+        """Returns one report row per route with at least `minRequests` timed responses."""
+        report = []
+        for row in requestMetrics:
+            histogram = LatencyReport.histogramOf(row)
+            timed = sum(count for _, _, count in histogram)
+            requestsCount = row.get("requestsCount") or 0
+            if max(timed, requestsCount) < minRequests:
+                continue
+
+            entry = {
+                "route": "{} {}".format(row["method"], row["requestURL"]),
+                "requests": requestsCount,
+                "successRatio": round((row.get("successResponses") or 0) / requestsCount, 4) if requestsCount > 0 else None,
+                "meanMs": round(row["totalLatencyMs"] / timed, 1) if timed > 0 and row.get("totalLatencyMs") is not None else None,
+                "overflow": histogram[-1][2] if histogram and histogram[-1][1] is None else 0
+            }
+            for p in LatencyReport.percentiles:
+                value = LatencyReport.percentile(histogram, timed, p) if timed > 0 else None
+                entry["p{}Ms".format(p)] = round(value, 1) if value is not None else None
+            report.append(entry)
+        return report
+
+    @staticmethod
+    def slowest(report, top=10):
+        return sorted([entry for entry in report if entry["p95Ms"] is not None], key=lambda entry: (entry["p95Ms"], entry["meanMs"] or 0), reverse=True)[:top]
+
+    @staticmethod
+    def worstSuccess(report, top=10):
+        return sorted([entry for entry in report if entry["successRatio"] is not None], key=lambda entry: (entry["successRatio"], -entry["requests"]))[:top]
+
+    @staticmethod
+    def fetch(client, minRequests=1):
+        AnalyticsStore.pull(client)
+        return LatencyReport.build(AnalyticsStore.export()["requestMetrics"], minRequests)
+
+def latencyReport():
+    print()
+    report = consoleCall("Retrieving request analytics...", "retrieving request analytics", "Latency report aborted.", lambda: LatencyReport.fetch(client))
+    if report is None:
+        return
+
+    columns = ["route", "requests", "meanMs", "p50Ms", "p95Ms", "p99Ms", "successRatio"]
+    print()
+    print("Slowest endpoints (by p95; p99 values at the last bucket mean 'or slower'):")
+    AnalyticsWarehouse.printTable(LatencyReport.slowest(report), columns)
+    print()
+    print("Worst success ratio:")
+    AnalyticsWarehouse.printTable(LatencyReport.worstSuccess(report), columns)
+
+def analyticsHealth():
+    print()
+    print("Retrieving analytics health...")
+    try:
+        health = client.analyticsHealth()
+    except (SuperuserAPIError, requests.RequestException) as e:
+        print("Error occurred in retrieving analytics health. Error: " + str(e))
+        return
+
+    print()
+    print("Analytics service: {}{}".format("enabled" if health["enabled"] else "disabled", "" if health["setup"] else " (not set up)"))
+    print("Pending updates: {} ({} listings, {} routes, {} system metrics); persisted every {} updates.".format(health["pending"]["updates"], health["pending"]["listings"], health["pending"]["requests"], health["pending"]["systemMetrics"], health["persistenceInterval"]))
+    print("Last update: {}. Last persistence: {}.".format(health["lastUpdate"] or "never", health["lastPersistence"] or "never"))
+    print()
+    print("Persists since boot: {} ({} failed), {} rows written in chunks of {}.".format(health["persists"], health["failures"], health["rowsPersisted"], health["chunkSize"]))
+    print("Persist duration: mean {}ms, max {}ms.".format(health["meanDurationMs"], health["maxDurationMs"]))
+    if health["last"] is not None:
+        print("Last persist: {} rows in {}ms at {}.".format(health["last"]["rows"], health["last"]["durationMs"], health["last"]["at"]))
+    if health["lastFailure"] is not None:
+        print("Last failure at {}: {}".format(health["lastFailure"]["at"], health["lastFailure"]["error"]))
+
+def emailQueue():
+    print()
+    print("Retrieving email queue stats...")
+    try:
+        stats = client.emailQueueStats()
+    except (SuperuserAPIError, requests.RequestException) as e:
+        print("Error occurred in retrieving email queue stats. Error: " + str(e))
+        return
+
+    print()
+    if not stats["setup"]:
+        print("Emailer not set up (emailing may be disabled); nothing has been queued.")
+        return
+    print("Queued: {} of at most {} ({} in memory, {} waiting in the journal, {} sending, {} awaiting retry).".format(stats["queued"], stats["queueLimit"], stats["inMemory"], stats["spilled"], stats["inFlight"], stats["retrying"]))
+    if stats["oldestQueuedMs"] is not None:
+        print("Oldest queued email waiting for {:.1f}s.".format(stats["oldestQueuedMs"] / 1000))
+    print("Sent in the last minute: {}.".format(stats["sentLastMinute"]))
+    print("Since boot: {} queued, {} sent, {} failed, {} retries, {} refused (queue full).".format(stats["enqueued"], stats["sent"], stats["failed"], stats["retries"], stats["rejected"]))
+    print("SMTP: {} over up to {} connections, batches of {}, up to {} attempts per email.".format(stats["smtpHost"], stats["poolSize"], stats["batchSize"], stats["maxAttempts"]))
+    print("Last sent: {}.".format(stats["lastSent"] or "never"))
+    if stats["lastFailure"] is not None:
+        print("Last failure at {} (to {}): {}".format(stats["lastFailure"]["at"], stats["lastFailure"]["to"], stats["lastFailure"]["error"]))
+
+def userRecordCache():
+    print()
+    print("Retrieving user record cache stats...")
+    try:
+        stats = client.userRecordCacheStats()
+    except (SuperuserAPIError, requests.RequestException) as e:
+        print("Error occurred in retrieving user record cache stats. Error: " + str(e))
+        return
+
+    print()
+    print("User records cached: {}/{} (TTL {}ms).".format(stats["entries"], stats["maxEntries"], stats["ttlMs"]))
+    print("Lookups since boot: {} hits, {} misses (hit ratio {}).".format(stats["hits"], stats["misses"], "-" if stats["hitRatio"] is None else "{:.1%}".format(stats["hitRatio"])))
+    print("Evictions: {}. Expirations: {}. Invalidations: {}. Flushes: {}.".format(stats["evictions"], stats["expirations"], stats["invalidations"], stats["flushes"]))
+    print("Banned host list: {} hits, {} misses; {}.".format(stats["bannedHostsHits"], stats["bannedHostsMisses"], "{} banned hosts cached".format(stats["bannedHosts"]) if stats["bannedHostsCached"] else "not cached"))
+
+    print()
+    if input("Flush the user record cache? (y/n) ").lower() != "y":
+        return
+    dropped = consoleCall("Flushing user record cache...", "flushing user record cache", "Flush aborted.", client.flushUserRecordCache)
+    if dropped is not None:
+        print("User record cache flushed; {} records dropped.".format(dropped))
+
+class LiveDashboard:
+    """
+    Polls the server's runtime stats at a fixed interval and renders each metric as a rolling sparkline, to tell GC pauses, DB pool starvation and event-loop blocking apart.
+    """
+
+    sparkChars = "▁▂▃▄▅▆▇█"
+    defaultInterval = 2
+    defaultWidth = 40
+
+    @staticmethod
+    def poolTotal(stats, field):
+        pool = stats["databasePool"]
+        if not pool.get("pooled"):
+            return None
+        if "read" in pool:
+            return (pool["read"][field] or 0) + (pool["write"][field] or 0)
+        return pool.get(field)
+
+    @staticmethod
+    def delay(stats, field):
+        delay = stats["eventLoop"]["delay"]
+        if delay is None:
+            return 0
+        return delay["percentilesMs"][field] if field in delay["percentilesMs"] else delay[field]
+
+    # (label, unit, reading from the current and previous stats)
+    metrics = [
+        ("Loop delay p99", "ms", lambda stats, previous: LiveDashboard.delay(stats, "p99")),
+        ("Loop delay max", "ms", lambda stats, previous: LiveDashboard.delay(stats, "maxMs")),
+        ("Loop utilisation", "%", lambda stats, previous: round(stats["eventLoop"]["utilisation"] * 100, 1)),
+        ("CPU", "%", lambda stats, previous: stats["cpu"]["percent"]),
+        ("GC pause total", "ms", lambda stats, previous: stats["gc"]["totalMs"]),
+        ("GC pause max", "ms", lambda stats, previous: stats["gc"]["maxMs"]),
+        ("Heap used", "MB", lambda stats, previous: round(stats["memory"]["heapUsed"] / 1048576, 1)),
+        ("RSS", "MB", lambda stats, previous: round(stats["memory"]["rss"] / 1048576, 1)),
+        ("Active handles", "", lambda stats, previous: stats["handles"]["total"]),
+        ("DB pool in use", "", lambda stats, previous: LiveDashboard.poolTotal(stats, "using")),
+        ("DB pool waiting", "", lambda stats, previous: LiveDashboard.poolTotal(stats, "waiting")),
+        ("WS connections", "", lambda stats, previous: stats.get("webSockets", {}).get("connections")),
+        ("Analytics pending", "", lambda stats, previous: stats["analyticsPending"]["updates"]),
+        ("Requests", "/poll", lambda stats, previous: LiveDashboard.limiterDelta(stats, previous, "requests")),
+        ("Rate limited", "/poll", lambda stats, previous: LiveDashboard.limiterDelta(stats, previous, "limited")),
+        ("Bookings", "/poll", lambda stats, previous: stats.get("reservations", {}).get("window", {}).get("bookings")),
+        ("Booking latency", "ms", lambda stats, previous: stats.get("reservations", {}).get("window", {}).get("meanLatencyMs")),
+        ("Reference retries", "/poll", lambda stats, previous: LiveDashboard.counterDelta(stats, previous, "reservations", "allocationRetries")),
+        ("Email queue", "", lambda stats, previous: stats.get("emailQueue", {}).get("queued")),
+        ("Emails sent", "/poll", lambda stats, previous: LiveDashboard.counterDelta(stats, previous, "emailQueue", "sent"))
+    ]
+
+    @staticmethod
+    def counterDelta(stats, previous, section, field):
+        if previous is None or section not in stats:
+            return None
+        return max(stats[section][field] - previous.get(section, {}).get(field, 0), 0)
+
+    @staticmethod
+    def limiterDelta(stats, previous, field):
+        if previous is None:
+            return None
+        # Counters restart with the server process, so a drop is treated as no change
+        return sum(max(counts[field] - previous["limiters"].get(limiter, {}).get(field, 0), 0) for limiter, counts in stats["limiters"].items())
+
+    @staticmethod
+    def sparkline(values):
+        present = [value for value in values if value is not None]
+        if len(present) == 0:
+            return ""
+        low, high = min(present), max(present)
+        line = ""
+        for value in values:
+            if value is None:
+                line += " "
+            elif high == low:
+                line += LiveDashboard.sparkChars[0]
+            else:
+                line += LiveDashboard.sparkChars[int((value - low) / (high - low) * (len(LiveDashboard.sparkChars) - 1))]
+        return line
+
+    @staticmethod
+    def render(history, stats, width):
+        lines = ["MakanMatch runtime dashboard  {}  (uptime {}s, last window {}ms)".format(stats["timestamp"], int(stats["uptimeSeconds"]), int(stats["windowMs"])), ""]
+        for label, unit, _ in LiveDashboard.metrics:
+            values = list(history[label])
+            present = [value for value in values if value is not None]
+            if len(present) == 0:
+                continue
+            current = values[-1]
+            lines.append("{}  {}  now {}  max {}".format(
+                label.ljust(18),
+                LiveDashboard.sparkline(values).ljust(width),
+                ("-" if current is None else "{}{}".format(current, unit)).rjust(10),
+                "{}{}".format(max(present), unit)
+            ))
+
+        limiters = ", ".join("{} {}/{} limited".format(name, counts["limited"], counts["requests"]) for name, counts in stats["limiters"].items())
+        if limiters:
+            lines.append("")
+            lines.append("Limiters since boot: " + limiters)
+        reservations = stats.get("reservations")
+        if reservations:
+            lines.append("Bookings since boot: {} ({} failed), {} reference retries, {} exhausted (max {} attempts); latency mean {}ms, max {}ms".format(
+                reservations["bookings"], reservations["failed"], reservations["allocationRetries"], reservations["allocationExhausted"], reservations["maxAttempts"],
+                "-" if reservations["meanLatencyMs"] is None else reservations["meanLatencyMs"], reservations["maxLatencyMs"]
+            ))
+        lines.append("")
+        lines.append("Press Ctrl+C to stop.")
+        return "\n".join(lines)
+
+    @staticmethod
+    def run(client, interval=None, width=None, count=None):
+        """Polls and renders until interrupted, or for `count` polls. Returns the number of polls made."""
+        interval = interval or LiveDashboard.defaultInterval
+        width = width or LiveDashboard.defaultWidth
+        history = { label: collections.deque(maxlen=width) for label, _, _ in LiveDashboard.metrics }
+        previous = None
+        polls = 0
+        # Discard the window accumulated before the dashboard started
+        client.runtimeStats()
+        nextPoll = time.monotonic() + interval
+        try:
+            while count is None or polls < count:
+                time.sleep(max(nextPoll - time.monotonic(), 0))
+                nextPoll += interval
+                stats = client.runtimeStats()
+                polls += 1
+                for label, _, reading in LiveDashboard.metrics:
+                    history[label].append(reading(stats, previous))
+                previous = stats
+
+                if sys.stdout.isatty():
+                    print("\033[2J\033[H", end="")
+                print(LiveDashboard.render(history, stats, width))
+                sys.stdout.flush()
+        except KeyboardInterrupt:
+            pass
+        return polls
+
+def liveDashboard():
+    print()
+    interval = input("Poll interval in seconds (default {}): ".format(LiveDashboard.defaultInterval)).strip()
+    while interval != "" and not re.fullmatch(r"\d+(\.\d+)?", interval):
+        interval = input("Invalid interval. Poll interval in seconds (default {}): ".format(LiveDashboard.defaultInterval)).strip()
+
+    try:
+        LiveDashboard.run(client, float(interval) if interval else None)
+    except (SuperuserAPIError, requests.RequestException) as e:
+        print("Error occurred in retrieving runtime stats. Error: " + str(e))
+        return
+    print()
+    print("Live dashboard stopped.")
+
+def runConsole(baseURL=None, accessKey=None, connectTimeout=None, readTimeout=None):
+    """Runs the interactive superuser console. The system location and access key are prompted for unless already provided."""
+    global client
+
+    print("Welcome to the MakanMatch System Superuser Console.")
+    print("With this script, easily manage admin accounts and operational settings of a MakanMatch Backend system.")
+    print()
+
+    # Define the base URL of the Key Server
+    if baseURL is None:
+        baseURL = input("Enter MakanMatch system location (e.g. http://localhost:5000): ")
+        if baseURL == "":
+            baseURL = SuperuserClient.defaultBaseURL
+
+    # Timeouts (in seconds) can be overridden with MM_CONNECT_TIMEOUT and MM_READ_TIMEOUT
+    client = SuperuserClient.fromEnvironment(baseURL, connectTimeout=connectTimeout, readTimeout=readTimeout)
+
+    # Check connection to the MakanMatch System
+    print()
+    print("Checking connection to server...")
+    try:
+        client.healthCheck()
+        print("Connection successful!")
+    except SuperuserAPIError:
+        print("ERROR: MakanMatch Superuser API is not healthy.")
+        sys.exit(1)
+    except Exception as e:
+        print("ERROR: Could not connect to MakanMatch system. Error: " + str(e))
+        sys.exit(1)
+
+    # Authenticate using server admin credentials
+    print()
+    serverKey = accessKey if accessKey else input("Enter superuser access key: ")
+    while True:
+        print()
+        print("Authorising...")
+        client.setAccessKey(serverKey)
+        try:
+            client.authenticate()
+
+            print("Authorised successfully!")
+            break
+        except Exception as e:
+            client.clearAccessKey()
+            print("Error occurred in authenticating with server. Error: " + str(e))
+            retry = input("Retry? (y/n): ").lower()
+            if retry != "y":
+                sys.exit(1)
+            print()
+            serverKey = input("Enter superuser access key: ")
+            continue
+
+    while True:
+        print("""
 What would you like to do?
     1. Retrieve an account's information
     2. Create a new admin account
@@ -798,56 +3027,697 @@ What would you like to do?
     12. Soft reset system
     13. Transform system database for presentation
     14. Activate Logs Console
+    15. Batch account lookup from file
+    16. Activate Analytics Warehouse Console
+    17. Latency and success ratio report
+    18. Analytics health
+    19. Manage runtime toggles (batch)
+    20. Live runtime dashboard
+    21. Generate synthetic dataset
+    22. User record cache stats and flush
+    23. Email queue stats
     0. Exit
 """)
-    
-    choice = input("Enter your choice: ")
-    while (not choice.isdigit()) or (int(choice) not in range(0, 15)):
-        choice = input("Invalid choice. Please enter your choice: ")
-    
-    choice = int(choice)
-    if choice == 1:
-        retrieveAccountInfo()
-        print()
-    elif choice == 2:
-        createAdmin()
-        print()
-    elif choice == 3:
-        deleteAdmin()
-        print()
-    elif choice == 4:
-        retrieveAnalytics()
-        print()
-    elif choice == 5:
-        accessMakanMatchLogs()
-        print()
-    elif choice == 6:
-        retrieveFileManagerContext()
-        print()
-    elif choice == 7:
-        toggleAnalytics()
-        print()
-    elif choice == 8:
-        toggleOpenAIChat()
-        print()
-    elif choice == 9:
-        toggleUsageLock()
-        print()
-    elif choice == 10:
-        toggleSuperuserSensitive()
-        print()
-    elif choice == 11:
-        clearFM()
-        print()
-    elif choice == 12:
-        softReset()
-        print()
-    elif choice == 13:
-        presentationTransform()
-        print()
-    elif choice == 14:
-        Logger.manageLogs()
-        print()
-    else:
-        print("Bye!")
-        break
\ No newline at end of file
+        
+        choice = input("Enter your choice: ")
+        while (not choice.isdigit()) or (int(choice) not in range(0, 24)):
+            choice = input("Invalid choice. Please enter your choice: ")
+        
+        choice = int(choice)
+        if choice == 1:
+            retrieveAccountInfo()
+            print()
+        elif choice == 2:
+            createAdmin()
+            print()
+        elif choice == 3:
+            deleteAdmin()
+            print()
+        elif choice == 4:
+            retrieveAnalytics()
+            print()
+        elif choice == 5:
+            accessMakanMatchLogs()
+            print()
+        elif choice == 6:
+            retrieveFileManagerContext()
+            print()
+        elif choice == 7:
+            toggleAnalytics()
+            print()
+        elif choice == 8:
+            toggleOpenAIChat()
+            print()
+        elif choice == 9:
+            toggleUsageLock()
+            print()
+        elif choice == 10:
+            toggleSuperuserSensitive()
+            print()
+        elif choice == 11:
+            clearFM()
+            print()
+        elif choice == 12:
+            softReset()
+            print()
+        elif choice == 13:
+            presentationTransform()
+            print()
+        elif choice == 14:
+            Logger.manageLogs()
+            print()
+        elif choice == 15:
+            batchAccountLookup()
+            print()
+        elif choice == 16:
+            AnalyticsWarehouse.manageWarehouse()
+            print()
+        elif choice == 17:
+            latencyReport()
+            print()
+        elif choice == 18:
+            analyticsHealth()
+            print()
+        elif choice == 19:
+            runtimeToggles()
+            print()
+        elif choice == 20:
+            liveDashboard()
+            print()
+        elif choice == 21:
+            generateDataset()
+            print()
+        elif choice == 22:
+            userRecordCache()
+            print()
+        elif choice == 23:
+            emailQueue()
+            print()
+        else:
+            client.close()
+            print("Bye!")
+            break
+
+class SuperuserFleet:
+    """
+    Runs superuser API calls against several MakanMatch Backend deployments at once.
+
+    Nodes are read from a JSON file: `[{"name": "prod", "url": "https://...", "key": "..."}, ...]`. A node may give `keyEnv` (the name of an environment variable holding its key) instead of `key`; nodes with neither use the default key.
+    Every call is fanned out with asyncio onto one worker thread per node, so a fleet-wide action takes about one round-trip time of the slowest node rather than the sum of all of them.
+    """
+
+    defaultSlowMs = 2000
+    namePattern = re.compile(r"[^A-Za-z0-9_.\-]")
+
+    def __init__(self, nodes, connectTimeout=None, readTimeout=None, slowMs=None):
+        self.slowMs = slowMs if slowMs is not None else SuperuserFleet.defaultSlowMs
+        self.nodes = []
+        for node in nodes:
+            self.nodes.append({
+                "name": node["name"],
+                "client": SuperuserClient.fromEnvironment(node["url"], node.get("key"), connectTimeout, readTimeout)
+            })
+
+    @staticmethod
+    def loadNodes(filePath, defaultKey=None):
+        with open(filePath, "r") as f:
+            entries = json.load(f)
+        if not isinstance(entries, list) or len(entries) == 0:
+            raise Exception("Fleet file must contain a non-empty list of nodes.")
+
+        nodes = []
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict) or not entry.get("url"):
+                raise Exception("Fleet node {} has no 'url'.".format(index + 1))
+            key = entry.get("key") or (os.environ.get(entry["keyEnv"]) if entry.get("keyEnv") else None) or defaultKey
+            # Node names are used in local file names (e.g. per-node logs), so keep them filesystem-safe
+            name = SuperuserFleet.namePattern.sub("_", str(entry.get("name") or entry["url"].split("://")[-1]))
+            nodes.append({ "name": name, "url": entry["url"], "key": key })
+
+        names = [node["name"] for node in nodes]
+        if len(set(names)) != len(names):
+            raise Exception("Fleet node names must be unique.")
+        return nodes
+
+    async def fanOut(self, operation):
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            async def runOnNode(node):
+                startTime = time.perf_counter()
+                outcome = { "name": node["name"], "url": node["client"].baseURL }
+                try:
+                    outcome["result"] = await loop.run_in_executor(executor, operation, node["client"], node["name"])
+                    outcome["ok"] = True
+                except Exception as e:
+                    outcome["error"] = str(e)
+                    outcome["ok"] = False
+                outcome["latencyMs"] = round((time.perf_counter() - startTime) * 1000, 2)
+                outcome["slow"] = outcome["latencyMs"] > self.slowMs
+                return outcome
+
+            return await asyncio.gather(*(runOnNode(node) for node in self.nodes))
+
+    def run(self, operation):
+        """Calls `operation(client, nodeName)` on every node concurrently. Returns a report of each node's result or error, its latency, and which nodes were unhealthy or slow."""
+        outcomes = asyncio.run(self.fanOut(operation))
+        return {
+            "nodes": outcomes,
+            "unhealthy": [outcome["name"] for outcome in outcomes if not outcome["ok"]],
+            "slow": [outcome["name"] for outcome in outcomes if outcome["slow"]]
+        }
+
+    def close(self):
+        for node in self.nodes:
+            node["client"].close()
+
+    @staticmethod
+    def mergeAnalytics(report):
+        """Merges the analytics of all healthy nodes: system and listing metrics are summed, request metrics are broken down per node with their spread."""
+        systemMetrics = {}
+        lastBoots = {}
+        listingMetrics = {}
+        requestMetrics = {}
+        for outcome in report["nodes"]:
+            if not outcome["ok"]:
+                continue
+            analytics = outcome["result"]
+
+            for metric, value in analytics["systemMetrics"].items():
+                if metric == "lastBoot":
+                    lastBoots[outcome["name"]] = value
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    systemMetrics[metric] = systemMetrics.get(metric, 0) + value
+
+            for listing in analytics["listingMetrics"]:
+                merged = listingMetrics.setdefault(listing["listingID"], { "listingID": listing["listingID"] })
+                for metric, value in listing.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        merged[metric] = merged.get(metric, 0) + value
+
+            for request in analytics["requestMetrics"]:
+                merged = requestMetrics.setdefault("{} {}".format(request["method"], request["requestURL"]), {})
+                for metric, value in request.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        merged.setdefault(metric, {})[outcome["name"]] = value
+
+        for perNode in requestMetrics.values():
+            for metric, values in list(perNode.items()):
+                perNode[metric] = {
+                    "total": sum(values.values()),
+                    "spread": max(values.values()) - min(values.values()),
+                    "byNode": values
+                }
+
+        return {
+            "systemMetrics": systemMetrics,
+            "lastBoots": lastBoots,
+            "listingMetrics": list(listingMetrics.values()),
+            "requestMetrics": requestMetrics
+        }
+
+class SuperuserCLI:
+    """
+    Non-interactive command line interface over `SuperuserClient`, for scripting and cron jobs.
+
+    The system location and access key come from `--url`/`--key` or the MM_SUPERUSER_URL/MM_SUPERUSER_KEY environment variables. Results are written to stdout as JSON (compact when piped) and errors to stderr with a non-zero exit code.
+    Run without a command to start the interactive console.
+    """
+
+    toggleFeatures = {
+        "analytics": "toggleAnalytics",
+        "makanbot": "toggleMakanBot",
+        "usagelock": "toggleUsageLock"
+    }
+
+    @staticmethod
+    def emit(data, outPath=None):
+        if outPath and not (isinstance(data, dict) and data.get("savedTo") == outPath):
+            with open(outPath, "w") as f:
+                json.dump(data, f)
+            data = { "savedTo": outPath }
+
+        if sys.stdout.isatty():
+            print(json.dumps(data, indent=4))
+        else:
+            print(json.dumps(data, separators=(",", ":")))
+
+    @staticmethod
+    def identifierFrom(args):
+        if args.id:
+            return { "userID": args.id }
+        elif args.username:
+            return { "username": args.username }
+        return { "email": args.email }
+
+    @staticmethod
+    def confirmSensitive(args, actionName):
+        if not args.yes:
+            raise SuperuserAPIError("{} is a sensitive action and could cripple system operation. Pass --yes to confirm.".format(actionName))
+
+    @staticmethod
+    def health(client, args):
+        return { "message": client.healthCheck() }
+
+    @staticmethod
+    def account(client, args):
+        return client.accountInfo(**SuperuserCLI.identifierFrom(args))
+
+    @staticmethod
+    def accountsBatch(client, args):
+        identifiers = BatchAccountLookup.readIdentifiers(args.input)
+        return BatchAccountLookup.run(client, identifiers, args.out, args.workers)
+
+    @staticmethod
+    def createAdmin(client, args):
+        password = os.environ.get("MM_ADMIN_PASSWORD") or getpass("Enter password: ", stream=sys.stderr)
+        return { "message": client.createAdmin(args.username, args.fname, args.lname, args.email, password, args.role) }
+
+    @staticmethod
+    def deleteAdmin(client, args):
+        return { "message": client.deleteAdmin(**SuperuserCLI.identifierFrom(args)) }
+
+    @staticmethod
+    def analytics(client, args):
+        if args.saveTo:
+            # Written to the file as it arrives instead of being parsed and re-serialised
+            return { "savedTo": args.saveTo, "bytes": client.downloadAnalytics(args.saveTo) }
+        return client.getAnalytics()
+
+    @staticmethod
+    def analyticsSync(client, args):
+        summary = AnalyticsStore.pull(client, args.db, fullResync=args.full)
+        if args.export:
+            with open(args.export, "w") as f:
+                json.dump(AnalyticsStore.export(args.db), f)
+            summary["exportedTo"] = args.export
+        return summary
+
+    @staticmethod
+    def warehouse(client, args):
+        windowSeconds = args.window_hours * 3600 if getattr(args, "window_hours", None) else None
+        if args.warehouseAction == "snapshot":
+            return { "snapshots": AnalyticsWarehouse.pullSnapshot(client) }
+        elif args.warehouseAction == "routes":
+            return AnalyticsWarehouse.routeRollup(windowSeconds, args.top)
+        elif args.warehouseAction == "listings":
+            return AnalyticsWarehouse.topListings(args.top, args.by, windowSeconds)
+        elif args.warehouseAction == "delta":
+            return AnalyticsWarehouse.delta(args.from_snapshot, args.to_snapshot, args.top)
+        return AnalyticsWarehouse.dailyTrends(args.days)
+
+    @staticmethod
+    def latency(client, args):
+        report = LatencyReport.fetch(client, args.min_requests)
+        return {
+            "slowest": LatencyReport.slowest(report, args.top),
+            "worstSuccessRatio": LatencyReport.worstSuccess(report, args.top)
+        }
+
+    @staticmethod
+    def analyticsHealth(client, args):
+        return client.analyticsHealth()
+
+    @staticmethod
+    def runtimeStats(client, args):
+        return client.runtimeStats()
+
+    @staticmethod
+    def emailQueue(client, args):
+        return client.emailQueueStats()
+
+    @staticmethod
+    def userCache(client, args):
+        if args.flush:
+            return { "dropped": client.flushUserRecordCache() }
+        return client.userRecordCacheStats()
+
+    @staticmethod
+    def dashboard(client, args):
+        LiveDashboard.run(client, args.interval, args.width, args.count)
+        return None
+
+    @staticmethod
+    def fmContext(client, args):
+        if not args.no_sync:
+            summary = FileManagerMirror.sync(client, args.db, fullResync=args.full)
+            print("Mirror synced: {} changed, {} removed, {} files.".format(summary["changed"], summary["deleted"], summary["files"]), file=sys.stderr)
+
+        filters = {
+            "contentType": args.content_type,
+            "updatedFrom": args.updated_from,
+            "updatedTo": args.updated_to,
+            "forceExistence": None if args.force_existence is None else args.force_existence == "true",
+            "missingID": args.missing_id
+        }
+        if any(value not in [None, False] for value in filters.values()) or args.limit is not None:
+            return FileManagerMirror.query(args.db, limit=args.limit, **filters)
+        return FileManagerMirror.export(args.db)
+
+    @staticmethod
+    def logs(client, args):
+        savedCount = 0
+        if not args.no_fetch:
+            savedCount, _ = Logger.fetchNewLogs(client, fromStart=args.full)
+        meta = LogIndex.update()
+
+        tail = args.tail if args.tail > 0 else None
+        offsets = None
+        if args.since:
+            offsets = LogIndex.offsetRange(meta, LogIndex.parseMinute(args.since.upper()), LogIndex.parseMinute(args.until.upper()) if args.until else None)
+
+        if args.filter:
+            matches = LogIndex.offsetsForTags(meta, args.filter)
+            if args.since:
+                matches = [] if offsets is None else [offset for offset in matches if offsets[0] <= offset < offsets[1]]
+            selected = list(LogIndex.readLinesAt(matches[-tail:] if tail else matches))
+        elif args.since:
+            selected = [] if offsets is None else list(collections.deque(LogIndex.readRange(*offsets), maxlen=tail))
+        else:
+            selected = Logger.tail(tail) if tail else list(Logger.readAll())
+
+        if args.raw:
+            for log in selected:
+                print(log)
+            return None
+        return { "saved": savedCount, "logs": selected }
+
+    @staticmethod
+    def logAnalysis(client, args):
+        if not args.no_fetch:
+            savedCount, _ = Logger.fetchNewLogs(client, fromStart=args.full)
+            print("Saved {} new log entries.".format(savedCount), file=sys.stderr)
+        if not os.path.exists(Logger.logsFile):
+            raise SuperuserAPIError("No logs saved locally in {}.".format(Logger.logsFile))
+
+        offsets = (0, None)
+        if args.since:
+            offsets = LogIndex.offsetRange(LogIndex.update(), LogIndex.parseMinute(args.since.upper()), LogIndex.parseMinute(args.until.upper()) if args.until else None)
+            if offsets is None:
+                return LogAnalysis.report(LogAnalysis.analyse(0, 0), args.top, args.bucket)
+        return LogAnalysis.report(LogAnalysis.analyse(*offsets), args.top, args.bucket)
+
+    @staticmethod
+    def toggle(client, args):
+        if args.feature == "sensitive":
+            if args.state is not None:
+                raise SuperuserAPIError("Superuser sensitive mode can only be toggled; do not pass a state.")
+            return { "message": client.toggleSuperuserSensitive() }
+
+        newStatus = None if args.state is None else args.state == "on"
+        return { "message": getattr(client, SuperuserCLI.toggleFeatures[args.feature])(newStatus) }
+
+    @staticmethod
+    def toggles(client, args):
+        if len(args.changes) == 0:
+            return client.cacheState()
+        return client.updateToggles(RuntimeToggles.parseChanges(args.changes), expectedVersion=args.expect_version)
+
+    @staticmethod
+    def clearFM(client, args):
+        SuperuserCLI.confirmSensitive(args, "Clearing FileManager")
+        return { "message": client.clearFM() }
+
+    @staticmethod
+    def softReset(client, args):
+        SuperuserCLI.confirmSensitive(args, "Soft resetting the system")
+        return client.softReset(lambda event: printResetProgress(event, sys.stderr))
+
+    @staticmethod
+    def presentationTransform(client, args):
+        SuperuserCLI.confirmSensitive(args, "Presentation transform")
+        return { "messages": client.presentationTransform(lambda event: printResetProgress(event, sys.stderr)) }
+
+    @staticmethod
+    def generateDataset(client, args):
+        SuperuserCLI.confirmSensitive(args, "Generating a dataset")
+        parameters = { name: getattr(args, name) for name in ["seed", "hosts", "guests", "listings", "reservations", "reviews", "likes", "chats", "messages", "skew", "batchSize", "password"] if getattr(args, name) is not None }
+        parameters["reset"] = args.reset
+        return client.generateDataset(parameters, lambda event: printResetProgress(event, sys.stderr))
+
+    @staticmethod
+    def fleetOperation(args):
+        """Returns the `operation(client, nodeName)` to fan out for a fleet command."""
+        if args.fleetAction == "health":
+            return lambda client, nodeName: client.healthCheck()
+        elif args.fleetAction == "authenticate":
+            return lambda client, nodeName: client.authenticate()
+        elif args.fleetAction == "analytics":
+            return lambda client, nodeName: client.getAnalytics()
+        elif args.fleetAction == "logs":
+            def fetchLogs(client, nodeName):
+                savedCount, tail = Logger.fetchNewLogs(client, fromStart=args.full, tailSize=args.tail, nodeName=nodeName)
+                return { "saved": savedCount, "savedTo": Logger.filesFor(nodeName)[0], "logs": tail }
+            return fetchLogs
+        elif args.feature == "sensitive":
+            return lambda client, nodeName: client.toggleSuperuserSensitive()
+
+        newStatus = None if args.state is None else args.state == "on"
+        return lambda client, nodeName: getattr(client, SuperuserCLI.toggleFeatures[args.feature])(newStatus)
+
+    @staticmethod
+    def runFleet(args):
+        fleet = None
+        try:
+            fleetFile = args.nodes or os.environ.get("MM_SUPERUSER_FLEET")
+            if not fleetFile:
+                raise SuperuserAPIError("No fleet file provided. Use --nodes or set MM_SUPERUSER_FLEET.")
+            if args.fleetAction == "toggle" and args.feature == "sensitive" and args.state is not None:
+                raise SuperuserAPIError("Superuser sensitive mode can only be toggled; do not pass a state.")
+
+            fleet = SuperuserFleet(
+                SuperuserFleet.loadNodes(fleetFile, args.key or os.environ.get("MM_SUPERUSER_KEY")),
+                connectTimeout=args.connect_timeout,
+                readTimeout=args.read_timeout,
+                slowMs=args.slow_ms
+            )
+            report = fleet.run(SuperuserCLI.fleetOperation(args))
+            if args.fleetAction == "analytics":
+                report["merged"] = SuperuserFleet.mergeAnalytics(report)
+
+            SuperuserCLI.emit(report, getattr(args, "saveTo", None))
+            return 0 if len(report["unhealthy"]) == 0 else 1
+        except Exception as e:
+            print("ERROR: " + str(e), file=sys.stderr)
+            return 1
+        finally:
+            if fleet is not None:
+                fleet.close()
+
+    @staticmethod
+    def buildParser():
+        parser = argparse.ArgumentParser(
+            prog="superuserScript.py",
+            description="MakanMatch System Superuser Console. Run without a command for the interactive console."
+        )
+        parser.add_argument("--url", help="MakanMatch system location (default: $MM_SUPERUSER_URL or {})".format(SuperuserClient.defaultBaseURL))
+        parser.add_argument("--key", help="Superuser access key (default: $MM_SUPERUSER_KEY)")
+        parser.add_argument("--connect-timeout", type=float, help="Connect timeout in seconds (default: $MM_CONNECT_TIMEOUT or {})".format(SuperuserClient.defaultConnectTimeout))
+        parser.add_argument("--read-timeout", type=float, help="Read timeout in seconds (default: $MM_READ_TIMEOUT or {})".format(SuperuserClient.defaultReadTimeout))
+
+        commands = parser.add_subparsers(dest="command", metavar="command")
+
+        command = commands.add_parser("health", help="Check that the superuser API is reachable")
+        command.set_defaults(handler=SuperuserCLI.health, needsKey=False)
+
+        command = commands.add_parser("account", help="Retrieve an account's information")
+        identifier = command.add_mutually_exclusive_group(required=True)
+        identifier.add_argument("--id")
+        identifier.add_argument("--username")
+        identifier.add_argument("--email")
+        command.set_defaults(handler=SuperuserCLI.account)
+
+        command = commands.add_parser("accounts-batch", help="Look up accounts for identifiers read from a file")
+        command.add_argument("input", help="File with one identifier per row and an optional second column ID/username/email")
+        command.add_argument("--out", default="MakanMatchAccounts.jsonl", help="Output .jsonl or .csv file (default: MakanMatchAccounts.jsonl)")
+        command.add_argument("--workers", type=int, help="Number of concurrent workers (default: {})".format(BatchAccountLookup.defaultWorkers))
+        command.set_defaults(handler=SuperuserCLI.accountsBatch)
+
+        command = commands.add_parser("create-admin", help="Create a new admin account (password from $MM_ADMIN_PASSWORD or prompted)")
+        for field in ["username", "fname", "lname", "email", "role"]:
+            command.add_argument("--" + field, required=True)
+        command.set_defaults(handler=SuperuserCLI.createAdmin)
+
+        command = commands.add_parser("delete-admin", help="Delete an existing admin account")
+        identifier = command.add_mutually_exclusive_group(required=True)
+        identifier.add_argument("--id")
+        identifier.add_argument("--username")
+        identifier.add_argument("--email")
+        command.set_defaults(handler=SuperuserCLI.deleteAdmin)
+
+        command = commands.add_parser("analytics", help="Retrieve collected analytics")
+        command.add_argument("--out", dest="saveTo", help="Save the analytics to this file instead of printing them")
+        command.set_defaults(handler=SuperuserCLI.analytics)
+
+        command = commands.add_parser("analytics-sync", help="Pull only analytics changed since the last pull into a local SQLite store")
+        command.add_argument("--db", default=AnalyticsStore.defaultPath, help="Path to the local analytics store (default: {})".format(AnalyticsStore.defaultPath))
+        command.add_argument("--full", action="store_true", help="Re-download all analytics instead of only changed rows")
+        command.add_argument("--export", metavar="FILE", help="Also export all stored analytics to this JSON file")
+        command.set_defaults(handler=SuperuserCLI.analyticsSync)
+
+        command = commands.add_parser("warehouse", help="Snapshot analytics into the local warehouse and query rollups")
+        warehouseActions = command.add_subparsers(dest="warehouseAction", metavar="action", required=True)
+        warehouseActions.add_parser("snapshot", help="Pull changed analytics and store a snapshot (schedule with cron)").set_defaults(handler=SuperuserCLI.warehouse)
+        warehouseAction = warehouseActions.add_parser("routes", help="Per-route request rate and success ratio")
+        warehouseAction.add_argument("--window-hours", type=float, help="Only the last N hours of snapshots (default: all)")
+        warehouseAction.add_argument("--top", type=int, help="Only the N busiest routes")
+        warehouseAction.set_defaults(handler=SuperuserCLI.warehouse, needsKey=False)
+        warehouseAction = warehouseActions.add_parser("listings", help="Top listings by CTR, impressions or clicks")
+        warehouseAction.add_argument("--top", type=int, default=10, help="Number of listings (default: 10)")
+        warehouseAction.add_argument("--by", choices=["ctr", "impressions", "clicks"], default="ctr")
+        warehouseAction.add_argument("--window-hours", type=float, help="Rank by activity in the last N hours instead of all-time totals")
+        warehouseAction.set_defaults(handler=SuperuserCLI.warehouse, needsKey=False)
+        warehouseAction = warehouseActions.add_parser("delta", help="Changes between two snapshots")
+        warehouseAction.add_argument("--from", dest="from_snapshot", type=int, default=-2, help="Snapshot index, negative counts from the latest (default: -2)")
+        warehouseAction.add_argument("--to", dest="to_snapshot", type=int, default=-1, help="Snapshot index, negative counts from the latest (default: -1)")
+        warehouseAction.add_argument("--top", type=int, default=10, help="Number of routes and listings per metric (default: 10)")
+        warehouseAction.set_defaults(handler=SuperuserCLI.warehouse, needsKey=False)
+        warehouseAction = warehouseActions.add_parser("trends", help="Daily request and system metric totals")
+        warehouseAction.add_argument("--days", type=int, help="Only the last N days")
+        warehouseAction.set_defaults(handler=SuperuserCLI.warehouse, needsKey=False)
+
+        command = commands.add_parser("latency", help="Slowest endpoints and worst success ratios from request analytics")
+        command.add_argument("--top", type=int, default=10, help="Number of routes per table (default: 10)")
+        command.add_argument("--min-requests", type=int, default=1, help="Ignore routes with fewer requests (default: 1)")
+        command.set_defaults(handler=SuperuserCLI.latency)
+
+        command = commands.add_parser("analytics-health", help="Analytics persistence statistics and pending updates")
+        command.set_defaults(handler=SuperuserCLI.analyticsHealth)
+
+        command = commands.add_parser("email-queue", help="Email queue depth, throughput, retries and failures")
+        command.set_defaults(handler=SuperuserCLI.emailQueue)
+
+        command = commands.add_parser("user-cache", help="User record cache hit, miss, eviction and invalidation stats")
+        command.add_argument("--flush", action="store_true", help="Drop everything cached instead")
+        command.set_defaults(handler=SuperuserCLI.userCache)
+
+        command = commands.add_parser("runtime-stats", help="Runtime stats of the server process (event loop, GC, memory, handles, DB pool, limiters, bookings)")
+        command.set_defaults(handler=SuperuserCLI.runtimeStats)
+
+        command = commands.add_parser("dashboard", help="Live runtime dashboard with rolling sparklines")
+        command.add_argument("--interval", type=float, default=LiveDashboard.defaultInterval, help="Seconds between polls (default {})".format(LiveDashboard.defaultInterval))
+        command.add_argument("--width", type=int, default=LiveDashboard.defaultWidth, help="Number of polls shown per sparkline (default {})".format(LiveDashboard.defaultWidth))
+        command.add_argument("--count", type=int, help="Stop after this many polls")
+        command.set_defaults(handler=SuperuserCLI.dashboard)
+
+        command = commands.add_parser("fm-context", help="Sync the local FileManager context mirror and query it")
+        command.add_argument("--db", help="Mirror database path (default: {})".format(FileManagerMirror.defaultPath))
+        command.add_argument("--full", action="store_true", help="Download the full context instead of the changes since the last sync")
+        command.add_argument("--no-sync", action="store_true", help="Query the mirror without contacting the server")
+        command.add_argument("--content-type", help="Only entries with this content type")
+        command.add_argument("--updated-from", help="Only entries updated at or after this ISO datetime")
+        command.add_argument("--updated-to", help="Only entries updated at or before this ISO datetime")
+        command.add_argument("--force-existence", choices=["true", "false"], help="Only entries with this forceExistence flag")
+        command.add_argument("--missing-id", action="store_true", help="Only entries without a cloud ID")
+        command.add_argument("--limit", type=int, help="Return at most this many entries")
+        command.add_argument("--out", dest="saveTo", help="Save the context to this file instead of printing it")
+        command.set_defaults(handler=SuperuserCLI.fmContext)
+
+        command = commands.add_parser("logs", help="Fetch new system logs into {} and query them".format(Logger.logsFile))
+        command.add_argument("--since", help="Only logs written at or after this datetime (UTC), e.g. 2024-07-01T00:00")
+        command.add_argument("--until", help="Only logs written up to this datetime (UTC); used with --since")
+        command.add_argument("--filter", nargs="+", metavar="TAG", help="Only logs carrying all of these log tags")
+        command.add_argument("--tail", type=int, default=Logger.tailSize, help="Number of most recent matching logs to output, 0 for all (default: {})".format(Logger.tailSize))
+        command.add_argument("--full", action="store_true", help="Re-download all logs instead of only those added since the last retrieval")
+        command.add_argument("--no-fetch", action="store_true", help="Query the local logs file without contacting the server")
+        command.add_argument("--raw", action="store_true", help="Print log lines as plain text instead of JSON")
+        command.set_defaults(handler=SuperuserCLI.logs)
+
+        command = commands.add_parser("log-analysis", help="ERROR rate timeline, top log tag combinations and bursts over {}".format(Logger.logsFile))
+        command.add_argument("--since", help="Only logs written at or after this datetime (UTC), e.g. 2024-07-01T00:00")
+        command.add_argument("--until", help="Only logs written up to this datetime (UTC); used with --since")
+        command.add_argument("--top", type=int, default=10, help="Number of tag combinations to rank (default: 10)")
+        command.add_argument("--bucket", type=int, help="Minutes per timeline row (default: chosen to fit {} rows)".format(LogAnalysis.maxTimelineRows))
+        command.add_argument("--full", action="store_true", help="Re-download all logs instead of only those added since the last retrieval")
+        command.add_argument("--no-fetch", action="store_true", help="Analyse the local logs file without contacting the server")
+        command.set_defaults(handler=SuperuserCLI.logAnalysis)
+
+        command = commands.add_parser("toggle", help="Toggle a system feature")
+        command.add_argument("feature", choices=list(SuperuserCLI.toggleFeatures.keys()) + ["sensitive"])
+        command.add_argument("state", nargs="?", choices=["on", "off"], help="Explicit new state; flips the current state if omitted")
+        command.set_defaults(handler=SuperuserCLI.toggle)
+
+        command = commands.add_parser("toggles", help="Show all runtime toggles with the cache version, or set several at once")
+        command.add_argument("changes", nargs="*", help="Changes as <toggle>=<on/off> ({})".format(", ".join(RuntimeToggles.toggles.keys())))
+        command.add_argument("--expect-version", type=int, help="Only apply the changes if the cache is still at this version")
+        command.set_defaults(handler=SuperuserCLI.toggles)
+
+        command = commands.add_parser("clear-fm", help="Clear FileManager (sensitive)")
+        command.add_argument("--yes", action="store_true", help="Confirm the sensitive action")
+        command.set_defaults(handler=SuperuserCLI.clearFM)
+
+        command = commands.add_parser("soft-reset", help="Soft reset the system database (sensitive)")
+        command.add_argument("--yes", action="store_true", help="Confirm the sensitive action")
+        command.set_defaults(handler=SuperuserCLI.softReset)
+
+        command = commands.add_parser("presentation-transform", help="Transform the system database for presentation (sensitive)")
+        command.add_argument("--yes", action="store_true", help="Confirm the sensitive action")
+        command.set_defaults(handler=SuperuserCLI.presentationTransform)
+
+        command = commands.add_parser("generate-dataset", help="Fill the system database with a reproducible synthetic dataset (sensitive)")
+        command.add_argument("--seed", type=int, help="Seed; the same seed and counts give the same dataset")
+        for name in ["hosts", "guests", "listings", "reservations", "reviews", "likes", "chats", "messages"]:
+            command.add_argument("--" + name, type=int, help="Number of {} to generate".format(name))
+        command.add_argument("--skew", type=float, help="Popularity skew, from 1 (uniform) upwards")
+        command.add_argument("--batch-size", dest="batchSize", type=int, help="Rows per multi-row insert")
+        command.add_argument("--password", help="Password for all generated accounts")
+        command.add_argument("--reset", action="store_true", help="Soft reset the system database first")
+        command.add_argument("--yes", action="store_true", help="Confirm the sensitive action")
+        command.set_defaults(handler=SuperuserCLI.generateDataset)
+
+        command = commands.add_parser("fleet", help="Run a command against several deployments concurrently and merge the results")
+        command.add_argument("--nodes", help="JSON file listing the deployments (default: $MM_SUPERUSER_FLEET)")
+        command.add_argument("--slow-ms", type=float, help="Flag nodes slower than this many milliseconds (default: {})".format(SuperuserFleet.defaultSlowMs))
+        fleetActions = command.add_subparsers(dest="fleetAction", metavar="action", required=True)
+        fleetActions.add_parser("health", help="Check every node's superuser API")
+        fleetActions.add_parser("authenticate", help="Check every node's access key")
+        fleetAction = fleetActions.add_parser("analytics", help="Retrieve and merge analytics from every node")
+        fleetAction.add_argument("--out", dest="saveTo", help="Save the report to this file instead of printing it")
+        fleetAction = fleetActions.add_parser("logs", help="Fetch new logs from every node into MakanMatchLogs.<node>.txt")
+        fleetAction.add_argument("--tail", type=int, default=Logger.tailSize, help="Number of newest fetched logs to include per node (default: {})".format(Logger.tailSize))
+        fleetAction.add_argument("--full", action="store_true", help="Re-download all logs instead of only those added since the last retrieval")
+        fleetAction = fleetActions.add_parser("toggle", help="Toggle a system feature on every node")
+        fleetAction.add_argument("feature", choices=list(SuperuserCLI.toggleFeatures.keys()) + ["sensitive"])
+        fleetAction.add_argument("state", nargs="?", choices=["on", "off"], help="Explicit new state; flips each node's current state if omitted")
+
+        return parser
+
+    @staticmethod
+    def main(argv=None):
+        args = SuperuserCLI.buildParser().parse_args(argv)
+        if args.command is None:
+            runConsole(
+                baseURL=args.url or os.environ.get("MM_SUPERUSER_URL"),
+                accessKey=args.key or os.environ.get("MM_SUPERUSER_KEY"),
+                connectTimeout=args.connect_timeout,
+                readTimeout=args.read_timeout
+            )
+            return 0
+        elif args.command == "fleet":
+            return SuperuserCLI.runFleet(args)
+
+        global client
+        client = SuperuserClient.fromEnvironment(args.url, args.key, args.connect_timeout, args.read_timeout)
+        try:
+            # Commands told not to contact the server (--no-fetch, --no-sync) only read local files
+            offline = getattr(args, "no_fetch", False) or getattr(args, "no_sync", False)
+            if getattr(args, "needsKey", True) and not offline and "AccessKey" not in client.session.headers:
+                raise SuperuserAPIError("No superuser access key provided. Use --key or set MM_SUPERUSER_KEY.")
+
+            result = args.handler(client, args)
+            if result is not None:
+                SuperuserCLI.emit(result, getattr(args, "saveTo", None))
+            return 0
+        except SuperuserAPIError as e:
+            print("ERROR: " + str(e), file=sys.stderr)
+            return 1
+        except requests.RequestException as e:
+            print("ERROR: Could not connect to MakanMatch system. Error: " + str(e), file=sys.stderr)
+            return 1
+        except Exception as e:
+            print("ERROR: " + str(e), file=sys.stderr)
+            return 1
+        finally:
+            client.close()
+
+if __name__ == "__main__":
+    sys.exit(SuperuserCLI.main())
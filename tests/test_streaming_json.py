@@ -0,0 +1,35 @@
+import os, sys, json, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from superuserScript import StreamingJSON
+
+def chunked(text, size):
+    data = text.encode("utf-8")
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+class StreamingJSONTests(unittest.TestCase):
+    def parse(self, chunks, streamPaths=[()]):
+        return list(StreamingJSON(chunks, streamPaths))
+
+    def test_number_split_after_decimal_point(self):
+        self.assertEqual(self.parse([b"[1", b"2.", b"5]"]), [((), 12.5)])
+
+    def test_numbers_at_every_chunk_boundary(self):
+        document = {"totalLatencyMs": -2500.0, "mean": 1.25e-3, "count": 120, "ratio": 6.02E+23, "values": [0, -0.5, 3e2, 10]}
+        text = json.dumps(document, separators=(",", ":"))
+        for size in range(1, len(text) + 1):
+            events = self.parse(chunked(text, size), [()])
+            self.assertEqual(dict((path[-1], value) for path, value in events), document, "chunk size {}".format(size))
+
+    def test_streamed_array_of_floats(self):
+        values = [-2500.0, 1e-7, 42, 3.5E2, -0.0]
+        text = json.dumps({"rows": values})
+        for size in range(1, 8):
+            events = self.parse(chunked(text, size), [(), ("rows",)])
+            self.assertEqual([value for path, value in events], values, "chunk size {}".format(size))
+
+    def test_top_level_number(self):
+        self.assertEqual(self.parse(chunked("-2500.0", 3)), [((), -2500.0)])
+
+if __name__ == "__main__":
+    unittest.main()